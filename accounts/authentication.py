@@ -0,0 +1,59 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.roles import ADMIN, OWNER
+from accounts.tokens import TOKEN_VERSION_CLAIM, get_token_version
+
+
+class ClaimsUser(TokenUser):
+    @property
+    def roles(self):
+        roles = set()
+        if self.token.get('is_admin'):
+            roles.add(ADMIN)
+        if self.token.get('is_owner'):
+            roles.add(OWNER)
+        return frozenset(roles)
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if self.uses_claims(request, validated_token):
+            return ClaimsUser(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        version = validated_token.get(TOKEN_VERSION_CLAIM)
+        if version is not None and version != get_token_version(validated_token[api_settings.USER_ID_CLAIM]):
+            raise InvalidToken(_("Token has been revoked"))
+        return validated_token
+
+    def uses_claims(self, request, validated_token):
+        if not getattr(settings, 'JWT_STATELESS_AUTH', False) or request.method not in SAFE_METHODS:
+            return False
+        view = request.parser_context.get('view')
+        # Views that serialize the user itself opt out with stateless_auth = False.
+        return TOKEN_VERSION_CLAIM in validated_token and getattr(view, 'stateless_auth', True)
+
+
+async def aauthenticate(request):
+    # For plain async Django views. Authenticators are synchronous and may read the users table or the
+    # token version cache, so they run off the event loop.
+    return await sync_to_async(lambda: Request(request, authenticators=[RoleJWTAuthentication()]).user)()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:01
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_address'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(django.db.models.functions.text.Upper('city'), name='address_city_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_address_city_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_version',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser
 
 class CustomUserManager(BaseUserManager):
@@ -20,6 +21,8 @@ class CustomUserManager(BaseUserManager):
 class User(AbstractUser):
     username = None
     email = models.EmailField(unique=True)
+    # Bumped to revoke every token issued so far; see accounts.tokens.
+    token_version = models.PositiveIntegerField(default=0, db_default=0, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name']
@@ -29,6 +32,13 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # The flags the admin role was resolved from, to tell when a save changes it.
+        user._loaded_staff = (user.__dict__.get('is_staff'), user.__dict__.get('is_superuser'))
+        return user
+
 class Address(models.Model):
     address_line_1 = models.CharField(max_length=255)
     address_line_2 = models.CharField(max_length=255, null=True, blank=True)
@@ -40,6 +50,9 @@ class Address(models.Model):
         db_table = "Addresses"
         verbose_name = "Address"
         verbose_name_plural = "Addresses"
+        indexes = [
+            models.Index(Upper("city"), name="address_city_upper_idx"),
+        ]
 
     def __str__(self):
         return f'{self.address_line_1} - {self.address_line_2} - {self.city} - {self.country}'
@@ -1,27 +1,24 @@
 from rest_framework.permissions import BasePermission
+from accounts.roles import is_admin, is_owner
 from football.models import FootballField
-from django.contrib.auth.models import Group
 
 class IsAdminUser(BasePermission):
     def has_permission(self, request, view):
-        user = request.user
-        admin_group, _ = Group.objects.get_or_create(name='Admins')
-        if user.is_superuser or user.is_staff or user.groups.all().first() == admin_group:
-            return True
-        return bool(
-            user and user.is_authenticated
-            and (user.is_staff or user.is_superuser)
-        )
+        return is_admin(request)
 
 
 class IsFieldOwner(BasePermission):
     def has_object_permission(self, request, view, obj: FootballField):
         user = request.user
-        admin_group, _ = Group.objects.get_or_create(name='Admins')
-        if user.is_superuser or user.is_staff or user.groups.all().first() == admin_group:
+        if is_admin(request):
             return True
         return bool(
             user and user.is_authenticated
-            and (obj.owner == user)
+            and (obj.owner_id == user.id)
 
         )
+
+
+class IsAdminOrOwner(BasePermission):
+    def has_permission(self, request, view):
+        return is_admin(request) or is_owner(request)
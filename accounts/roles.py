@@ -0,0 +1,62 @@
+from django.contrib.auth.models import Group
+from django.db.models import Exists, OuterRef
+
+from accounts.models import User
+
+ADMIN_GROUP_NAME = 'Admins'
+ADMIN = 'admin'
+OWNER = 'owner'
+
+_admin_group_id = None
+
+
+def get_admin_group_id():
+    global _admin_group_id
+    if _admin_group_id is None:
+        admin_group, _ = Group.objects.get_or_create(name=ADMIN_GROUP_NAME)
+        _admin_group_id = admin_group.id
+    return _admin_group_id
+
+
+def clear_admin_group_id():
+    global _admin_group_id
+    _admin_group_id = None
+
+
+def resolve_roles(user):
+    from football.models import FootballField
+
+    if not user or not user.is_authenticated:
+        return frozenset()
+    # Stateless JWT users carry their roles as token claims.
+    claimed_roles = getattr(user, 'roles', None)
+    if claimed_roles is not None:
+        return claimed_roles
+
+    in_admin_group, owns_fields = User.objects.filter(pk=user.pk).annotate(
+        in_admin_group=Exists(User.groups.through.objects.filter(user_id=OuterRef('pk'), group_id=get_admin_group_id())),
+        owns_fields=Exists(FootballField.objects.filter(owner_id=OuterRef('pk'))),
+    ).values_list('in_admin_group', 'owns_fields').first() or (False, False)
+
+    roles = set()
+    if user.is_superuser or user.is_staff or in_admin_group:
+        roles.add(ADMIN)
+    if owns_fields:
+        roles.add(OWNER)
+    return frozenset(roles)
+
+
+def get_roles(request):
+    # Resolved at most once per request; permissions and querysets all share the result.
+    roles = getattr(request, '_roles', None)
+    if roles is None:
+        roles = request._roles = resolve_roles(request.user)
+    return roles
+
+
+def is_admin(request):
+    return ADMIN in get_roles(request)
+
+
+def is_owner(request):
+    return OWNER in get_roles(request)
@@ -1,5 +1,9 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
 from accounts.models import User, Address
+from accounts.tokens import RoleRefreshToken, role_claims
 from django.contrib.auth.models import Group
 
 
@@ -63,3 +67,24 @@ class AddressSerializer(serializers.ModelSerializer):
             "id": {"read_only": True}
         }
 
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RoleRefreshToken
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RoleRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # Claims would otherwise be copied from the refresh token, as they were at login. Resolving them
+        # again lets a refresh pick up role changes, and get past the revocation that announced them.
+        access = AccessToken(data['access'], verify=False)
+        claims = role_claims(User.objects.get(pk=access[api_settings.USER_ID_CLAIM]))
+        access.payload.update(claims)
+        data['access'] = str(access)
+        if 'refresh' in data:
+            refresh = self.token_class(data['refresh'], verify=False)
+            refresh.payload.update(claims)
+            data['refresh'] = str(refresh)
+        return data
@@ -0,0 +1,42 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import User
+from accounts.roles import ADMIN_GROUP_NAME, clear_admin_group_id, get_admin_group_id
+from accounts.tokens import revoke_on_commit
+
+
+@receiver([post_save, post_delete], sender=Group)
+def reset_admin_group_id(sender, instance, **kwargs):
+    if instance.name == ADMIN_GROUP_NAME:
+        clear_admin_group_id()
+
+
+@receiver(pre_delete, sender=Group)
+def revoke_admins_of_deleted_group(sender, instance, **kwargs):
+    if instance.name == ADMIN_GROUP_NAME:
+        revoke_on_commit(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def revoke_on_admin_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # Users added to or removed from a group.
+        if instance.name == ADMIN_GROUP_NAME:
+            revoke_on_commit(instance.user_set.values_list('pk', flat=True) if action == 'pre_clear' else pk_set)
+    elif action == 'pre_clear':
+        if instance.groups.filter(name=ADMIN_GROUP_NAME).exists():
+            revoke_on_commit([instance.pk])
+    elif get_admin_group_id() in pk_set:
+        revoke_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def revoke_on_staff_change(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_staff', None)
+    if not created and loaded and None not in loaded and loaded != (instance.is_staff, instance.is_superuser):
+        revoke_on_commit([instance.pk])
+    instance._loaded_staff = (instance.is_staff, instance.is_superuser)
@@ -1,3 +1,193 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import Address, User
+from accounts.roles import ADMIN, OWNER, clear_admin_group_id, get_admin_group_id, resolve_roles
+from accounts.tokens import get_token_version, token_version_key
+from appointments.models import Appointment
+from football.models import FootballField
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RoleResolutionTests(TestCase):
+    def setUp(self):
+        self.admins = Group.objects.create(name="Admins")
+        self.admin = User.objects.create_user(email="admin@example.com", password="pass", first_name="Admin")
+        self.admin.groups.add(Group.objects.create(name="Users"), self.admins)
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        self.player = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.owner, address=address, price=100)
+        self.appointment = Appointment.objects.create(
+            user=self.player, field=self.field, start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, hours=1),
+        )
+        self.client = APIClient()
+        get_admin_group_id()
+
+    def test_admin_group_id_is_cached_in_process(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_admin_group_id(), self.admins.id)
+
+    def test_roles_are_resolved_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_roles(self.admin), {ADMIN})
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_roles(self.owner), {OWNER})
+
+    def test_admin_in_several_groups_sees_every_appointment(self):
+        self.client.force_authenticate(self.admin)
+        # One query resolves the roles, one loads the page.
+        with self.assertNumQueries(2):
+            response = self.client.get("/appointments/")
+
+        self.assertEqual([appointment["id"] for appointment in response.data["results"]], [self.appointment.id])
+
+    def test_protected_endpoints_resolve_roles_once(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/football/cache-stats/").status_code, 200)
+
+        self.client.force_authenticate(self.player)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/football/cache-stats/").status_code, 403)
+        # Object lookup plus roles; the foreign key comparison needs no extra query.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.put(f"/football/{self.field.id}/", {}, format="json").status_code, 403)
+        # Lookup, roles, delete and the rollup and heatmap updates.
+        with self.assertNumQueries(5):
+            self.assertEqual(self.client.delete(f"/appointments/{self.appointment.id}/").status_code, 204)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, JWT_STATELESS_AUTH=True)
+class StatelessAuthenticationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        FootballField.objects.create(name="Arena", owner=self.owner, address=address, price=100)
+        self.client = APIClient()
+        get_admin_group_id()
+
+    def login(self):
+        response = self.client.post("/accounts/login/", {"email": "owner@example.com", "password": "pass"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data
+
+    def test_login_embeds_role_claims(self):
+        token = AccessToken(self.login()["access"])
+
+        self.assertEqual(str(token["user_id"]), str(self.owner.id))
+        self.assertFalse(token["is_admin"])
+        self.assertTrue(token["is_owner"])
+        self.assertEqual(token["token_version"], 0)
+
+    def test_registration_tokens_carry_claims(self):
+        response = self.client.post("/accounts/register/", {
+            "first_name": "New", "last_name": "Player", "email": "new@example.com",
+            "password": "secret-pass-123", "re_password": "secret-pass-123",
+        })
+
+        self.assertIn("token_version", AccessToken(response.data["tokens"]["access"]))
+
+    def test_read_only_requests_do_not_load_the_user(self):
+        self.login()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/appointments/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('FROM "Users"', queries[0]["sql"])
+
+    def test_profile_still_reads_the_user_row(self):
+        self.login()
+
+        self.assertEqual(self.client.get("/accounts/profile/").data["email"], "owner@example.com")
+
+    def test_logout_revokes_access_tokens_immediately(self):
+        tokens = self.login()
+
+        response = self.client.delete("/accounts/logout/", {"refresh_token": tokens["refresh"]}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get("/appointments/").status_code, 401)
+
+    def test_revocation_survives_losing_the_cached_version(self):
+        tokens = self.login()
+        self.assertEqual(self.client.get("/appointments/").status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete("/accounts/logout/", {"refresh_token": tokens["refresh"]}, format="json")
+        self.assertEqual(self.client.get("/appointments/").status_code, 401)
+        cache.delete(token_version_key(self.owner.id))
+
+        self.assertEqual(self.client.get("/appointments/").status_code, 401)
+        self.assertEqual(get_token_version(self.owner.id), 1)
+
+    def test_account_deletion_revokes_access_tokens_immediately(self):
+        self.login()
+
+        self.assertEqual(self.client.delete("/accounts/delete-account/").status_code, 200)
+        self.assertEqual(self.client.get("/appointments/").status_code, 401)
+
+    def refresh(self, tokens):
+        response = self.client.post("/accounts/login/refresh/", {"refresh": tokens["refresh"]})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return AccessToken(response.data["access"])
+
+    def test_leaving_the_admins_revokes_admin_claims_until_refresh(self):
+        clear_admin_group_id()
+        admins = Group.objects.get(pk=get_admin_group_id())
+        self.owner.groups.add(admins)
+        tokens = self.login()
+        self.assertEqual(self.client.get("/appointments/export/").status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.groups.remove(admins)
+
+        self.assertEqual(self.client.get("/appointments/").status_code, 401)
+        token = self.refresh(tokens)
+        self.assertFalse(token["is_admin"])
+        self.assertTrue(token["is_owner"])
+        self.assertEqual(self.client.get("/appointments/").status_code, 200)
+
+    def test_staff_flag_changes_revoke_tokens(self):
+        tokens = self.login()
+        user = User.objects.get(pk=self.owner.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.first_name = "Renamed"
+            user.save()
+        self.assertEqual(self.client.get("/appointments/").status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_staff = True
+            user.save()
+        self.assertEqual(self.client.get("/appointments/").status_code, 401)
+        self.assertTrue(self.refresh(tokens)["is_admin"])
+
+    def test_a_first_field_grants_owner_claims_after_refresh(self):
+        User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        response = self.client.post("/accounts/login/", {"email": "player@example.com", "password": "pass"})
+        tokens = response.data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get("/appointments/export/").status_code, 403)
+
+        player = User.objects.get(email="player@example.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            field = FootballField.objects.get(owner=self.owner)
+            field.owner = player
+            field.save()
+
+        self.assertEqual(self.client.get("/appointments/export/").status_code, 401)
+        self.assertTrue(self.refresh(tokens)["is_owner"])
+        self.assertEqual(self.client.get("/appointments/export/").status_code, 200)
@@ -0,0 +1,77 @@
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from accounts.roles import ADMIN, OWNER, resolve_roles
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+
+def token_version_key(user_id):
+    return f"token_version:{user_id}"
+
+
+def load_token_version(user_id):
+    # None for a deleted user, which no token's version matches.
+    return User.objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+
+
+def get_token_version(user_id):
+    # The users table holds the version; the cache only saves reading it on every request, so an evicted or
+    # flushed key is read back rather than taken as version 0.
+    key = token_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = load_token_version(user_id)
+        if version is not None:
+            # add(), not set(): a bump that lands meanwhile has already cached the newer version.
+            cache.add(key, version, timeout=None)
+    return version
+
+
+def cache_token_version(user_id):
+    version = load_token_version(user_id)
+    if version is None:
+        cache.delete(token_version_key(user_id))
+    else:
+        cache.set(token_version_key(user_id), version, timeout=None)
+
+
+def bump_token_version(user_id):
+    # Every token issued before the bump carries an older version and is rejected from now on.
+    User.objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+    # Dropped now, so this transaction reads the new version back, and cached again once others can see it.
+    cache.delete(token_version_key(user_id))
+    transaction.on_commit(partial(cache_token_version, user_id))
+
+
+def forget_token_version(user_id):
+    # For deleted users: with their row gone the version reads back as None, which no token matches.
+    key = token_version_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(partial(cache.delete, key))
+
+
+def revoke_on_commit(user_ids):
+    # For role changes: after the bump, a token's role claims may be stale, so the client has to refresh
+    # it, which resolves the roles again. Bumped only once the change is visible to that refresh.
+    for user_id in set(user_ids):
+        transaction.on_commit(partial(bump_token_version, user_id))
+
+
+def role_claims(user):
+    roles = resolve_roles(user)
+    cache.add(token_version_key(user.id), user.token_version, timeout=None)
+    return {'is_admin': ADMIN in roles, 'is_owner': OWNER in roles, TOKEN_VERSION_CLAIM: user.token_version}
+
+
+class RoleRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.payload.update(role_claims(user))
+        return token
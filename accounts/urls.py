@@ -1,9 +1,7 @@
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView
-)
+from rest_framework_simplejwt.views import TokenRefreshView
 from accounts.views import (
+    LoginView,
     RegisterUserAPIView,
     UserProfileView,
     DeleteAccountView, LogoutView
@@ -12,7 +10,7 @@ from accounts.views import (
 app_name = "accounts"
 
 urlpatterns = [
-    path('login/', TokenObtainPairView.as_view(), name="login"),
+    path('login/', LoginView.as_view(), name="login"),
     path('login/refresh/', TokenRefreshView.as_view(), name="refresh_token"),
     path("register/", RegisterUserAPIView.as_view(), name="register"),
     path('logout/', LogoutView.as_view(), name="logout"),
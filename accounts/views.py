@@ -1,19 +1,28 @@
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 from accounts.models import User
+from accounts.tokens import RoleRefreshToken, bump_token_version, forget_token_version
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from accounts.serializers import UserSerializer, RegisterUserSerializer
 from rest_framework.response import Response
+from config.idempotency import idempotent
+
+class LoginView(TokenObtainPairView):
+    throttle_scope = "login"
+
 
 class RegisterUserAPIView(APIView):
     permission_classes = [AllowAny]
+
+    @idempotent
     def post(self, request):
         serializer = RegisterUserSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
 
-        refresh = RefreshToken.for_user(user)
+        refresh = RoleRefreshToken.for_user(user)
         return Response({
             "message": "Registration completed successfully",
             "user": UserSerializer(user).data,
@@ -30,6 +39,7 @@ class LogoutView(APIView):
             if refresh_token:
                 token = RefreshToken(refresh_token)
                 token.blacklist()
+                bump_token_version(request.user.id)
                 return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
             else:
                 return Response({'error': 'Refresh token is required'}, status=status.HTTP_400_BAD_REQUEST)
@@ -38,6 +48,8 @@ class LogoutView(APIView):
 
 
 class UserProfileView(APIView):
+    stateless_auth = False
+
     def get(self, request):
         serializer = UserSerializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -48,6 +60,8 @@ class DeleteAccountView(APIView):
 
     def delete(self, request):
         user = request.user
+        user_id = user.id
         user.delete()
+        forget_token_version(user_id)
         return Response({"message": "Account deletion was successful."}, status=status.HTTP_200_OK)
 
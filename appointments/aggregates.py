@@ -0,0 +1,33 @@
+from appointments import heatmap, live, rollups
+
+# Every table derived from appointments, and the live slot stream, is kept current from here. The model
+# signals cover single saves and deletes; paths that bypass them (bulk_create, cascades) call these
+# functions directly.
+AGGREGATES = (rollups, heatmap, live)
+
+
+def booking_saved(appointment):
+    old, new = getattr(appointment, "_stored", None), appointment.stored_state()
+    if old != new:
+        for aggregate in AGGREGATES:
+            aggregate.record_change(old, new)
+    appointment._stored = new
+
+
+def booking_deleted(appointment):
+    old = getattr(appointment, "_stored", None) or appointment.stored_state()
+    for aggregate in AGGREGATES:
+        aggregate.record_change(old, None)
+
+
+def bookings_created(appointments):
+    states = [appointment.stored_state() for appointment in appointments]
+    for aggregate in AGGREGATES:
+        aggregate.record_created(states)
+    for appointment, state in zip(appointments, states):
+        appointment._stored = state
+
+
+def user_deleted(user_id):
+    for aggregate in AGGREGATES:
+        aggregate.record_user_deleted(user_id)
@@ -0,0 +1,151 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from appointments import holds
+from appointments.models import Appointment
+from appointments.slots import MAX_RANGE_DAYS, MAX_SLOTS, SlotGrid
+from football.models import FootballField
+
+INVALID_SLOTS_QUERY = 'Invalid field_id, date format, or duration'
+
+# Request parsing, querysets and response bodies shared by the sync viewset actions and the async views.
+# Only the database calls differ between the two: get()/list() there, aget()/async for here.
+
+
+class AvailabilityError(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+
+    def __init__(self, error, status_code=None):
+        super().__init__({'error': error})
+        if status_code is not None:
+            self.status_code = status_code
+
+
+def field_not_found():
+    return AvailabilityError('Field not found', status.HTTP_404_NOT_FOUND)
+
+
+def invalid_slots_query():
+    return AvailabilityError(INVALID_SLOTS_QUERY)
+
+
+def get_field(field_id, not_found):
+    try:
+        return FootballField.objects.get(id=field_id)
+    except FootballField.DoesNotExist:
+        raise not_found
+
+
+async def aget_field(field_id, not_found):
+    try:
+        return await FootballField.objects.aget(id=field_id)
+    except FootballField.DoesNotExist:
+        raise not_found
+
+
+def parse_slots_query(params):
+    field_id = params.get('field_id')
+    date_str = params.get('date')
+    end_date_str = params.get('end_date')
+
+    if not field_id or not date_str:
+        raise AvailabilityError('field_id and date are required')
+
+    try:
+        date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        query = {
+            'field_id': int(field_id),
+            'date': date,
+            'end_date': datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else date,
+            'duration_hours': float(params.get('duration', '1')),
+            'step_minutes': int(params.get('step', '60')),
+        }
+    except ValueError:
+        raise invalid_slots_query()
+    query['duration_minutes'] = round(query['duration_hours'] * 60)
+
+    if query['duration_minutes'] <= 0 or query['step_minutes'] <= 0:
+        raise AvailabilityError('duration and step must be positive')
+    if not 0 <= (query['end_date'] - date).days < MAX_RANGE_DAYS:
+        raise AvailabilityError(f'end_date must be within {MAX_RANGE_DAYS} days after date')
+    days = (query['end_date'] - date).days + 1
+    if days * 24 * 60 // query['step_minutes'] > MAX_SLOTS:
+        raise AvailabilityError(f'step is too small for {days} days; at most {MAX_SLOTS} slots can be listed')
+    return query
+
+
+def slot_grid(field, query):
+    return SlotGrid(query['date'], query['end_date'], field.opening_time, field.closing_time)
+
+
+def busy_intervals(field, grid):
+    return Appointment.objects.filter(field=field).overlapping(grid.start, grid.end).values_list(
+        'start_time', 'end_time'
+    )
+
+
+def held(field, start_time, end_time, user):
+    # Other users' slot holds count as busy; the requesting user's own do not.
+    return holds.held_intervals([field.id], start_time, end_time, user.id)[field.id]
+
+
+def available_slots(field, query, grid, busy):
+    duration_hours = query['duration_hours']
+    return {
+        'field_name': field.name,
+        'date': query['date'],
+        'end_date': query['end_date'],
+        'requested_duration': duration_hours,
+        'step_minutes': query['step_minutes'],
+        'available_slots': [
+            {'start_time': start, 'end_time': end, 'duration_hours': duration_hours}
+            for start, end in grid.slots(busy, query['duration_minutes'], query['step_minutes'])
+        ]
+    }
+
+
+def requested_window(date, start_time, end_time):
+    return timezone.make_aware(datetime.combine(date, start_time)), timezone.make_aware(datetime.combine(date, end_time))
+
+
+def conflicting(field, start_time, end_time):
+    return Appointment.objects.filter(field=field).overlapping(start_time, end_time)
+
+
+def conflicts_result(conflicts):
+    return {
+        'available': not conflicts,
+        'conflicts': conflicts
+    }
+
+
+def day_appointments(field, date):
+    day_start, day_end = day_window(date)
+    return Appointment.objects.filter(
+        field=field,
+        start_time__gte=day_start,
+        start_time__lte=day_end
+    ).order_by('start_time').select_related('user')
+
+
+def day_window(date):
+    return timezone.make_aware(datetime.combine(date, time.min)), timezone.make_aware(datetime.combine(date, time.max))
+
+
+def busy_day(field, date, appointments, held_slots=()):
+    return {
+        'field_name': field.name,
+        'date': date,
+        'busy_slots': [
+            {
+                'start_time': appointment.start_time,
+                'end_time': appointment.end_time,
+                'user': appointment.user.get_full_name() or appointment.user.email
+            }
+            for appointment in appointments
+        ],
+        'held_slots': [{'start_time': start, 'end_time': end} for start, end in held_slots],
+    }
@@ -0,0 +1,60 @@
+import csv
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+# Rows are fetched through a server-side cursor, chunk by chunk, as plain dicts, and written out as they
+# arrive; nothing holds more than a chunk of the export in memory.
+CHUNK_SIZE = 2000
+COLUMNS = ("id", "field_id", "user_id", "start_time", "end_time", "total_cost", "created_at")
+RELATED_COLUMNS = {"field_name": F("field__name"), "user_email": F("user__email")}
+HEADER = COLUMNS + tuple(RELATED_COLUMNS)
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class Echo:
+    # csv.writer writes to this and hands the formatted line straight back.
+    def write(self, value):
+        return value
+
+
+def rows(queryset):
+    return queryset.order_by("start_time", "id").values(*COLUMNS, **RELATED_COLUMNS).iterator(
+        chunk_size=CHUNK_SIZE
+    )
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    encoder = DjangoJSONEncoder()
+    yield writer.writerow(HEADER)
+    batch = []
+    for row in rows:
+        # The same ISO 8601 timestamps as the JSON API.
+        batch.append(writer.writerow(
+            [encoder.default(value) if isinstance(value, datetime) else value for value in row.values()]
+        ))
+        if len(batch) == CHUNK_SIZE:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder()
+    batch = []
+    for row in rows:
+        batch.append(encoder.encode(row))
+        if len(batch) == CHUNK_SIZE:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+
+
+WRITERS = {"csv": csv_lines, "ndjson": ndjson_lines}
@@ -0,0 +1,200 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from appointments.models import HOURS_PER_WEEK, MAX_BOOKING_DURATION, Appointment, FieldWeekHeatmap
+from appointments.rollups import lock_for_rebuild
+
+HOUR = timedelta(hours=1)
+WEEK = timedelta(weeks=1)
+RECONCILE_WEEKS = 12
+
+UPSERT_SQL = """
+    INSERT INTO {table} (field_id, week, seconds)
+    VALUES {rows}
+    ON CONFLICT (field_id, week) DO UPDATE SET seconds = ARRAY(
+        SELECT old + new
+        FROM unnest({table}.seconds, EXCLUDED.seconds) WITH ORDINALITY AS cells(old, new, slot)
+        ORDER BY slot
+    )
+"""
+
+# Splits every matching booking at local hour boundaries. Shared by the reconcile job, the grouped
+# user-deletion update and the on-the-fly benchmark baseline.
+HOURS_SQL = """
+    WITH bookings AS (
+        SELECT field_id, start_time AT TIME ZONE %(tz)s AS local_start, end_time AT TIME ZONE %(tz)s AS local_end
+        FROM {appointments}
+        WHERE {where}
+    ), cells AS (
+        SELECT field_id, date_trunc('week', hour)::date AS week,
+               ((EXTRACT(ISODOW FROM hour) - 1) * 24 + EXTRACT(HOUR FROM hour))::int AS slot,
+               SUM(EXTRACT(EPOCH FROM LEAST(local_end, hour + INTERVAL '1 hour') - GREATEST(local_start, hour)))::int
+                   AS seconds
+        FROM bookings
+        CROSS JOIN LATERAL generate_series(
+            date_trunc('hour', local_start), local_end - INTERVAL '1 microsecond', INTERVAL '1 hour'
+        ) AS hour
+        WHERE hour >= %(since)s AND hour < %(until)s
+        GROUP BY 1, 2, 3
+    )
+"""
+
+AGGREGATE_SQL = HOURS_SQL + """
+    INSERT INTO {table} (field_id, week, seconds)
+    SELECT weeks.field_id, weeks.week, array_agg(%(sign)s * COALESCE(cells.seconds, 0) ORDER BY slots.slot)
+    FROM (SELECT DISTINCT field_id, week FROM cells) AS weeks
+    CROSS JOIN generate_series(0, {last_slot}) AS slots(slot)
+    LEFT JOIN cells ON cells.field_id = weeks.field_id AND cells.week = weeks.week AND cells.slot = slots.slot
+    GROUP BY 1, 2
+    ON CONFLICT (field_id, week) DO UPDATE SET seconds = ARRAY(
+        SELECT old + new
+        FROM unnest({table}.seconds, EXCLUDED.seconds) WITH ORDINALITY AS cells(old, new, slot)
+        ORDER BY slot
+    )
+"""
+
+LIVE_SQL = HOURS_SQL + """
+    SELECT slot, SUM(seconds) FROM cells GROUP BY slot
+"""
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def split(start_time, end_time):
+    # Yields (week, slot, seconds) for every local hour the interval touches.
+    current, end_time = timezone.localtime(start_time), timezone.localtime(end_time)
+    while current < end_time:
+        boundary = min(current.replace(minute=0, second=0, microsecond=0) + HOUR, end_time)
+        day = current.date()
+        yield week_start(day), day.weekday() * 24 + current.hour, int((boundary - current).total_seconds())
+        current = boundary
+
+
+def apply_deltas(deltas):
+    # deltas: iterable of (field_id, week, slot, seconds), merged into one dense array per (field, week).
+    arrays = defaultdict(lambda: [0] * HOURS_PER_WEEK)
+    for field_id, week, slot, seconds in deltas:
+        arrays[field_id, week][slot] += seconds
+    keys = sorted(key for key, seconds in arrays.items() if any(seconds))
+    if not keys:
+        return
+
+    params = []
+    for field_id, week in keys:
+        params += [field_id, week, arrays[field_id, week]]
+    sql = UPSERT_SQL.format(
+        table=connection.ops.quote_name(FieldWeekHeatmap._meta.db_table),
+        rows=", ".join(["(%s, %s, %s)"] * len(keys)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def contribution(state, sign=1):
+    field_id, start_time, end_time, _ = state
+    for week, slot, seconds in split(start_time, end_time):
+        yield field_id, week, slot, sign * seconds
+
+
+def record_change(old, new):
+    apply_deltas(delta for state, sign in ((old, -1), (new, 1)) if state for delta in contribution(state, sign))
+
+
+def record_created(states):
+    apply_deltas(delta for state in states for delta in contribution(state))
+
+
+def hours_sql(template, where, **params):
+    sql = template.format(
+        table=connection.ops.quote_name(FieldWeekHeatmap._meta.db_table),
+        appointments=connection.ops.quote_name(Appointment._meta.db_table),
+        where=where,
+        last_slot=HOURS_PER_WEEK - 1,
+    )
+    params = {"tz": timezone.get_current_timezone_name(), "since": datetime.min, "until": datetime.max,
+              "sign": 1, **params}
+    return sql, params
+
+
+def record_user_deleted(user_id):
+    with connection.cursor() as cursor:
+        cursor.execute(*hours_sql(AGGREGATE_SQL, "user_id = %(user_id)s", user_id=user_id, sign=-1))
+
+
+def reconcile(weeks=RECONCILE_WEEKS):
+    # Recomputes every week from `weeks` ago onwards, future bookings included, straight from the
+    # appointments table. Drift from writes that bypass the model (queryset.update(), raw SQL) is repaired.
+    # Each week is recomputed in its own short transaction, so booking writes wait for one week at most.
+    since = week_start(timezone.localdate()) - timedelta(weeks=weeks)
+    with transaction.atomic():
+        lock_for_rebuild(FieldWeekHeatmap)
+        last = Appointment.objects.aggregate(last=Max("end_time"))["last"]
+        until = since
+        if last:
+            until = max(since, week_start(timezone.localdate(last - timedelta(microseconds=1))) + WEEK)
+        FieldWeekHeatmap.objects.filter(week__gte=until).delete()
+
+    week = since
+    while week < until:
+        next_week = week + WEEK
+        with transaction.atomic():
+            lock_for_rebuild(FieldWeekHeatmap)
+            FieldWeekHeatmap.objects.filter(week=week).delete()
+            with connection.cursor() as cursor:
+                # The start_time lower bound keeps the scan to the partitions that can hold the week.
+                cursor.execute(*hours_sql(
+                    AGGREGATE_SQL,
+                    "start_time >= %(earliest)s AND start_time < %(until_at)s AND end_time > %(since_at)s",
+                    earliest=local_midnight(week) - MAX_BOOKING_DURATION,
+                    since_at=local_midnight(week), until_at=local_midnight(next_week),
+                    since=datetime.combine(week, time.min), until=datetime.combine(next_week, time.min),
+                ))
+        week = next_week
+
+
+def window(weeks):
+    # The last `weeks` complete weeks.
+    until = week_start(timezone.localdate())
+    return until - timedelta(weeks=weeks), until
+
+
+def to_matrix(seconds, weeks):
+    return [
+        [round(seconds[day * 24 + hour] / (weeks * 3600), 4) for hour in range(24)]
+        for day in range(7)
+    ]
+
+
+def occupancy(field_id, weeks):
+    since, until = window(weeks)
+    totals = [0] * HOURS_PER_WEEK
+    rows = FieldWeekHeatmap.objects.filter(field_id=field_id, week__gte=since, week__lt=until)
+    for seconds in rows.values_list("seconds", flat=True):
+        totals = [total + value for total, value in zip(totals, seconds)]
+    return to_matrix(totals, weeks)
+
+
+def live_occupancy(field_id, weeks):
+    # The on-the-fly equivalent of occupancy(), kept as the benchmark baseline.
+    since, until = window(weeks)
+    sql, params = hours_sql(
+        LIVE_SQL, "field_id = %(field_id)s AND end_time > %(since_at)s AND start_time < %(until_at)s",
+        field_id=field_id, since_at=local_midnight(since), until_at=local_midnight(until),
+        since=datetime.combine(since, time.min), until=datetime.combine(until, time.min),
+    )
+    totals = [0] * HOURS_PER_WEEK
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for slot, seconds in cursor.fetchall():
+            totals[slot] = seconds
+    return to_matrix(totals, weeks)
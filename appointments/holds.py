@@ -0,0 +1,225 @@
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from django.conf import settings
+
+from appointments.models import MAX_BOOKING_DURATION
+
+# Short-lived reservations of a (field, start, end) range while a user checks out. Each field has two sorted
+# sets over the same members, "id|user|start|end|expires" in epoch milliseconds: one scored by start, for
+# overlap lookups, and one scored by expiry. Every script first drops the expired members, so holds lapse
+# on their own with no sweeper, and both keys expire with their last hold.
+KEY_PREFIX = "holds"
+MAX_HOLD_MS = int(MAX_BOOKING_DURATION.total_seconds() * 1000)
+
+COMMON_LUA = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZREM', KEYS[2], member)
+end
+local function parse(member)
+    local id, user, start_ms, end_ms = string.match(member, '^([^|]+)|([^|]+)|(%d+)|(%d+)|')
+    return id, user, tonumber(start_ms), tonumber(end_ms)
+end
+local function overlapping(start_ms, end_ms)
+    local found = {}
+    local candidates = redis.call('ZRANGEBYSCORE', KEYS[1], start_ms - tonumber(ARGV[1]), '(' .. end_ms)
+    for _, member in ipairs(candidates) do
+        local _, _, _, held_end = parse(member)
+        if held_end > start_ms then
+            table.insert(found, member)
+        end
+    end
+    return found
+end
+"""
+
+# ARGV: max hold ms, start ms, end ms. Returns the members overlapping [start, end).
+FIND_SCRIPT = COMMON_LUA + """
+return overlapping(tonumber(ARGV[2]), tonumber(ARGV[3]))
+"""
+
+# ARGV: max hold ms, start ms, end ms, hold id, user id, hold ms. Returns {1, new member}, or {0, member} for
+# another user's hold that is in the way.
+PLACE_SCRIPT = COMMON_LUA + """
+local start_ms, end_ms = tonumber(ARGV[2]), tonumber(ARGV[3])
+for _, member in ipairs(overlapping(start_ms, end_ms)) do
+    local _, holder = parse(member)
+    if holder ~= ARGV[5] then
+        return {0, member}
+    end
+end
+local expires = now + tonumber(ARGV[6])
+local member = table.concat({ARGV[4], ARGV[5], ARGV[2], ARGV[3], string.format('%d', expires)}, '|')
+redis.call('ZADD', KEYS[1], start_ms, member)
+redis.call('ZADD', KEYS[2], expires, member)
+local last = tonumber(redis.call('ZRANGE', KEYS[2], -1, -1, 'WITHSCORES')[2])
+redis.call('PEXPIREAT', KEYS[1], last)
+redis.call('PEXPIREAT', KEYS[2], last)
+return {1, member}
+"""
+
+# ARGV: max hold ms, hold id, and optionally 1 to remove it. Returns the hold's member, if it is active.
+TAKE_SCRIPT = COMMON_LUA + """
+for _, member in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    if parse(member) == ARGV[2] then
+        if ARGV[3] == '1' then
+            redis.call('ZREM', KEYS[1], member)
+            redis.call('ZREM', KEYS[2], member)
+        end
+        return member
+    end
+end
+return false
+"""
+
+
+@dataclass(frozen=True)
+class Hold:
+    id: str
+    field_id: int
+    user_id: int
+    start_time: datetime
+    end_time: datetime
+    expires_at: datetime
+
+    @property
+    def interval(self):
+        return self.start_time, self.end_time
+
+
+def to_ms(moment):
+    return int(moment.timestamp() * 1000)
+
+
+def from_ms(ms):
+    return datetime.fromtimestamp(int(ms) / 1000, tz=dt_timezone.utc)
+
+
+def keys(field_id):
+    return f"{KEY_PREFIX}:{field_id}", f"{KEY_PREFIX}:{field_id}:expiry"
+
+
+def field_of(hold_id):
+    # Hold ids carry their field, so a hold can be found from its id alone.
+    field_id, _, _ = hold_id.partition("-")
+    return int(field_id) if field_id.isdigit() else None
+
+
+def parse(field_id, member):
+    if isinstance(member, bytes):
+        member = member.decode()
+    hold_id, user_id, start_ms, end_ms, expires_ms = member.split("|")
+    return Hold(hold_id, field_id, int(user_id), from_ms(start_ms), from_ms(end_ms), from_ms(expires_ms))
+
+
+class MemoryHolds:
+    # In-process stand-in for the Redis sorted sets, for tests and single-process development.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.holds = {}
+
+    def active(self, field_id):
+        now = time.time()
+        field_holds = self.holds.setdefault(field_id, {})
+        for hold_id in [hold_id for hold_id, hold in field_holds.items() if hold.expires_at.timestamp() <= now]:
+            del field_holds[hold_id]
+        return field_holds
+
+    def find(self, field_id, start_time, end_time):
+        with self.lock:
+            return [hold for hold in self.active(field_id).values()
+                    if hold.start_time < end_time and hold.end_time > start_time]
+
+    def find_many(self, field_ids, start_time, end_time):
+        return {field_id: self.find(field_id, start_time, end_time) for field_id in field_ids}
+
+    def place(self, hold_id, field_id, user_id, start_time, end_time, seconds):
+        with self.lock:
+            field_holds = self.active(field_id)
+            for hold in field_holds.values():
+                if hold.start_time < end_time and hold.end_time > start_time and hold.user_id != user_id:
+                    return False, hold
+            expires_at = from_ms((time.time() + seconds) * 1000)
+            hold = field_holds[hold_id] = Hold(hold_id, field_id, user_id, start_time, end_time, expires_at)
+            return True, hold
+
+    def take(self, field_id, hold_id, remove=False):
+        with self.lock:
+            field_holds = self.active(field_id)
+            return field_holds.pop(hold_id, None) if remove else field_holds.get(hold_id)
+
+
+class RedisHolds:
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+        self.find_script = self.client.register_script(FIND_SCRIPT)
+        self.place_script = self.client.register_script(PLACE_SCRIPT)
+        self.take_script = self.client.register_script(TAKE_SCRIPT)
+
+    def find(self, field_id, start_time, end_time):
+        members = self.find_script(keys=keys(field_id), args=[MAX_HOLD_MS, to_ms(start_time), to_ms(end_time)])
+        return [parse(field_id, member) for member in members]
+
+    def find_many(self, field_ids, start_time, end_time):
+        # One round trip for any number of fields.
+        with self.client.pipeline(transaction=False) as pipe:
+            for field_id in field_ids:
+                self.find_script(keys=keys(field_id), args=[MAX_HOLD_MS, to_ms(start_time), to_ms(end_time)],
+                                 client=pipe)
+            results = pipe.execute()
+        return {field_id: [parse(field_id, member) for member in members]
+                for field_id, members in zip(field_ids, results)}
+
+    def place(self, hold_id, field_id, user_id, start_time, end_time, seconds):
+        placed, member = self.place_script(keys=keys(field_id), args=[
+            MAX_HOLD_MS, to_ms(start_time), to_ms(end_time), hold_id, user_id, int(seconds * 1000),
+        ])
+        return bool(placed), parse(field_id, member)
+
+    def take(self, field_id, hold_id, remove=False):
+        member = self.take_script(keys=keys(field_id), args=[MAX_HOLD_MS, hold_id, 1 if remove else 0])
+        return parse(field_id, member) if member else None
+
+
+_stores = {}
+
+
+def get_store():
+    url = settings.SLOT_HOLDS_URL
+    if url not in _stores:
+        _stores[url] = MemoryHolds() if url.startswith("memory://") else RedisHolds(url)
+    return _stores[url]
+
+
+def place(field_id, user_id, start_time, end_time):
+    # (True, the new hold) or (False, another user's hold in the way). A user's own holds may overlap.
+    hold_id = f"{field_id}-{secrets.token_urlsafe(12)}"
+    return get_store().place(hold_id, field_id, user_id, start_time, end_time, settings.SLOT_HOLD_SECONDS)
+
+
+def get(hold_id):
+    field_id = field_of(hold_id)
+    return get_store().take(field_id, hold_id) if field_id is not None else None
+
+
+def release(hold):
+    return get_store().take(hold.field_id, hold.id, remove=True) is not None
+
+
+def held_by_others(field_id, start_time, end_time, user_id=None):
+    return [hold for hold in get_store().find(field_id, start_time, end_time) if hold.user_id != user_id]
+
+
+def held_intervals(field_ids, start_time, end_time, user_id=None):
+    # {field id: [(start, end)]} of other users' holds, for merging with the booked intervals.
+    return {
+        field_id: [hold.interval for hold in holds if hold.user_id != user_id]
+        for field_id, holds in get_store().find_many(field_ids, start_time, end_time).items()
+    }
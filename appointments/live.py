@@ -0,0 +1,243 @@
+import asyncio
+import json
+import threading
+import weakref
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from appointments.models import Appointment
+
+CHANNEL_PREFIX = "slots"
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 256
+READ_TIMEOUT = 1.0
+# Put on a client's queue in place of events it fell too far behind to receive.
+RESYNC = object()
+
+
+def channel_name(field_id, day):
+    return f"{CHANNEL_PREFIX}:{field_id}:{day.isoformat()}"
+
+
+def local_dates(start_time, end_time):
+    day, last = timezone.localdate(start_time), timezone.localdate(end_time - timedelta(microseconds=1))
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+class MemoryBroker:
+    # In-process stand-in for Redis pub/sub, for tests and single-process development.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def publish_many(self, messages):
+        with self.lock:
+            deliveries = [(pubsub, channel, message) for channel, message in messages.items()
+                          for pubsub in self.subscribers.get(channel, ())]
+        for pubsub, channel, message in deliveries:
+            pubsub.deliver(channel, message)
+
+    def pubsub(self):
+        return MemoryPubSub(self)
+
+
+class MemoryPubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.messages = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        with self.broker.lock:
+            for channel in channels:
+                self.broker.subscribers[channel].add(self)
+
+    async def unsubscribe(self, *channels):
+        with self.broker.lock:
+            for channel in channels:
+                self.broker.subscribers[channel].discard(self)
+                if not self.broker.subscribers[channel]:
+                    del self.broker.subscribers[channel]
+
+    def deliver(self, channel, message):
+        # Publishers run on request or worker threads, not on this loop.
+        self.loop.call_soon_threadsafe(self.messages.put_nowait, {"type": "message", "channel": channel,
+                                                                  "data": message})
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=None):
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+class RedisBroker:
+    def __init__(self, url):
+        self.url = url
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def publish_many(self, messages):
+        with self.client.pipeline(transaction=False) as pipe:
+            for channel, message in messages.items():
+                pipe.publish(channel, message)
+            pipe.execute()
+
+    def pubsub(self):
+        return redis.asyncio.Redis.from_url(self.url, decode_responses=True).pubsub(ignore_subscribe_messages=True)
+
+
+_brokers = {}
+
+
+def get_broker():
+    url = settings.LIVE_SLOTS_BROKER_URL
+    if url not in _brokers:
+        _brokers[url] = MemoryBroker() if url.startswith("memory://") else RedisBroker(url)
+    return _brokers[url]
+
+
+# Publishing. The aggregates hook calls these for every booking write; events go out after commit, one
+# message per (field, date) channel touched, carrying only the intervals that were booked or released.
+
+def publish(changes):
+    events = defaultdict(lambda: defaultdict(list))
+    for state, kind in changes:
+        field_id, start_time, end_time, _ = state
+        for day in local_dates(start_time, end_time):
+            events[channel_name(field_id, day)][kind].append([start_time, end_time])
+    if not events:
+        return
+
+    messages = {channel: json.dumps(event, cls=DjangoJSONEncoder) for channel, event in events.items()}
+    transaction.on_commit(lambda: get_broker().publish_many(messages), robust=True)
+
+
+def record_change(old, new):
+    # A price-only change leaves the slot as it was.
+    if old and new and old[:3] == new[:3]:
+        return
+    publish([(state, kind) for state, kind in ((old, "released"), (new, "booked")) if state])
+
+
+def record_created(states):
+    publish((state, "booked") for state in states)
+
+
+def record_user_deleted(user_id):
+    upcoming = Appointment.objects.filter(user_id=user_id, end_time__gt=timezone.now())
+    publish(((*state, None), "released") for state in upcoming.values_list("field_id", "start_time", "end_time"))
+
+
+# Subscribing. Each event loop has one hub, and the hub holds one broker subscription per channel however
+# many local clients watch it.
+
+class Hub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.pubsub = None
+        self.reader = None
+        self.listeners = defaultdict(set)
+        # Keeps subscribe and unsubscribe for the same channel from crossing on the wire.
+        self.lock = asyncio.Lock()
+
+    async def join(self, channel, queue):
+        async with self.lock:
+            if self.pubsub is None:
+                self.pubsub = self.broker.pubsub()
+            if not self.listeners[channel]:
+                await self.pubsub.subscribe(channel)
+            self.listeners[channel].add(queue)
+        if self.reader is None or self.reader.done():
+            self.reader = asyncio.create_task(self.read())
+
+    async def leave(self, channel, queue):
+        async with self.lock:
+            listeners = self.listeners.get(channel, set())
+            listeners.discard(queue)
+            if not listeners and channel in self.listeners:
+                del self.listeners[channel]
+                await self.pubsub.unsubscribe(channel)
+            if not self.listeners and self.reader is not None:
+                self.reader.cancel()
+                self.reader = None
+
+    async def read(self):
+        while self.listeners:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=READ_TIMEOUT)
+            except redis.ConnectionError:
+                # The client resubscribes on reconnect, but anything published meanwhile is lost.
+                await asyncio.sleep(READ_TIMEOUT)
+                for channel in list(self.listeners):
+                    self.dispatch(channel, RESYNC)
+                continue
+            if message and message["type"] == "message":
+                self.dispatch(message["channel"], message["data"])
+
+    def dispatch(self, channel, data):
+        for queue in self.listeners.get(channel, ()):
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    loop = asyncio.get_running_loop()
+    broker = get_broker()
+    hub = _hubs.get(loop)
+    if hub is None or hub.broker is not broker:
+        hub = _hubs[loop] = Hub(broker)
+    return hub
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def snapshot(field_id, day):
+    busy = Appointment.objects.filter(field_id=field_id).overlapping(*day_bounds(day)).order_by("start_time")
+    intervals = [[start, end] async for start, end in busy.values_list("start_time", "end_time")]
+    return json.dumps({"field_id": field_id, "date": day, "busy": intervals}, cls=DjangoJSONEncoder)
+
+
+async def stream(field_id, day):
+    # Subscribed before the snapshot is read, so a booking committed in between arrives as a delta as well;
+    # clients apply deltas as set operations, which makes the overlap harmless.
+    channel = channel_name(field_id, day)
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    hub = get_hub()
+    await hub.join(channel, queue)
+    try:
+        yield sse("snapshot", await snapshot(field_id, day))
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if data is RESYNC:
+                yield sse("snapshot", await snapshot(field_id, day))
+            else:
+                yield sse("delta", data)
+    finally:
+        await hub.leave(channel, queue)
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from appointments import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Detach monthly appointment partitions older than --keep-months and move them to the "
+        f"'{partitions.ARCHIVE_SCHEMA}' schema, or export them as gzipped CSV and drop them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-months", type=int, default=24,
+                            help="Full months kept before the current one.")
+        parser.add_argument("--export-dir", type=Path, help="Write each partition to <dir>/<partition>.csv.gz.")
+        parser.add_argument("--drop", action="store_true", help="Drop partitions instead of keeping them in the "
+                                                                "archive schema. Requires --export-dir.")
+
+    def handle(self, *args, **options):
+        if options["keep_months"] < 0:
+            raise CommandError("--keep-months cannot be negative.")
+        if options["drop"] and not options["export_dir"]:
+            raise CommandError("--drop without --export-dir would delete the bookings outright.")
+        if options["export_dir"]:
+            options["export_dir"].mkdir(parents=True, exist_ok=True)
+
+        before = partitions.add_months(partitions.month_start(timezone.localdate()), -options["keep_months"])
+        archived = partitions.archive(before, export_dir=options["export_dir"], drop=options["drop"],
+                                      stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Archived {len(archived)} partitions from before {before}."))
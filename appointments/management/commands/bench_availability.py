@@ -0,0 +1,106 @@
+import asyncio
+import statistics
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import AsyncClient, Client, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from football.models import FootballField
+
+PATHS = {
+    "wsgi": "/appointments/available-slots/",
+    "asgi": "/appointments/async/available-slots/",
+}
+
+
+def summary(name, latencies, elapsed, failures):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return (
+        f"{name}: {len(latencies) / elapsed:8.1f} req/s, p50 {statistics.median(latencies) * 1000:7.2f} ms, "
+        f"p99 {p99 * 1000:7.2f} ms, {failures} failed"
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the available-slots endpoint through Django's WSGI handler on a thread pool and through its "
+        "ASGI handler on one event loop, against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128])
+        parser.add_argument("--days", type=int, default=7, help="Days of slots per request.")
+
+    def handle(self, *args, **options):
+        field = FootballField.objects.annotate(bookings=Count("appointments")).order_by("-bookings").first()
+        if field is None:
+            raise CommandError("No fields to query; seed some data first.")
+
+        start = timezone.localdate()
+        self.params = {
+            "field_id": field.id, "date": start.isoformat(),
+            "end_date": (start + timedelta(days=options["days"] - 1)).isoformat(), "duration": "1",
+        }
+        self.headers = {"authorization": f"Bearer {RefreshToken.for_user(field.owner).access_token}"}
+        self.total = options["requests"]
+
+        # The in-process clients send requests for "testserver".
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for concurrency in options["concurrency"]:
+                self.stdout.write(f"{concurrency} concurrent clients, {self.total} requests, field {field.id}")
+                self.stdout.write("  " + self.run_wsgi(concurrency))
+                self.stdout.write("  " + asyncio.run(self.run_asgi(concurrency)))
+
+    def run_wsgi(self, concurrency):
+        latencies, failures = [], []
+        remaining = iter(range(self.total))
+        lock = threading.Lock()
+
+        def worker():
+            client = Client(headers=self.headers)
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    began = time.perf_counter()
+                    response = client.get(PATHS["wsgi"], self.params)
+                    latencies.append(time.perf_counter() - began)
+                    if response.status_code != 200:
+                        failures.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return summary("wsgi", latencies, time.perf_counter() - began, len(failures))
+
+    async def run_asgi(self, concurrency):
+        latencies, failures = [], []
+        client = AsyncClient()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with slots:
+                began = time.perf_counter()
+                response = await client.get(PATHS["asgi"], self.params, headers=self.headers)
+                latencies.append(time.perf_counter() - began)
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+
+        began = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(self.total)))
+        return summary("asgi", latencies, time.perf_counter() - began, len(failures))
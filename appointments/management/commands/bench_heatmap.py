@@ -0,0 +1,36 @@
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from appointments import heatmap
+from football.models import FootballField
+
+
+class Command(BaseCommand):
+    help = "Compare the precomputed occupancy heatmap with computing it from appointments on the fly."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--weeks", type=int, nargs="+", default=[4, 12, 52])
+        parser.add_argument("--fields", type=int, default=3, help="Benchmark the fields with the most bookings.")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        fields = FootballField.objects.annotate(bookings=Count("appointments")).filter(bookings__gt=0).order_by(
+            "-bookings"
+        ).values_list("id", "bookings")[:options["fields"]]
+        if not fields:
+            raise CommandError("No booked fields to benchmark; seed some appointments first.")
+
+        repeat = options["repeat"]
+        for field_id, bookings in fields:
+            for weeks in options["weeks"]:
+                if heatmap.occupancy(field_id, weeks) != heatmap.live_occupancy(field_id, weeks):
+                    self.stderr.write(f"field {field_id}: heatmap differs from live data, run the reconcile task")
+                stored = timeit.timeit(lambda: heatmap.occupancy(field_id, weeks), number=repeat)
+                live = timeit.timeit(lambda: heatmap.live_occupancy(field_id, weeks), number=repeat)
+                self.stdout.write(
+                    f"field {field_id:>6} ({bookings} bookings), {weeks:>2} weeks: "
+                    f"live {live / repeat * 1000:8.2f} ms, stored {stored / repeat * 1000:8.2f} ms, "
+                    f"speedup {live / stored:6.1f}x"
+                )
@@ -0,0 +1,90 @@
+import random
+import timeit
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from appointments.slots import SlotGrid
+
+
+def legacy_available_slots(appointments, day_start, day_end, duration_hours):
+    # The loop AppointmentViewSet.available_slots used before the slot grid, kept as a baseline.
+    available_slots = []
+    current_time = day_start
+
+    for appointment in appointments:
+        if current_time + timedelta(hours=duration_hours) <= appointment.start_time:
+            slot_end = min(appointment.start_time, day_end)
+            if current_time + timedelta(hours=duration_hours) <= slot_end:
+                available_slots.append({
+                    'start_time': current_time,
+                    'end_time': appointment.start_time,
+                    'duration_hours': (appointment.start_time - current_time).total_seconds() / 3600
+                })
+
+        current_time = max(current_time, appointment.end_time)
+
+    if current_time + timedelta(hours=duration_hours) <= day_end:
+        available_slots.append({
+            'start_time': current_time,
+            'end_time': day_end,
+            'duration_hours': (day_end - current_time).total_seconds() / 3600
+        })
+
+    suitable_slots = []
+    for slot in available_slots:
+        if slot['duration_hours'] >= duration_hours:
+            slot_start = slot['start_time']
+            slot_end = slot['end_time']
+
+            while slot_start + timedelta(hours=duration_hours) <= slot_end:
+                suitable_slots.append({
+                    'start_time': slot_start,
+                    'end_time': slot_start + timedelta(hours=duration_hours),
+                    'duration_hours': duration_hours
+                })
+                slot_start += timedelta(minutes=60)
+    return suitable_slots
+
+
+def random_bookings(grid, count, rng):
+    # Non-overlapping bookings of a few minutes each, spread over the opening hours.
+    starts = sorted(rng.sample(range(0, grid.minutes - 1, 2), count))
+    bookings = []
+    for start in starts:
+        length = rng.randint(1, 2)
+        bookings.append((grid.start + timedelta(minutes=start), grid.start + timedelta(minutes=start + length)))
+    return bookings
+
+
+class Command(BaseCommand):
+    help = "Compare the slot grid with the legacy available-slots loop on busy days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, nargs="+", default=[100, 300, 450])
+        parser.add_argument("--duration", type=int, default=1, help="Slot duration in minutes.")
+        parser.add_argument("--step", type=int, default=60, help="Slot step in minutes for the grid.")
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        duration = options["duration"]
+        step = options["step"]
+        repeat = options["repeat"]
+
+        for count in options["bookings"]:
+            grid = SlotGrid(date.today() + timedelta(days=1))
+            bookings = random_bookings(grid, count, rng)
+            appointments = [SimpleNamespace(start_time=start, end_time=end) for start, end in bookings]
+
+            legacy = timeit.timeit(
+                lambda: legacy_available_slots(appointments, grid.start, grid.end, duration / 60), number=repeat
+            )
+            engine = timeit.timeit(lambda: SlotGrid(grid.start.date()).slots(bookings, duration, step), number=repeat)
+
+            self.stdout.write(
+                f"{count:>5} bookings: legacy {legacy / repeat * 1e6:9.1f} us/day, "
+                f"grid {engine / repeat * 1e6:9.1f} us/day, speedup {legacy / engine:5.2f}x"
+            )
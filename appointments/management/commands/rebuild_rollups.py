@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from appointments import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the per field, per day revenue and occupancy rollups from appointments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-days", type=int, default=31,
+                            help="Days recomputed per transaction.")
+
+    def handle(self, *args, **options):
+        rollups.rebuild(chunk_days=options["chunk_days"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt."))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_appointment_keyset_indexes'),
+        ('football', '0010_footballfield_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FieldDayRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('booked_seconds', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('field', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_rollups', to='football.footballfield')),
+            ],
+            options={
+                'db_table': 'Field Day Rollups',
+                'constraints': [models.UniqueConstraint(fields=('field', 'day'), name='field_day_rollup_unique')],
+            },
+        ),
+    ]
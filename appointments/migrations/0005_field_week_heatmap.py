@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:26
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_field_day_rollup'),
+        ('football', '0010_footballfield_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FieldWeekHeatmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField()),
+                ('seconds', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=168)),
+                ('field', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='week_heatmaps', to='football.footballfield')),
+            ],
+            options={
+                'db_table': 'Field Week Heatmaps',
+                'constraints': [models.UniqueConstraint(fields=('field', 'week'), name='field_week_heatmap_unique')],
+            },
+        ),
+    ]
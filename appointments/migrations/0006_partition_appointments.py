@@ -0,0 +1,177 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:03
+
+import datetime
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# Everything this migration does is spelled out here rather than borrowed from appointments.partitions,
+# which follows the current models and may change.
+TABLE = "Appointments"
+SEQUENCE = "Appointments_id_seq"
+# Matches the appointment_max_duration check below.
+MAX_BOOKING_DURATION = "7 days"
+PARTITIONS_AHEAD = 3
+
+NO_OVERLAP_SQL = """
+    ALTER TABLE "{partition}" ADD CONSTRAINT "{partition}_no_overlap"
+    EXCLUDE USING gist (field_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&)
+"""
+
+TRIGGER_SQL = """
+    CREATE FUNCTION appointments_cross_partition_overlap() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        tz text := TG_ARGV[0];
+        max_duration interval := TG_ARGV[1]::interval;
+    BEGIN
+        -- Each partition's exclusion constraint covers overlaps inside it. Another partition can only hold
+        -- a conflict when the window in which a conflicting booking could start crosses a month boundary.
+        IF date_trunc('month', (NEW.start_time - max_duration) AT TIME ZONE tz)
+           = date_trunc('month', (NEW.end_time - interval '1 microsecond') AT TIME ZONE tz) THEN
+            RETURN NULL;
+        END IF;
+        -- Two such bookings in different partitions cannot see each other's uncommitted rows, so they
+        -- take turns per field.
+        PERFORM pg_advisory_xact_lock(hashtext('appointments_no_overlap'), hashint8(NEW.field_id));
+        IF EXISTS (
+            SELECT 1 FROM "Appointments"
+            WHERE field_id = NEW.field_id AND tableoid <> TG_RELID
+              AND start_time > NEW.start_time - max_duration AND start_time < NEW.end_time
+              AND tstzrange(start_time, end_time, '[)') && tstzrange(NEW.start_time, NEW.end_time, '[)')
+        ) THEN
+            RAISE EXCEPTION 'conflicting key value violates exclusion constraint "appointments_no_overlap"'
+                USING ERRCODE = 'exclusion_violation', CONSTRAINT = 'appointments_no_overlap';
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+    CREATE TRIGGER appointments_cross_partition_overlap
+        AFTER INSERT OR UPDATE OF field_id, start_time, end_time ON "Appointments"
+        FOR EACH ROW EXECUTE FUNCTION appointments_cross_partition_overlap(%s, %s);
+"""
+
+
+def fetch(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def secondary_indexes(cursor, table):
+    # Plain indexes and foreign keys, to be rebuilt under the same names on the table that replaces `table`.
+    indexes = fetch(cursor, """
+        SELECT index.relname, pg_get_indexdef(index.oid)
+        FROM pg_index JOIN pg_class index ON index.oid = pg_index.indexrelid
+        WHERE pg_index.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = index.oid)
+    """, [f'"{table}"'])
+    foreign_keys = fetch(cursor, """
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+    """, [f'"{table}"'])
+    return indexes, foreign_keys
+
+
+def restore_indexes(cursor, table, indexes, foreign_keys):
+    for name, definition in indexes:
+        cursor.execute(f'CREATE INDEX "{name}" ON "{table}" USING {definition.split(" USING ", 1)[1]}')
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def boundary(month):
+    return timezone.make_aware(datetime.datetime.combine(month, datetime.time.min))
+
+
+def create_partitions(cursor, first_day):
+    # A default partition, plus one per month from the oldest booking to PARTITIONS_AHEAD months out. The
+    # table is still empty, so they are created in place rather than attached.
+    cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+    cursor.execute(NO_OVERLAP_SQL.format(partition=f"{TABLE}_default"))
+    current = timezone.localdate().replace(day=1)
+    month = first_day.replace(day=1) if first_day else current
+    while month <= add_months(current, PARTITIONS_AHEAD):
+        name = f"{TABLE}_{month:%Y_%m}"
+        cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+                       [boundary(month), boundary(add_months(month, 1))])
+        cursor.execute(NO_OVERLAP_SQL.format(partition=name))
+        month = add_months(month, 1)
+
+
+def next_id(cursor, table):
+    sequence, = fetch(cursor, "SELECT pg_get_serial_sequence(%s, 'id')", [f'"{table}"'])[0]
+    last_value, is_called = fetch(cursor, f"SELECT last_value, is_called FROM {sequence}")[0]
+    highest, = fetch(cursor, f'SELECT MAX(id) FROM "{table}"')[0]
+    return max(last_value + is_called, (highest or 0) + 1)
+
+
+def partition_table(apps, schema_editor):
+    # Rebuilds Appointments as a table partitioned by month of start_time. The primary key has to include
+    # the partition key, and ids come from a plain sequence, which works on every supported PostgreSQL.
+    with schema_editor.connection.cursor() as cursor:
+        old = f"{TABLE}_unpartitioned"
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+        first_id = next_id(cursor, old)
+        first_day, = fetch(cursor, f'SELECT MIN(start_time) FROM "{old}"')[0]
+        cursor.execute(f'ALTER TABLE "{old}" ALTER COLUMN id DROP IDENTITY')
+
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                       f'PARTITION BY RANGE (start_time)')
+        cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}".id')
+        cursor.execute("SELECT setval(%s, %s, false)", [f'"{SEQUENCE}"', first_id])
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval(\'"{SEQUENCE}"\')')
+        create_partitions(cursor, first_day and timezone.localdate(first_day))
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+
+        indexes, foreign_keys = secondary_indexes(cursor, old)
+        cursor.execute(f'DROP TABLE "{old}"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id, start_time)')
+        restore_indexes(cursor, TABLE, indexes, foreign_keys)
+        cursor.execute(TRIGGER_SQL, [settings.TIME_ZONE, MAX_BOOKING_DURATION])
+
+
+def unpartition_table(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        old = f"{TABLE}_partitioned"
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+        first_id = next_id(cursor, old)
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{old}" INCLUDING CONSTRAINTS)')
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+
+        indexes, foreign_keys = secondary_indexes(cursor, old)
+        cursor.execute(f'DROP TABLE "{old}"')
+        cursor.execute("DROP FUNCTION appointments_cross_partition_overlap()")
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY '
+                       f'(START WITH {first_id})')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id)')
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT appointments_no_overlap '
+            f"EXCLUDE USING gist (field_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&)"
+        )
+        restore_indexes(cursor, TABLE, indexes, foreign_keys)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_field_week_heatmap'),
+        ('football', '0011_pricing_rule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.CheckConstraint(condition=models.Q(('end_time__lte', django.db.models.expressions.CombinedExpression(models.F('start_time'), '+', models.Value(datetime.timedelta(days=7))))), name='appointment_max_duration'),
+        ),
+        migrations.RunPython(partition_table, unpartition_table),
+        # partition_table replaced the table-wide exclusion constraint with one per partition plus a trigger.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.RemoveConstraint(model_name='appointment', name='appointments_no_overlap'),
+        ]),
+    ]
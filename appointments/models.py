@@ -1,7 +1,43 @@
+from datetime import timedelta
+
+from django.contrib.postgres.fields import ArrayField, DateTimeRangeField, RangeBoundary
 from django.db import models
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
 from accounts.models import User
 from football.models import FootballField
 
+EXCLUSION_VIOLATION = "23P01"
+STORED_FIELDS = {"field_id", "start_time", "end_time", "total_cost"}
+HOURS_PER_WEEK = 7 * 24
+# The table is partitioned by month of start_time. Capping the length of a booking bounds how far back an
+# overlapping booking can start, which is what lets overlap queries prune partitions.
+MAX_BOOKING_DURATION = timedelta(days=7)
+
+
+class TsTzRange(models.Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
+def booking_period():
+    return TsTzRange("start_time", "end_time", RangeBoundary())
+
+
+def is_overlap_violation(error):
+    return getattr(error.__cause__, "pgcode", None) == EXCLUSION_VIOLATION
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def overlapping(self, start_time, end_time):
+        if start_time > end_time:
+            raise ValueError("start_time must not be after end_time.")
+        # The start_time bounds are implied by the overlap; they are spelled out for partition pruning.
+        return self.annotate(period=booking_period()).filter(
+            period__overlap=DateTimeTZRange(start_time, end_time),
+            start_time__gt=start_time - MAX_BOOKING_DURATION,
+            start_time__lt=end_time,
+        )
+
 
 class Appointment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="appointments")
@@ -11,9 +47,67 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     total_cost = models.DecimalField(max_digits=10, decimal_places=3, null=True, blank=True, default=0)
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
         db_table = "Appointments"
+        indexes = [
+            models.Index(fields=["start_time", "id"], name="appointment_start_id_idx"),
+            models.Index(fields=["user", "start_time", "id"], name="appointment_user_start_id_idx"),
+        ]
+        # No overlapping bookings per field is enforced in the database, not here: the partitioned table
+        # has an exclusion constraint on each partition and a trigger for bookings that cross partitions
+        # (migration 0006). Violations still report the appointments_no_overlap name.
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_time__lte=models.F("start_time") + MAX_BOOKING_DURATION),
+                name="appointment_max_duration",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the row looks like in the database, so a later save can update the aggregates by the difference.
+        if STORED_FIELDS.issubset(field_names):
+            instance._stored = instance.stored_state()
+        return instance
+
+    def stored_state(self):
+        return self.field_id, self.start_time, self.end_time, self.total_cost or 0
 
     def __str__(self):
         return f"{self.user.first_name} - {self.user.email} - {self.field.name} from {self.start_time} to {self.end_time}"
 
+
+class FieldDayRollup(models.Model):
+    field = models.ForeignKey(FootballField, on_delete=models.CASCADE, related_name="day_rollups")
+    day = models.DateField()
+    bookings = models.IntegerField(default=0)
+    booked_seconds = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+
+    class Meta:
+        db_table = "Field Day Rollups"
+        constraints = [
+            models.UniqueConstraint(fields=["field", "day"], name="field_day_rollup_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.field_id} on {self.day}: {self.bookings} bookings, {self.revenue} revenue"
+
+
+class FieldWeekHeatmap(models.Model):
+    field = models.ForeignKey(FootballField, on_delete=models.CASCADE, related_name="week_heatmaps")
+    week = models.DateField()
+    # Booked seconds per local hour of the week, Monday 00:00 first.
+    seconds = ArrayField(models.IntegerField(), size=HOURS_PER_WEEK)
+
+    class Meta:
+        db_table = "Field Week Heatmaps"
+        constraints = [
+            models.UniqueConstraint(fields=["field", "week"], name="field_week_heatmap_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.field_id} week of {self.week}"
@@ -0,0 +1,9 @@
+from football.pagination import CursorOrPageNumberPagination, FootballCursorPagination
+
+
+class AppointmentCursorPagination(FootballCursorPagination):
+    ordering = ('start_time', 'id')
+
+
+class AppointmentPagination(CursorOrPageNumberPagination):
+    cursor_pagination_class = AppointmentCursorPagination
@@ -0,0 +1,170 @@
+import csv
+import gzip
+from datetime import date, datetime, time
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from appointments.models import Appointment
+
+# Monthly range partitions on start_time, in local time, plus a default partition that catches bookings
+# beyond the last monthly one until ensure() gives them their own.
+PARTITIONS_AHEAD = 3
+ARCHIVE_SCHEMA = "archive"
+
+NO_OVERLAP_SQL = """
+    ALTER TABLE {partition} ADD CONSTRAINT {constraint}
+    EXCLUDE USING gist (field_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&)
+"""
+
+
+def quote(name):
+    return connections[DEFAULT_DB_ALIAS].ops.quote_name(name)
+
+
+def table_name():
+    return Appointment._meta.db_table
+
+
+def default_partition():
+    return f"{table_name()}_default"
+
+
+def partition_name(month):
+    return f"{table_name()}_{month:%Y_%m}"
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def boundary(month):
+    return timezone.make_aware(datetime.combine(month, time.min))
+
+
+def add_no_overlap(cursor, partition):
+    # PostgreSQL cannot put this exclusion constraint on the partitioned table itself, since it does not
+    # compare the partition key with equality, so every partition carries its own copy. Overlaps between
+    # partitions are caught by the appointments_cross_partition_overlap trigger.
+    cursor.execute(NO_OVERLAP_SQL.format(partition=quote(partition), constraint=quote(f"{partition}_no_overlap")))
+
+
+def attached(using=DEFAULT_DB_ALIAS):
+    # {partition name: month}, with None for the default partition.
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass",
+            [quote(table_name())],
+        )
+        names = [name for name, in cursor.fetchall()]
+    prefix = f"{table_name()}_"
+    return {
+        name: None if name == default_partition() else datetime.strptime(name[len(prefix):], "%Y_%m").date()
+        for name in names
+    }
+
+
+def archived_until(using=DEFAULT_DB_ALIAS):
+    # The first month after the newest partition in the archive schema. Partitions archived with drop=True
+    # leave no trace here, so their rollups go with the next rebuild.
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT MAX(tablename) FROM pg_tables WHERE schemaname = %s AND tablename LIKE %s",
+            [ARCHIVE_SCHEMA, f"{table_name()}\\_%"],
+        )
+        newest, = cursor.fetchone()
+    if newest is None:
+        return None
+    return add_months(datetime.strptime(newest[len(table_name()) + 1:], "%Y_%m").date(), 1)
+
+
+def default_months(using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', start_time AT TIME ZONE %s)::date FROM {quote(default_partition())}",
+            [timezone.get_current_timezone_name()],
+        )
+        return [month for month, in cursor.fetchall()]
+
+
+def create_default_partition(using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {quote(default_partition())} PARTITION OF {quote(table_name())} DEFAULT")
+        add_no_overlap(cursor, default_partition())
+
+
+def create_partition(month, using=DEFAULT_DB_ALIAS):
+    name, default = partition_name(month), quote(default_partition())
+    start, end = boundary(month), boundary(add_months(month, 1))
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        # Taken before ATTACH asks for it, so no booking can slip into the default partition for this month
+        # between moving its rows out and attaching.
+        cursor.execute(f"LOCK TABLE {default} IN EXCLUSIVE MODE")
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} (LIKE {quote(table_name())} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {default} WHERE start_time >= %s AND start_time < %s RETURNING *) "
+            f"INSERT INTO {quote(name)} SELECT * FROM moved",
+            [start, end],
+        )
+        add_no_overlap(cursor, name)
+        cursor.execute(
+            f"ALTER TABLE {quote(table_name())} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    return name
+
+
+def ensure(since=None, ahead=PARTITIONS_AHEAD, using=DEFAULT_DB_ALIAS):
+    # Creates the monthly partitions from `since` (default: this month) to `ahead` months out, plus any
+    # month that has bookings waiting in the default partition. Safe to run repeatedly.
+    current = month_start(timezone.localdate())
+    month, last = month_start(since) if since else current, add_months(current, ahead)
+    wanted = set(default_months(using))
+    while month <= last:
+        wanted.add(month)
+        month = add_months(month, 1)
+    existing = set(attached(using).values())
+    return [create_partition(month, using) for month in sorted(wanted - existing)]
+
+
+def archive(before, export_dir=None, drop=False, stdout=None, using=DEFAULT_DB_ALIAS):
+    # Detaches every monthly partition that ends on or before `before`, optionally writes it out as gzipped
+    # CSV, then moves it to the archive schema or drops it. Returns the partitions handled.
+    archived = []
+    for name, month in sorted(attached(using).items(), key=lambda item: item[1] or date.max):
+        if month is None or add_months(month, 1) > month_start(before):
+            continue
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {quote(table_name())} DETACH PARTITION {quote(name)}")
+            # Users and fields are deleted through the ORM, which only cascades into the live table.
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [quote(name)]
+            )
+            for constraint, in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {quote(name)} DROP CONSTRAINT {quote(constraint)}")
+            if export_dir:
+                export(cursor, name, export_dir / f"{name}.csv.gz")
+            if drop:
+                cursor.execute(f"DROP TABLE {quote(name)}")
+            else:
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {quote(ARCHIVE_SCHEMA)}")
+                cursor.execute(f"ALTER TABLE {quote(name)} SET SCHEMA {quote(ARCHIVE_SCHEMA)}")
+        if stdout:
+            stdout.write(f"Archived {name}")
+        archived.append(name)
+    return archived
+
+
+def export(cursor, name, path):
+    with gzip.open(path, "wt", newline="") as output:
+        cursor.execute(f"SELECT * FROM {quote(name)} LIMIT 0")
+        csv.writer(output).writerow(column.name for column in cursor.description)
+        cursor.copy_expert(f"COPY {quote(name)} TO STDOUT WITH (FORMAT csv)", output)
@@ -0,0 +1,45 @@
+from itertools import islice
+
+from dateutil.rrule import rrulestr
+from django.utils import timezone
+
+MAX_OCCURRENCES = 100
+
+
+def single_rule(recurrence):
+    # One RRULE and nothing else: DTSTART, RDATE and EXDATE lines would move occurrences away from the
+    # requested start, which is the only one the booking checks see. A bare rule has no colons or lines.
+    rule = recurrence.strip()
+    if rule[:6].upper() == "RRULE:":
+        rule = rule[6:]
+    if any(char in rule for char in ":\r\n"):
+        raise ValueError("recurrence must be a single RRULE, without DTSTART, RDATE or EXDATE")
+    return rule
+
+
+def expand_occurrences(start_time, end_time, recurrence=None, limit=MAX_OCCURRENCES):
+    # Expanding in local wall-clock time keeps a "Tuesdays 19:00" rule at 19:00 across DST changes.
+    duration = end_time - start_time
+    if not recurrence:
+        return [(start_time, end_time)]
+
+    tz = timezone.get_current_timezone()
+    dtstart = timezone.make_naive(start_time, tz)
+    rule = rrulestr(single_rule(recurrence), dtstart=dtstart)
+    starts = list(islice(rule, limit + 1))
+    if len(starts) > limit:
+        raise ValueError(f"recurrence must end within {limit} occurrences")
+    return [(timezone.make_aware(start, tz), timezone.make_aware(start, tz) + duration) for start in starts]
+
+
+def find_conflicts(occurrences, busy):
+    # Both sequences are sorted by start. Existing bookings never overlap each other, so they are
+    # sorted by end as well, and a single forward sweep finds every conflict.
+    busy = iter(busy)
+    current = next(busy, None)
+    conflicts = []
+    for start, end in occurrences:
+        while current is not None and current[1] <= start:
+            current = next(busy, None)
+        conflicts.append(current is not None and current[0] < end)
+    return conflicts
@@ -0,0 +1,215 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from appointments import partitions
+from appointments.models import MAX_BOOKING_DURATION, Appointment, FieldDayRollup
+
+UPSERT_SQL = """
+    INSERT INTO {table} (field_id, day, bookings, booked_seconds, revenue)
+    VALUES {rows}
+    ON CONFLICT (field_id, day) DO UPDATE SET
+        bookings = {table}.bookings + EXCLUDED.bookings,
+        booked_seconds = {table}.booked_seconds + EXCLUDED.booked_seconds,
+        revenue = {table}.revenue + EXCLUDED.revenue
+"""
+
+# A booking counts once, with its revenue, on the local day it starts; its time is split at local midnights
+# over every day it covers, like the heatmap splits it at hour boundaries.
+AGGREGATE_SQL = """
+    INSERT INTO {table} (field_id, day, bookings, booked_seconds, revenue)
+    SELECT field_id, day::date, %(sign)s * COUNT(*) FILTER (WHERE first_day),
+           %(sign)s * SUM(EXTRACT(EPOCH FROM LEAST(end_time, (day + INTERVAL '1 day') AT TIME ZONE %(tz)s)
+                                             - GREATEST(start_time, day AT TIME ZONE %(tz)s)))::bigint,
+           %(sign)s * COALESCE(SUM(total_cost) FILTER (WHERE first_day), 0)
+    FROM {appointments}
+    CROSS JOIN LATERAL generate_series(
+        date_trunc('day', start_time AT TIME ZONE %(tz)s), (end_time AT TIME ZONE %(tz)s) - INTERVAL '1 microsecond',
+        INTERVAL '1 day'
+    ) AS day
+    CROSS JOIN LATERAL (SELECT day = date_trunc('day', start_time AT TIME ZONE %(tz)s) AS first_day) AS days
+    WHERE ({where}) AND day >= %(since)s AND day < %(until)s
+    GROUP BY 1, 2
+    ON CONFLICT (field_id, day) DO UPDATE SET
+        bookings = {table}.bookings + EXCLUDED.bookings,
+        booked_seconds = {table}.booked_seconds + EXCLUDED.booked_seconds,
+        revenue = {table}.revenue + EXCLUDED.revenue
+"""
+
+
+def apply_aggregate(where, params, sign=1):
+    sql = AGGREGATE_SQL.format(
+        table=connection.ops.quote_name(FieldDayRollup._meta.db_table),
+        appointments=connection.ops.quote_name(Appointment._meta.db_table),
+        where=where,
+    )
+    params = {"tz": timezone.get_current_timezone_name(), "since": datetime.min, "until": datetime.max,
+              "sign": sign, **params}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def apply_deltas(deltas):
+    # deltas: iterable of (field_id, day, bookings, seconds, revenue). Rows are merged per (field, day) and
+    # written with one additive upsert, so concurrent writers never lose each other's increments.
+    merged = defaultdict(lambda: [0, 0, Decimal(0)])
+    for field_id, day, bookings, seconds, revenue in deltas:
+        totals = merged[field_id, day]
+        totals[0] += bookings
+        totals[1] += seconds
+        totals[2] += Decimal(revenue)
+    merged = {key: totals for key, totals in merged.items() if any(totals)}
+    if not merged:
+        return
+
+    # Sorted keys make concurrent upserts lock rows in the same order.
+    keys = sorted(merged)
+    params = []
+    for field_id, day in keys:
+        params += [field_id, day, *merged[field_id, day]]
+    sql = UPSERT_SQL.format(
+        table=connection.ops.quote_name(FieldDayRollup._meta.db_table),
+        rows=", ".join(["(%s, %s, %s, %s, %s)"] * len(keys)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def split(start_time, end_time):
+    # Yields (day, seconds) for every local day the interval touches.
+    current = start_time
+    while current < end_time:
+        day = timezone.localdate(current)
+        boundary = min(day_start(day + timedelta(days=1)), end_time)
+        yield day, int(boundary.timestamp() - current.timestamp())
+        current = boundary
+
+
+def contribution(state, sign=1):
+    field_id, start_time, end_time, revenue = state
+    bookings, revenue = sign, sign * Decimal(revenue)
+    for day, seconds in split(start_time, end_time):
+        yield field_id, day, bookings, sign * seconds, revenue
+        bookings, revenue = 0, Decimal(0)
+
+
+def record_change(old, new):
+    apply_deltas(delta for state, sign in ((old, -1), (new, 1)) if state for delta in contribution(state, sign))
+
+
+def record_user_deleted(user_id):
+    # Deleting a user cascades to their appointments; one grouped statement replaces a delta per booking.
+    apply_aggregate("user_id = %(user_id)s", {"user_id": user_id}, sign=-1)
+
+
+def record_created(states):
+    apply_deltas(delta for state in states for delta in contribution(state))
+
+
+def lock_for_rebuild(model):
+    # Blocks incremental upserts, not reads, until the transaction ends. A booking that commits first is
+    # in the recomputed totals; one still in flight waits and then adds its change on top.
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {connection.ops.quote_name(model._meta.db_table)} IN EXCLUSIVE MODE")
+
+
+def rebuild(chunk_days=31, stdout=None):
+    # Each window of days is recomputed in its own short transaction, so a rebuild can run on a live system.
+    # Rollups of archived months are all that is left of them in the live tables, so they are kept.
+    rollups = FieldDayRollup.objects.all()
+    archived_until = partitions.archived_until()
+    if archived_until:
+        rollups = rollups.filter(day__gte=archived_until)
+
+    bounds = Appointment.objects.aggregate(first=Min("start_time"), last=Max("end_time"))
+    if bounds["first"] is None:
+        rollups.delete()
+        return
+
+    first_day = timezone.localdate(bounds["first"])
+    last_day = timezone.localdate(bounds["last"] - timedelta(microseconds=1))
+    rollups.exclude(day__range=(first_day, last_day)).delete()
+    day = first_day
+    while day <= last_day:
+        window_end = min(day + timedelta(days=chunk_days - 1), last_day)
+        start, end = day_start(day), day_start(window_end + timedelta(days=1))
+        with transaction.atomic():
+            lock_for_rebuild(FieldDayRollup)
+            FieldDayRollup.objects.filter(day__range=(day, window_end)).delete()
+            # Bookings that started before the window still add their time to its days. The start_time
+            # bound keeps the scan to the partitions that can hold them.
+            apply_aggregate(
+                "start_time >= %(earliest)s AND start_time < %(end)s AND end_time > %(start)s",
+                {"earliest": start - MAX_BOOKING_DURATION, "start": start, "end": end,
+                 "since": datetime.combine(day, time.min),
+                 "until": datetime.combine(window_end + timedelta(days=1), time.min)},
+            )
+        if stdout:
+            stdout.write(f"Rolled up {day} to {window_end}")
+        day = window_end + timedelta(days=1)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def period_start(day, period):
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def report(fields, period, start_date, end_date):
+    # fields: dicts with id, name, opening_time and closing_time. Only the rollup table is aggregated, so
+    # the cost depends on fields x days in the range, never on how many appointments exist.
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    periods = {}
+    for day in days:
+        periods.setdefault(period_start(day, period), []).append(day)
+
+    totals = defaultdict(lambda: [0, 0, Decimal(0)])
+    rows = FieldDayRollup.objects.filter(
+        field_id__in=[field["id"] for field in fields], day__range=(start_date, end_date)
+    ).values_list("field_id", "day", "bookings", "booked_seconds", "revenue")
+    for field_id, day, bookings, seconds, revenue in rows:
+        bucket = totals[field_id, period_start(day, period)]
+        bucket[0] += bookings
+        bucket[1] += seconds
+        bucket[2] += revenue
+
+    result = []
+    for field in fields:
+        open_seconds = daily_open_seconds(field["opening_time"], field["closing_time"])
+        result.append({
+            "field_id": field["id"],
+            "field_name": field["name"],
+            "periods": [
+                period_report(start, len(period_days), open_seconds, *totals.get((field["id"], start), (0, 0, 0)))
+                for start, period_days in periods.items()
+            ],
+        })
+    return result
+
+
+def period_report(start, days, open_seconds, bookings, seconds, revenue):
+    available = open_seconds * days
+    return {
+        "start": start,
+        "days": days,
+        "bookings": bookings,
+        "booked_hours": round(seconds / 3600, 2),
+        "revenue": Decimal(revenue).quantize(Decimal("0.001")),
+        "utilization": round(seconds / available, 4) if available else None,
+    }
+
+
+def daily_open_seconds(opening_time, closing_time):
+    opens, closes = (moment.hour * 3600 + moment.minute * 60 + moment.second for moment in (opening_time, closing_time))
+    # Matches opening_window: a closing time at or before the opening time is on the next day.
+    return closes - opens if closes > opens else closes - opens + 24 * 3600
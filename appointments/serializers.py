@@ -1,9 +1,63 @@
 from datetime import timedelta
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from rest_framework import serializers
-from appointments.models import Appointment
+from rest_framework.settings import api_settings
+from appointments import aggregates, holds
+from appointments.models import MAX_BOOKING_DURATION, Appointment, is_overlap_violation
+from appointments.recurrence import expand_occurrences, find_conflicts
+from appointments.slots import MAX_RANGE_DAYS
+from football import pricing
+from football.models import FootballField
 import decimal
 
+CONFLICT_MESSAGE = "This time slot conflicts with an existing appointment."
+TOO_LONG_MESSAGE = f"Bookings can last at most {MAX_BOOKING_DURATION.days} days."
+HELD_MESSAGE = "This time slot is held by another user who is checking out."
+MAX_CALENDAR_FIELDS = 50
+
+
+def check_window(start_time, end_time):
+    if start_time >= end_time:
+        raise serializers.ValidationError("End time must be after start time.")
+
+    if end_time - start_time > MAX_BOOKING_DURATION:
+        raise serializers.ValidationError(TOO_LONG_MESSAGE)
+
+    if start_time < timezone.now():
+        raise serializers.ValidationError("Cannot book appointments in the past.")
+
+
+def check_minimum(quote, start_time, end_time):
+    if quote.too_short(start_time, end_time):
+        minutes = quote.min_duration // timedelta(minutes=1)
+        raise serializers.ValidationError(f"Bookings at this time must last at least {minutes} minutes.")
+
+
+def booking_cost(field, start_time, end_time):
+    quote = pricing.quote(field, start_time, end_time)
+    check_minimum(quote, start_time, end_time)
+    return quote.total_cost
+
+
+def save_without_overlap(save, *args):
+    # The appointments_no_overlap exclusion constraint is the availability check.
+    try:
+        with transaction.atomic():
+            return save(*args)
+    except IntegrityError as error:
+        if is_overlap_violation(error):
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [CONFLICT_MESSAGE]})
+        raise
+
+
+def insert_appointments(appointments):
+    # bulk_create sends no post_save signals, so the aggregates are updated here in the same transaction.
+    created = Appointment.objects.bulk_create(appointments)
+    aggregates.bookings_created(created)
+    return created
+
+
 class AppointmentSerializer(serializers.ModelSerializer):
     field_name = serializers.CharField(source='field.name', read_only=True)
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
@@ -24,26 +78,16 @@ class AppointmentSerializer(serializers.ModelSerializer):
     def validate(self, data):
         start_time = data.get('start_time')
         end_time = data.get('end_time')
-        field = data.get('field')
         user = data.get('user')
 
-        if start_time >= end_time:
-            raise serializers.ValidationError("End time must be after start time.")
-
-        if start_time < timezone.now():
-            raise serializers.ValidationError("Cannot book appointments in the past.")
-
-        existing_appointments = Appointment.objects.filter(
-            field=field,
-            start_time__lt=end_time,
-            end_time__gt=start_time
-        )
-
-        if self.instance:
-            existing_appointments = existing_appointments.exclude(id=self.instance.id)
+        check_window(start_time, end_time)
 
-        if existing_appointments.exists():
-            raise serializers.ValidationError("This time slot conflicts with an existing appointment.")
+        # Views save the booking for the requesting user, whose own holds never get in the way.
+        request = self.context.get('request')
+        booker = request.user if request else user
+        field = data.get('field') or self.instance.field
+        if holds.held_by_others(field.id, start_time, end_time, booker.id):
+            raise serializers.ValidationError(HELD_MESSAGE)
 
         return data
 
@@ -52,23 +96,29 @@ class AppointmentSerializer(serializers.ModelSerializer):
         end_time = validated_data.get('end_time')
         field = validated_data.get('field')
 
-        duration = end_time - start_time
-        total_hours = duration.total_seconds() / 3600
-        total_cost = decimal.Decimal(float(total_hours)) * field.price
-
-        validated_data['total_cost'] = round(total_cost, 3)
-        return super().create(validated_data)
+        validated_data['total_cost'] = booking_cost(field, start_time, end_time)
+        return save_without_overlap(super().create, validated_data)
 
     def update(self, instance, validated_data):
         start_time = validated_data.get('start_time', instance.start_time)
         end_time = validated_data.get('end_time', instance.end_time)
         field = validated_data.get('field', instance.field)
 
-        duration = end_time - start_time
-        total_hours = duration.total_seconds() / 3600
-        total_cost = decimal.Decimal(float(total_hours)) * field.price
-        validated_data['total_cost'] = round(total_cost, 3)
-        return super().update(instance, validated_data)
+        validated_data['total_cost'] = booking_cost(field, start_time, end_time)
+        return save_without_overlap(super().update, instance, validated_data)
+
+
+class SlotHoldSerializer(serializers.Serializer):
+    id = serializers.CharField(read_only=True)
+    field = serializers.PrimaryKeyRelatedField(queryset=FootballField.objects.all(), write_only=True)
+    field_id = serializers.IntegerField(read_only=True)
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    expires_at = serializers.DateTimeField(read_only=True)
+
+    def validate(self, data):
+        check_window(data['start_time'], data['end_time'])
+        return data
 
 
 class FieldAvailabilitySerializer(serializers.Serializer):
@@ -76,3 +126,127 @@ class FieldAvailabilitySerializer(serializers.Serializer):
     date = serializers.DateField()
     start_time = serializers.TimeField(required=False)
     end_time = serializers.TimeField(required=False)
+
+    def validate(self, data):
+        if data.get('start_time') and data.get('end_time') and data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError("End time must be after start time.")
+        return data
+
+
+class SlotStreamQuerySerializer(serializers.Serializer):
+    field_id = serializers.IntegerField()
+    date = serializers.DateField()
+
+
+class CalendarQuerySerializer(serializers.Serializer):
+    field_ids = serializers.CharField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField(required=False)
+
+    def validate_field_ids(self, value):
+        try:
+            field_ids = sorted({int(field_id) for field_id in value.split(',') if field_id.strip()})
+        except ValueError:
+            raise serializers.ValidationError("field_ids must be a comma separated list of ids.")
+
+        if not field_ids:
+            raise serializers.ValidationError("At least one field id is required.")
+        if len(field_ids) > MAX_CALENDAR_FIELDS:
+            raise serializers.ValidationError(f"At most {MAX_CALENDAR_FIELDS} fields can be requested at once.")
+        return field_ids
+
+    def validate(self, data):
+        data.setdefault('end_date', data['start_date'])
+        if not 0 <= (data['end_date'] - data['start_date']).days < MAX_RANGE_DAYS:
+            raise serializers.ValidationError(f"end_date must be within {MAX_RANGE_DAYS} days after start_date.")
+        return data
+
+
+class BulkBookingSerializer(serializers.Serializer):
+    field = serializers.PrimaryKeyRelatedField(queryset=FootballField.objects.all())
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    recurrence = serializers.CharField(required=False, allow_blank=True,
+                                       help_text="RFC 5545 RRULE, e.g. FREQ=WEEKLY;COUNT=20")
+    all_or_nothing = serializers.BooleanField(default=True)
+
+    def validate(self, data):
+        check_window(data['start_time'], data['end_time'])
+
+        try:
+            occurrences = expand_occurrences(data['start_time'], data['end_time'], data.get('recurrence'))
+        except ValueError as error:
+            raise serializers.ValidationError({'recurrence': [str(error)]})
+
+        if not occurrences:
+            raise serializers.ValidationError({'recurrence': ["The recurrence rule produces no occurrences."]})
+        for start, end in occurrences[1:]:
+            check_window(start, end)
+        if any(end > next_start for (_, end), (next_start, _) in zip(occurrences, occurrences[1:])):
+            raise serializers.ValidationError({'recurrence': ["Occurrences must not overlap each other."]})
+
+        table = pricing.get_tables([data['field'].id])[data['field'].id]
+        quotes = [pricing.price(table, data['field'].price, start, end) for start, end in occurrences]
+        for (start, end), quote in zip(occurrences, quotes):
+            check_minimum(quote, start, end)
+
+        data['occurrences'] = occurrences
+        data['quotes'] = quotes
+        return data
+
+    def conflicts(self, field, occurrences, user):
+        busy = Appointment.objects.filter(field=field).overlapping(
+            occurrences[0][0], occurrences[-1][1]
+        ).order_by('start_time').values_list('start_time', 'end_time')
+        held = holds.held_intervals([field.id], occurrences[0][0], occurrences[-1][1], user.id)[field.id]
+        return [
+            conflict or any(held_start < end and held_end > start for held_start, held_end in held)
+            for (start, end), conflict in zip(occurrences, find_conflicts(occurrences, busy))
+        ]
+
+    def create(self, validated_data):
+        field = validated_data['field']
+        occurrences = validated_data['occurrences']
+        quotes = validated_data['quotes']
+
+        for attempt in range(2):
+            conflicts = self.conflicts(field, occurrences, validated_data['user'])
+            if validated_data['all_or_nothing'] and any(conflicts):
+                created = {}
+                break
+            appointments = [
+                Appointment(user=validated_data['user'], field=field, start_time=start, end_time=end,
+                            total_cost=quote.total_cost)
+                for (start, end), quote, conflict in zip(occurrences, quotes, conflicts)
+                if not conflict
+            ]
+            try:
+                created = {
+                    appointment.start_time: appointment
+                    for appointment in save_without_overlap(insert_appointments, appointments)
+                }
+                break
+            except serializers.ValidationError:
+                # Another booking took one of the free occurrences since they were checked. A partial series
+                # checks again and books whatever is still free.
+                if validated_data['all_or_nothing'] or attempt:
+                    raise
+
+        report = []
+        for (start, end), conflict in zip(occurrences, conflicts):
+            appointment = created.get(start)
+            report.append({
+                'start_time': start,
+                'end_time': end,
+                'status': 'conflict' if conflict else 'created' if appointment else 'available',
+                'id': appointment.id if appointment else None,
+            })
+
+        return {
+            'field': field.id,
+            'all_or_nothing': validated_data['all_or_nothing'],
+            'created': len(created),
+            'conflicts': sum(conflicts),
+            'total_cost': sum((appointment.total_cost for appointment in created.values()), decimal.Decimal(0)),
+            'occurrences': report,
+        }
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import User
+from appointments import aggregates
+from appointments.models import Appointment
+from football.models import FootballField
+
+
+@receiver(post_save, sender=Appointment)
+def update_aggregates_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        aggregates.booking_saved(instance)
+
+
+@receiver(post_delete, sender=Appointment)
+def update_aggregates_on_delete(sender, instance, origin=None, **kwargs):
+    # Deleting a field cascades to its aggregates; deleting a user is settled in one go by the receiver below.
+    # origin is the model instance or queryset whose delete() started the cascade.
+    if getattr(origin, "model", type(origin)) in (FootballField, User):
+        return
+    aggregates.booking_deleted(instance)
+
+
+@receiver(pre_delete, sender=User)
+def update_aggregates_on_user_delete(sender, instance, **kwargs):
+    aggregates.user_deleted(instance.id)
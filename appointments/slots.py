@@ -0,0 +1,89 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+DEFAULT_OPENING_TIME = time(6, 0)
+DEFAULT_CLOSING_TIME = time(22, 0)
+MAX_RANGE_DAYS = 31
+# The most slots one response may list: a day at one-minute steps, or a month of hourly slots.
+MAX_SLOTS = 24 * 60
+MINUTE = timedelta(minutes=1)
+
+
+def opening_window(day, opening_time=DEFAULT_OPENING_TIME, closing_time=DEFAULT_CLOSING_TIME):
+    start = timezone.make_aware(datetime.combine(day, opening_time))
+    # A closing time at or before the opening time means the field closes after midnight.
+    closing_day = day if closing_time > opening_time else day + timedelta(days=1)
+    end = timezone.make_aware(datetime.combine(closing_day, closing_time))
+    return start, end
+
+
+def _set_bits(mask):
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+# A range of days laid out as one integer bitset with a bit per minute, bit 0 being the
+# first opening minute. Opening hours and bookings become masks over the whole range, so
+# free windows for every day come out of a few big-integer operations.
+class SlotGrid:
+    def __init__(self, start_date, end_date=None, opening_time=DEFAULT_OPENING_TIME,
+                 closing_time=DEFAULT_CLOSING_TIME):
+        end_date = end_date or start_date
+        self.windows = [
+            opening_window(start_date + timedelta(days=offset), opening_time, closing_time)
+            for offset in range((end_date - start_date).days + 1)
+        ]
+        self.start = self.windows[0][0]
+        self.end = self.windows[-1][1]
+        self.minutes = self._offset(self.end)
+        self.open_mask = self.mask(self.windows)
+
+    def _offset(self, moment):
+        return (moment - self.start) // MINUTE
+
+    def _moment(self, offset):
+        return self.start + offset * MINUTE
+
+    def mask(self, intervals):
+        mask = 0
+        origin, minutes = self.start, self.minutes
+        for start, end in intervals:
+            low = max((start - origin) // MINUTE, 0)
+            # Partially booked minutes count as busy, so round the end up.
+            high = min(-((origin - end) // MINUTE), minutes)
+            if low < high:
+                mask |= ((1 << (high - low)) - 1) << low
+        return mask
+
+    def free_mask(self, busy):
+        return self.open_mask & ~self.mask(busy)
+
+    def runs(self, free_mask):
+        # Every bit that differs from its lower neighbour starts or ends a run of free minutes.
+        edges = list(_set_bits(free_mask ^ (free_mask << 1)))
+        return list(zip(edges[::2], edges[1::2]))
+
+    def free_windows(self, busy):
+        return [(self._moment(low), self._moment(high)) for low, high in self.runs(self.free_mask(busy))]
+
+    def slots(self, busy, duration_minutes, step_minutes=60, limit=MAX_SLOTS):
+        slots = []
+        for low, high in self.runs(self.free_mask(busy)):
+            for offset in range(low, high - duration_minutes + 1, step_minutes):
+                if len(slots) == limit:
+                    return slots
+                slots.append((self._moment(offset), self._moment(offset + duration_minutes)))
+        return slots
+
+    def days(self, busy):
+        busy_mask = self.mask(busy)
+        for window in self.windows:
+            day_mask = self.mask([window])
+            yield (
+                window,
+                [(self._moment(low), self._moment(high)) for low, high in self.runs(day_mask & busy_mask)],
+                [(self._moment(low), self._moment(high)) for low, high in self.runs(day_mask & ~busy_mask)],
+            )
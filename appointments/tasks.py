@@ -0,0 +1,13 @@
+from celery import shared_task
+
+from appointments import heatmap, partitions
+
+
+@shared_task
+def reconcile_heatmaps(weeks=heatmap.RECONCILE_WEEKS):
+    heatmap.reconcile(weeks)
+
+
+@shared_task
+def create_partitions(ahead=partitions.PARTITIONS_AHEAD):
+    return partitions.ensure(ahead=ahead)
@@ -1,3 +1,1192 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import re
+import tempfile
+import threading
+import time as clock
+import tracemalloc
+import uuid
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import SkipTest, mock
 
-# Create your tests here.
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Address, User
+from accounts.roles import ADMIN_GROUP_NAME, clear_admin_group_id
+from appointments import aggregates, export, heatmap, holds, live, partitions, rollups, serializers
+from appointments.models import Appointment, FieldDayRollup, FieldWeekHeatmap, is_overlap_violation
+from appointments.serializers import HELD_MESSAGE
+from appointments.tasks import create_partitions, reconcile_heatmaps
+from appointments.slots import SlotGrid
+from football.models import FootballField
+
+
+class AppointmentOverlapTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.owner, address=address, price=100)
+        self.start = (timezone.now() + timedelta(days=2)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def book(self, user, start, end):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post("/appointments/", {
+            "user": user.id,
+            "field": self.field.id,
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+        }, format="json")
+
+    def test_overlapping_booking_returns_conflict_error(self):
+        self.assertEqual(self.book(self.owner, self.start, self.start + timedelta(hours=2)).status_code, 201)
+
+        response = self.book(self.owner, self.start + timedelta(hours=1), self.start + timedelta(hours=3))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["non_field_errors"], ["This time slot conflicts with an existing appointment."])
+
+    def test_adjacent_bookings_do_not_conflict(self):
+        self.assertEqual(self.book(self.owner, self.start, self.start + timedelta(hours=1)).status_code, 201)
+        self.assertEqual(self.book(self.owner, self.start + timedelta(hours=1), self.start + timedelta(hours=2)).status_code, 201)
+
+    def test_parallel_bookings_for_one_slot_have_a_single_winner(self):
+        users = [
+            User.objects.create_user(email=f"player{i}@example.com", password="pass", first_name="Player")
+            for i in range(10)
+        ]
+        barrier = threading.Barrier(len(users))
+        statuses = []
+
+        def attempt(user):
+            try:
+                barrier.wait()
+                statuses.append(self.book(user, self.start, self.start + timedelta(hours=1)).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201] + [400] * (len(users) - 1))
+        self.assertEqual(Appointment.objects.filter(field=self.field).count(), 1)
+
+    def test_parallel_bookings_across_a_partition_boundary_have_a_single_winner(self):
+        month = partitions.add_months(partitions.month_start(timezone.localdate()), 2)
+        boundary = partitions.boundary(month)
+        other = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        barrier = threading.Barrier(2)
+        statuses = []
+
+        def attempt(user, start, end):
+            try:
+                barrier.wait()
+                statuses.append(self.book(user, start, end).status_code)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=attempt, args=(self.owner, boundary - timedelta(hours=1), boundary + timedelta(hours=1))),
+            threading.Thread(target=attempt, args=(other, boundary, boundary + timedelta(hours=2))),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201, 400])
+        self.assertEqual(Appointment.objects.filter(field=self.field).count(), 1)
+
+    def test_check_availability_counts_overlaps(self):
+        Appointment.objects.create(user=self.owner, field=self.field, start_time=self.start,
+                                   end_time=self.start + timedelta(hours=2))
+        client = APIClient()
+        client.force_authenticate(self.owner)
+
+        response = client.post("/appointments/check-availability/", {
+            "field_id": self.field.id,
+            "date": self.start.date().isoformat(),
+            "start_time": (self.start + timedelta(hours=1)).time().isoformat(),
+            "end_time": (self.start + timedelta(hours=3)).time().isoformat(),
+        }, format="json")
+
+        self.assertEqual(response.data, {"available": False, "conflicts": 1})
+
+    def test_check_availability_rejects_reversed_windows(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+
+        for start_hour, end_hour in ((22, 1), (10, 10)):
+            with self.subTest(start_hour=start_hour, end_hour=end_hour):
+                response = client.post("/appointments/check-availability/", {
+                    "field_id": self.field.id, "date": self.start.date().isoformat(),
+                    "start_time": time(start_hour).isoformat(), "end_time": time(end_hour).isoformat(),
+                }, format="json")
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data["non_field_errors"], ["End time must be after start time."])
+        with self.assertRaises(ValueError):
+            Appointment.objects.overlapping(self.start, self.start - timedelta(hours=1))
+
+
+def at(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+class SlotGridTests(SimpleTestCase):
+    day = date(2030, 6, 3)
+
+    def test_free_windows_skip_bookings_and_closed_hours(self):
+        grid = SlotGrid(self.day, opening_time=time(8), closing_time=time(12))
+        busy = [(at(self.day, 7), at(self.day, 9)), (at(self.day, 10, 30), at(self.day, 11))]
+
+        self.assertEqual(grid.free_windows(busy), [
+            (at(self.day, 9), at(self.day, 10, 30)),
+            (at(self.day, 11), at(self.day, 12)),
+        ])
+
+    def test_slots_honour_duration_and_step(self):
+        grid = SlotGrid(self.day, opening_time=time(8), closing_time=time(10))
+        busy = [(at(self.day, 9, 10), at(self.day, 9, 20))]
+
+        self.assertEqual(grid.slots(busy, duration_minutes=30, step_minutes=15), [
+            (at(self.day, 8), at(self.day, 8, 30)),
+            (at(self.day, 8, 15), at(self.day, 8, 45)),
+            (at(self.day, 8, 30), at(self.day, 9)),
+            (at(self.day, 9, 20), at(self.day, 9, 50)),
+        ])
+        self.assertEqual(grid.slots(busy, duration_minutes=30, step_minutes=15, limit=2), [
+            (at(self.day, 8), at(self.day, 8, 30)),
+            (at(self.day, 8, 15), at(self.day, 8, 45)),
+        ])
+
+    def test_partially_booked_minutes_are_busy(self):
+        grid = SlotGrid(self.day, opening_time=time(8), closing_time=time(9))
+        busy = [(at(self.day, 8, 10) + timedelta(seconds=20), at(self.day, 8, 20) + timedelta(seconds=1))]
+
+        self.assertEqual(grid.free_windows(busy), [
+            (at(self.day, 8), at(self.day, 8, 10)),
+            (at(self.day, 8, 21), at(self.day, 9)),
+        ])
+
+    def test_multi_day_range_with_overnight_hours(self):
+        next_day = self.day + timedelta(days=1)
+        grid = SlotGrid(self.day, next_day, opening_time=time(18), closing_time=time(2))
+        busy = [(at(next_day, 1), at(next_day, 20))]
+
+        self.assertEqual(grid.free_windows(busy), [
+            (at(self.day, 18), at(next_day, 1)),
+            (at(next_day, 20), at(next_day + timedelta(days=1), 2)),
+        ])
+
+
+class AvailableSlotsViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.user, address=address, price=100,
+                                                  opening_time=time(9), closing_time=time(12))
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_slots_use_field_hours_duration_and_step(self):
+        Appointment.objects.create(user=self.user, field=self.field, start_time=at(self.day, 10),
+                                   end_time=at(self.day, 11))
+
+        response = self.client.get("/appointments/available-slots/", {
+            "field_id": self.field.id, "date": self.day.isoformat(), "duration": "0.5", "step": "30",
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([slot["start_time"] for slot in response.data["available_slots"]], [
+            at(self.day, 9), at(self.day, 9, 30), at(self.day, 11), at(self.day, 11, 30),
+        ])
+
+    def test_multi_day_range(self):
+        response = self.client.get("/appointments/available-slots/", {
+            "field_id": self.field.id, "date": self.day.isoformat(),
+            "end_date": (self.day + timedelta(days=1)).isoformat(), "duration": "3",
+        })
+
+        self.assertEqual(len(response.data["available_slots"]), 2)
+
+    def test_invalid_range_is_rejected(self):
+        response = self.client.get("/appointments/available-slots/", {
+            "field_id": self.field.id, "date": self.day.isoformat(),
+            "end_date": (self.day - timedelta(days=1)).isoformat(),
+        })
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_small_steps_over_long_ranges_are_rejected(self):
+        params = {"field_id": self.field.id, "date": self.day.isoformat(), "step": "1"}
+
+        self.assertEqual(self.client.get("/appointments/available-slots/", params).status_code, 200)
+        response = self.client.get("/appointments/available-slots/", {
+            **params, "end_date": (self.day + timedelta(days=30)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("step is too small", response.data["error"])
+
+
+class CalendarViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.fields = [
+            FootballField.objects.create(name=f"Arena {i}", owner=self.user, address=address, price=100,
+                                         opening_time=time(9), closing_time=time(12))
+            for i in range(6)
+        ]
+        self.day = timezone.localdate() + timedelta(days=3)
+        for field in self.fields:
+            Appointment.objects.create(user=self.user, field=field, start_time=at(self.day, 10),
+                                       end_time=at(self.day, 11))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_calendar(self, fields, days):
+        return self.client.get("/appointments/calendar/", {
+            "field_ids": ",".join(str(field.id) for field in fields),
+            "start_date": self.day.isoformat(),
+            "end_date": (self.day + timedelta(days=days - 1)).isoformat(),
+        })
+
+    def test_calendar_groups_busy_and_free_windows_per_field_and_day(self):
+        response = self.get_calendar(self.fields[:1], days=2)
+
+        self.assertEqual(response.status_code, 200)
+        first_day, second_day = response.data["fields"][0]["days"]
+        self.assertEqual(first_day["busy"], [(at(self.day, 10), at(self.day, 11))])
+        self.assertEqual(first_day["free"], [(at(self.day, 9), at(self.day, 10)), (at(self.day, 11), at(self.day, 12))])
+        next_day = self.day + timedelta(days=1)
+        self.assertEqual(second_day["busy"], [])
+        self.assertEqual(second_day["free"], [(at(next_day, 9), at(next_day, 12))])
+
+    def test_query_count_does_not_grow_with_fields_or_days(self):
+        with self.assertNumQueries(2):
+            self.get_calendar(self.fields[:1], days=1)
+        with self.assertNumQueries(2):
+            response = self.get_calendar(self.fields, days=14)
+
+        self.assertEqual(len(response.data["fields"]), 6)
+        self.assertTrue(all(len(field["days"]) == 14 for field in response.data["fields"]))
+
+    def test_unknown_field_is_reported(self):
+        response = self.client.get("/appointments/calendar/", {"field_ids": "999999", "start_date": self.day})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data["field_ids"], [999999])
+
+
+class AsyncAvailabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.user, address=address, price=100,
+                                                  opening_time=time(9), closing_time=time(12))
+        self.day = timezone.localdate() + timedelta(days=3)
+        Appointment.objects.create(user=self.user, field=self.field, start_time=at(self.day, 10),
+                                   end_time=at(self.day, 11))
+        self.sync_client = APIClient()
+        self.sync_client.force_authenticate(self.user)
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def test_async_endpoints_match_the_sync_actions(self):
+        params = {"field_id": self.field.id, "date": self.day.isoformat(), "duration": "0.5", "step": "30"}
+        self.assertEqual(self.client.get("/appointments/async/available-slots/", params, **self.auth).json(),
+                         self.sync_client.get("/appointments/available-slots/", params).json())
+
+        for body in ({"field_id": self.field.id, "date": self.day.isoformat()},
+                     {"field_id": self.field.id, "date": self.day.isoformat(), "start_time": "10:30", "end_time": "12:00"}):
+            self.assertEqual(
+                self.client.post("/appointments/async/check-availability/", body, "application/json", **self.auth).json(),
+                self.sync_client.post("/appointments/check-availability/", body, format="json").json(),
+            )
+
+    def test_async_errors_match_the_sync_actions(self):
+        cases = [
+            ("get", "available-slots/", {"field_id": self.field.id}),
+            ("get", "available-slots/", {"field_id": 0, "date": self.day.isoformat()}),
+            ("post", "check-availability/", {"field_id": 0, "date": self.day.isoformat()}),
+            ("post", "check-availability/", {"date": "tomorrow"}),
+        ]
+        for method, path, data in cases:
+            with self.subTest(path=path, data=data):
+                json_body = method == "post"
+                expected = getattr(self.sync_client, method)(f"/appointments/{path}", data,
+                                                             format="json" if json_body else None)
+                response = getattr(self.client, method)(f"/appointments/async/{path}", data, **self.auth,
+                                                        **({"content_type": "application/json"} if json_body else {}))
+                self.assertEqual((response.status_code, response.json()), (expected.status_code, expected.json()))
+
+        self.assertEqual(self.client.get("/appointments/async/available-slots/").status_code, 401)
+        self.assertEqual(self.client.post("/appointments/async/available-slots/", **self.auth).status_code, 405)
+
+    @override_settings(QUERY_COUNT_HEADERS=True)
+    async def test_runs_on_the_event_loop_with_query_headers(self):
+        response = await self.async_client.get("/appointments/async/available-slots/", {
+            "field_id": self.field.id, "date": self.day.isoformat(),
+        }, headers={"authorization": self.auth["HTTP_AUTHORIZATION"]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["available_slots"]), 2)
+        # The user, the field and the bookings.
+        self.assertEqual(response["X-Query-Count"], "3")
+
+
+def parse_event(chunk):
+    text = chunk.decode() if isinstance(chunk, bytes) else chunk
+    lines = dict(line.split(": ", 1) for line in text.splitlines() if line)
+    return lines["event"], json.loads(lines["data"])
+
+
+@override_settings(LIVE_SLOTS_BROKER_URL="memory://live-slot-tests")
+class LiveSlotStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.user, address=address, price=100)
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.channel = live.channel_name(self.field.id, self.day)
+
+    def book(self, start, end):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(user=self.user, field=self.field, start_time=start, end_time=end)
+
+    def move(self, appointment, start, end):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.start_time, appointment.end_time = start, end
+            appointment.save()
+
+    def cancel(self, appointment):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+
+    async def next_event(self, stream):
+        return parse_event(await asyncio.wait_for(anext(stream), 2))
+
+    async def test_clients_watching_a_day_share_one_subscription(self):
+        broker = live.get_broker()
+        streams = [live.stream(self.field.id, self.day) for _ in range(3)]
+        for stream in streams:
+            self.assertEqual(await self.next_event(stream), ("snapshot", {
+                "field_id": self.field.id, "date": self.day.isoformat(), "busy": [],
+            }))
+        self.assertEqual(len(broker.subscribers[self.channel]), 1)
+
+        appointment = await sync_to_async(self.book)(at(self.day, 10), at(self.day, 11))
+        await sync_to_async(self.move)(appointment, at(self.day, 12), at(self.day, 13))
+        await sync_to_async(self.cancel)(appointment)
+
+        for stream in streams:
+            self.assertEqual(await self.next_event(stream), ("delta", {
+                "booked": [[f"{self.day}T10:00:00Z", f"{self.day}T11:00:00Z"]],
+            }))
+            self.assertEqual(set((await self.next_event(stream))[1]), {"released", "booked"})
+            self.assertEqual(list((await self.next_event(stream))[1]), ["released"])
+        for stream in streams:
+            await stream.aclose()
+        self.assertNotIn(self.channel, broker.subscribers)
+
+    async def test_only_the_days_a_booking_touches_are_notified(self):
+        next_day = live.stream(self.field.id, self.day + timedelta(days=1))
+        other_day = live.stream(self.field.id, self.day + timedelta(days=2))
+        await self.next_event(next_day)
+        await self.next_event(other_day)
+
+        await sync_to_async(self.book)(at(self.day, 23), at(self.day + timedelta(days=1), 1))
+
+        self.assertEqual(list((await self.next_event(next_day))[1]), ["booked"])
+        with self.assertRaises(TimeoutError):
+            await asyncio.wait_for(anext(other_day), 0.2)
+        await next_day.aclose()
+        await other_day.aclose()
+
+    def test_events_wait_for_commit(self):
+        broker = live.get_broker()
+        published = []
+        broker.publish_many, original = published.append, broker.publish_many
+        try:
+            with self.captureOnCommitCallbacks() as callbacks:
+                Appointment.objects.create(user=self.user, field=self.field, start_time=at(self.day, 10),
+                                           end_time=at(self.day, 11))
+                self.assertEqual(published, [])
+            for callback in callbacks:
+                callback()
+        finally:
+            broker.publish_many = original
+
+        self.assertEqual(list(published[0]), [self.channel])
+
+    async def test_endpoint_streams_a_snapshot_then_deltas(self):
+        await sync_to_async(self.book)(at(self.day, 10), at(self.day, 11))
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+
+        response = await self.async_client.get("/appointments/stream/", {
+            "field_id": self.field.id, "date": self.day.isoformat(),
+        }, headers={"authorization": f"Bearer {token}"})
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        event, data = await self.next_event(events)
+        self.assertEqual((event, len(data["busy"])), ("snapshot", 1))
+        await sync_to_async(self.book)(at(self.day, 12), at(self.day, 13))
+        self.assertEqual((await self.next_event(events))[0], "delta")
+        missing = await self.async_client.get("/appointments/stream/", {"field_id": 0, "date": self.day.isoformat()},
+                                              headers={"authorization": f"Bearer {token}"})
+        self.assertEqual(missing.status_code, 404)
+
+
+class AppointmentPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        field = FootballField.objects.create(name="Arena", owner=self.user, address=address, price=100)
+        start = timezone.now() + timedelta(days=1)
+        self.appointments = [
+            Appointment.objects.create(user=self.user, field=field, start_time=start + timedelta(hours=hours),
+                                       end_time=start + timedelta(hours=hours, minutes=30))
+            for hours in reversed(range(15))
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_my_appointments_are_cursor_paginated_by_start_time(self):
+        first = self.client.get("/appointments/my-appointments/")
+        second = self.client.get(first.data["next"])
+
+        ids = [appointment["id"] for appointment in first.data["results"] + second.data["results"]]
+        expected = sorted(self.appointments, key=lambda appointment: appointment.start_time)
+        self.assertEqual(ids, [appointment.id for appointment in expected])
+        self.assertIsNone(second.data["next"])
+
+    def test_cursor_keys_on_start_time_and_id_through_ties(self):
+        address = Address.objects.create(address_line_1="2 Main St", city="Tashkent", country="Uzbekistan")
+        start = self.appointments[0].start_time + timedelta(days=1)
+        tied = [
+            Appointment.objects.create(
+                user=self.user, start_time=start, end_time=start + timedelta(hours=1),
+                field=FootballField.objects.create(name=f"Arena {i}", owner=self.user, address=address, price=100),
+            )
+            for i in range(7)
+        ]
+
+        pages, url = [], "/appointments/my-appointments/?page_size=4"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertFalse(any("OFFSET" in query["sql"] for query in queries))
+            pages.append([appointment["id"] for appointment in response.data["results"]])
+            url = response.data["next"]
+
+        self.assertEqual(sum(pages, [])[-7:], [appointment.id for appointment in tied])
+        self.assertEqual(len(sum(pages, [])), 22)
+        back = self.client.get(response.data["previous"])
+        self.assertEqual([appointment["id"] for appointment in back.data["results"]], pages[-2])
+        self.assertEqual(self.client.get(url or "/appointments/my-appointments/", {"cursor": "bogus"}).status_code, 404)
+
+    def test_list_supports_page_numbers_for_older_clients(self):
+        response = self.client.get("/appointments/", {"page": 2})
+
+        self.assertEqual(response.data["count"], 15)
+        self.assertEqual(len(response.data["results"]), 5)
+
+
+class BulkBookingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.user, address=address, price=100)
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def book(self, recurrence, **extra):
+        return self.client.post("/appointments/bulk/", {
+            "field": self.field.id,
+            "start_time": at(self.day, 19).isoformat(),
+            "end_time": at(self.day, 20, 30).isoformat(),
+            "recurrence": recurrence,
+            **extra,
+        }, format="json")
+
+    def test_weekly_season_is_booked_in_one_request(self):
+        response = self.book("FREQ=WEEKLY;COUNT=20")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 20)
+        self.assertEqual(response.data["total_cost"], 20 * 150)
+        starts = list(Appointment.objects.order_by("start_time").values_list("start_time", flat=True))
+        self.assertEqual(starts, [at(self.day + timedelta(weeks=week), 19) for week in range(20)])
+
+    def test_query_count_does_not_grow_with_occurrences(self):
+        for count in (2, 40):
+            Appointment.objects.all().delete()
+            cache.clear()
+            with self.assertNumQueries(8):
+                self.assertEqual(self.book(f"FREQ=DAILY;COUNT={count}").status_code, 201)
+
+    def test_conflict_blocks_the_whole_series_by_default(self):
+        Appointment.objects.create(user=self.user, field=self.field, start_time=at(self.day + timedelta(weeks=2), 20),
+                                   end_time=at(self.day + timedelta(weeks=2), 21))
+
+        response = self.book("FREQ=WEEKLY;COUNT=4")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([occurrence["status"] for occurrence in response.data["occurrences"]],
+                         ["available", "available", "conflict", "available"])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_partial_mode_books_everything_that_is_free(self):
+        Appointment.objects.create(user=self.user, field=self.field, start_time=at(self.day, 18),
+                                   end_time=at(self.day, 19, 1))
+
+        response = self.book("FREQ=WEEKLY;COUNT=3", all_or_nothing=False)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([occurrence["status"] for occurrence in response.data["occurrences"]],
+                         ["conflict", "created", "created"])
+        self.assertEqual(response.data["conflicts"], 1)
+        self.assertEqual(Appointment.objects.count(), 3)
+
+    def test_partial_mode_skips_occurrences_booked_after_the_check(self):
+        other = User.objects.create_user(email="racer@example.com", password="pass")
+        checks = []
+
+        def find_conflicts(occurrences, busy):
+            conflicts = real_find_conflicts(occurrences, busy)
+            if not checks:
+                # Another request books the second week between the check and the insert.
+                week = self.day + timedelta(weeks=1)
+                Appointment.objects.create(user=other, field=self.field, start_time=at(week, 19),
+                                           end_time=at(week, 20))
+            checks.append(conflicts)
+            return conflicts
+
+        real_find_conflicts = serializers.find_conflicts
+        with mock.patch("appointments.serializers.find_conflicts", find_conflicts):
+            response = self.book("FREQ=WEEKLY;COUNT=3", all_or_nothing=False)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(checks), 2)
+        self.assertEqual([occurrence["status"] for occurrence in response.data["occurrences"]],
+                         ["created", "conflict", "created"])
+        self.assertEqual(response.data["conflicts"], 1)
+        self.assertEqual(Appointment.objects.filter(user=self.user).count(), 2)
+
+    def test_unbounded_or_self_overlapping_rules_are_rejected(self):
+        self.assertEqual(self.book("FREQ=WEEKLY").status_code, 400)
+        self.assertEqual(self.book("FREQ=HOURLY;COUNT=3").status_code, 400)
+        self.assertEqual(self.book("NOT A RULE").status_code, 400)
+
+    def test_rules_cannot_move_the_series_start(self):
+        for recurrence in ("DTSTART:20200101T190000\nRRULE:FREQ=WEEKLY;COUNT=3",
+                           "RRULE:FREQ=WEEKLY;COUNT=3\nRDATE:20200101T190000",
+                           "FREQ=WEEKLY;COUNT=3;DTSTART=20200101T190000"):
+            with self.subTest(recurrence=recurrence):
+                response = self.book(recurrence)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("recurrence", response.data)
+        self.assertFalse(Appointment.objects.exists())
+        self.assertEqual(self.book("RRULE:FREQ=WEEKLY;COUNT=2").data["created"], 2)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.owner, address=address, price=100,
+                                                  opening_time=time(8), closing_time=time(18))
+        self.other = FootballField.objects.create(name="Other", owner=self.owner, address=address, price=50)
+        self.day = date(2031, 3, 3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def rollups(self):
+        return {
+            (rollup.field_id, rollup.day): (rollup.bookings, rollup.booked_seconds, rollup.revenue)
+            for rollup in FieldDayRollup.objects.all()
+            if rollup.bookings or rollup.booked_seconds
+        }
+
+    def book(self, field, day, start_hour, end_hour):
+        return self.client.post("/appointments/", {
+            "user": self.owner.id, "field": field.id,
+            "start_time": at(day, start_hour).isoformat(), "end_time": at(day, end_hour).isoformat(),
+        }, format="json")
+
+    def test_create_update_and_delete_apply_deltas(self):
+        first = self.book(self.field, self.day, 10, 12).data["id"]
+        self.book(self.field, self.day, 14, 15)
+        self.assertEqual(self.rollups(), {(self.field.id, self.day): (2, 3 * 3600, 300)})
+
+        next_day = self.day + timedelta(days=1)
+        response = self.client.put(f"/appointments/{first}/", {
+            "user": self.owner.id, "field": self.other.id,
+            "start_time": at(next_day, 10).isoformat(), "end_time": at(next_day, 11).isoformat(),
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rollups(), {
+            (self.field.id, self.day): (1, 3600, 100),
+            (self.other.id, next_day): (1, 3600, 50),
+        })
+
+        self.client.delete(f"/appointments/{first}/")
+        self.assertEqual(self.rollups(), {(self.field.id, self.day): (1, 3600, 100)})
+
+    def test_bulk_bookings_are_rolled_up(self):
+        self.client.post("/appointments/bulk/", {
+            "field": self.field.id, "start_time": at(self.day, 9).isoformat(),
+            "end_time": at(self.day, 10).isoformat(), "recurrence": "FREQ=DAILY;COUNT=3",
+        }, format="json")
+
+        self.assertEqual(len(self.rollups()), 3)
+        self.assertEqual(FieldDayRollup.objects.aggregate(total=Sum("revenue"))["total"], 300)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        for offset in range(5):
+            self.book(self.field, self.day + timedelta(days=offset * 10), 9, 10 + offset % 3)
+        expected = self.rollups()
+        FieldDayRollup.objects.update(bookings=99, revenue=0)
+        FieldDayRollup.objects.create(field=self.other, day=date(2020, 1, 1), bookings=5)
+
+        call_command("rebuild_rollups", chunk_days=7, stdout=StringIO())
+
+        self.assertEqual(self.rollups(), expected)
+
+    def test_bookings_across_midnight_split_their_time_between_days(self):
+        next_day = self.day + timedelta(days=1)
+        appointment = Appointment.objects.create(user=self.owner, field=self.other, start_time=at(self.day, 22),
+                                                 end_time=at(next_day, 1, 30), total_cost=175)
+        expected = {(self.other.id, self.day): (1, 2 * 3600, 175), (self.other.id, next_day): (0, 5400, 0)}
+        self.assertEqual(self.rollups(), expected)
+
+        call_command("rebuild_rollups", chunk_days=1, stdout=StringIO())
+        self.assertEqual(self.rollups(), expected)
+
+        appointment.delete()
+        self.assertEqual(self.rollups(), {})
+
+    def test_owner_analytics_reads_only_rollups(self):
+        for hour in (8, 10, 12, 14):
+            self.book(self.field, self.day, hour, hour + 1)
+        self.book(self.field, self.day + timedelta(days=8), 8, 18)
+
+        params = {"period": "week", "start_date": self.day.isoformat(),
+                  "end_date": (self.day + timedelta(days=13)).isoformat(), "field_id": self.field.id}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/football/analytics/", params)
+
+        self.assertFalse(any('"Appointments"' in query["sql"] for query in queries))
+        first_week, second_week = response.data["fields"][0]["periods"]
+        self.assertEqual((first_week["bookings"], first_week["booked_hours"], first_week["revenue"]), (4, 4, 400))
+        self.assertEqual(first_week["utilization"], round(4 / 70, 4))
+        self.assertEqual(second_week["utilization"], round(10 / 70, 4))
+
+    def test_analytics_only_cover_the_owners_fields(self):
+        stranger = User.objects.create_user(email="stranger@example.com", password="pass", first_name="Stranger")
+        self.client.force_authenticate(stranger)
+
+        response = self.client.get("/football/analytics/", {"start_date": self.day, "end_date": self.day})
+
+        self.assertEqual(response.data["fields"], [])
+
+    def test_deleting_a_user_settles_their_bookings_in_one_statement(self):
+        player = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        for offset in range(5):
+            Appointment.objects.create(user=player, field=self.field, start_time=at(self.day + timedelta(days=offset), 9),
+                                       end_time=at(self.day + timedelta(days=offset), 10), total_cost=100)
+        Appointment.objects.create(user=self.owner, field=self.field, start_time=at(self.day, 12),
+                                   end_time=at(self.day, 13), total_cost=100)
+
+        with CaptureQueriesContext(connection) as queries:
+            player.delete()
+
+        self.assertEqual(sum('"Field Day Rollups"' in query["sql"] for query in queries), 1)
+        self.assertEqual(self.rollups(), {(self.field.id, self.day): (1, 3600, 100)})
+
+
+class HeatmapTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        self.player = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.owner, address=address, price=100)
+        self.monday = heatmap.week_start(timezone.localdate()) - timedelta(weeks=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def book(self, user, day, start, end):
+        return Appointment.objects.create(user=user, field=self.field, start_time=at(day, *start),
+                                          end_time=at(day, *end))
+
+    def assertMatchesLiveData(self, weeks=4):
+        self.assertEqual(heatmap.occupancy(self.field.id, weeks), heatmap.live_occupancy(self.field.id, weeks))
+
+    def test_split_cuts_bookings_at_hour_boundaries(self):
+        sunday = self.monday + timedelta(days=6)
+        cells = list(heatmap.split(at(sunday, 22, 30), at(sunday + timedelta(days=1), 1, 15)))
+
+        self.assertEqual(cells, [
+            (self.monday, 6 * 24 + 22, 1800),
+            (self.monday, 6 * 24 + 23, 3600),
+            (self.monday + timedelta(weeks=1), 0, 3600),
+            (self.monday + timedelta(weeks=1), 1, 900),
+        ])
+
+    def test_counters_follow_creates_moves_and_deletes(self):
+        moved = self.book(self.player, self.monday, (10, 30), (12, 15))
+        self.book(self.owner, self.monday + timedelta(days=2), (18,), (20,))
+        self.assertMatchesLiveData()
+
+        moved = Appointment.objects.get(id=moved.id)
+        moved.start_time, moved.end_time = at(self.monday + timedelta(days=9), 7), at(self.monday + timedelta(days=9), 9)
+        moved.save()
+        self.assertMatchesLiveData()
+
+        Appointment.objects.get(id=moved.id).delete()
+        self.assertMatchesLiveData()
+        self.assertEqual(heatmap.occupancy(self.field.id, 4)[2][18], 0.25)
+
+    def test_user_deletion_and_bulk_inserts_are_counted(self):
+        for offset in range(3):
+            self.book(self.player, self.monday + timedelta(days=offset), (9,), (11,))
+        with self.captureOnCommitCallbacks(execute=True):
+            aggregates.bookings_created(Appointment.objects.bulk_create([
+                Appointment(user=self.owner, field=self.field, start_time=at(self.monday, 12), end_time=at(self.monday, 13))
+            ]))
+        self.assertMatchesLiveData()
+
+        self.player.delete()
+        self.assertMatchesLiveData()
+
+    def test_reconcile_repairs_writes_that_bypassed_the_model(self):
+        appointment = self.book(self.player, self.monday, (10,), (11,))
+        Appointment.objects.filter(id=appointment.id).update(start_time=at(self.monday, 15), end_time=at(self.monday, 17))
+
+        reconcile_heatmaps.delay()
+
+        self.assertMatchesLiveData()
+
+    def test_reconcile_keeps_bookings_that_cross_into_the_next_week(self):
+        sunday = self.monday + timedelta(days=6)
+        Appointment.objects.create(user=self.player, field=self.field, start_time=at(sunday, 22),
+                                   end_time=at(sunday + timedelta(days=1), 2))
+        FieldWeekHeatmap.objects.all().delete()
+
+        reconcile_heatmaps.delay()
+
+        self.assertEqual(FieldWeekHeatmap.objects.count(), 2)
+        self.assertMatchesLiveData()
+
+    def test_owner_endpoint_returns_a_week_by_hour_matrix(self):
+        for week in range(4):
+            self.book(self.player, self.monday + timedelta(weeks=1 - week), (20,), (21,))
+
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/football/{self.field.id}/heatmap/", {"weeks": 4})
+
+        self.assertEqual(len(response.data["occupancy"]), 7)
+        self.assertEqual(len(response.data["occupancy"][0]), 24)
+        self.assertEqual(response.data["occupancy"][0][20], 1.0)
+        self.client.force_authenticate(self.player)
+        self.assertEqual(self.client.get(f"/football/{self.field.id}/heatmap/").status_code, 403)
+
+
+PARTITION_PATTERN = re.compile(r'"?(Appointments_(?:\d{4}_\d{2}|default))"?')
+
+
+class PartitionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.user, address=address, price=100)
+        self.month = partitions.add_months(partitions.month_start(timezone.localdate()), 1)
+        self.boundary = partitions.boundary(self.month)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def book(self, start, end):
+        return Appointment.objects.create(user=self.user, field=self.field, start_time=start, end_time=end)
+
+    def partition_of(self, appointment):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM "Appointments" WHERE id = %s', [appointment.id])
+            return cursor.fetchone()[0].strip('"')
+
+    def scanned(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {sql}")
+            plan = "\n".join(line for line, in cursor.fetchall())
+        return set(PARTITION_PATTERN.findall(plan))
+
+    def appointment_queries(self, path, params, method="get"):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, params, format="json")
+        self.assertEqual(response.status_code, 200)
+        return [query["sql"] for query in queries if 'FROM "Appointments"' in query["sql"]]
+
+    def test_migration_creates_upcoming_months_and_a_default(self):
+        attached = partitions.attached()
+        current = partitions.month_start(timezone.localdate())
+
+        for months in range(partitions.PARTITIONS_AHEAD + 1):
+            self.assertIn(partitions.partition_name(partitions.add_months(current, months)), attached)
+        self.assertIsNone(attached[partitions.default_partition()])
+
+    def test_bookings_land_in_their_months_partition(self):
+        appointment = self.book(self.boundary + timedelta(hours=10), self.boundary + timedelta(hours=11))
+
+        self.assertEqual(self.partition_of(appointment), partitions.partition_name(self.month))
+
+    def test_task_moves_bookings_out_of_the_default_partition(self):
+        later = partitions.add_months(self.month, 24)
+        start = partitions.boundary(later) + timedelta(days=3, hours=10)
+        appointment = self.book(start, start + timedelta(hours=1))
+        self.assertEqual(self.partition_of(appointment), partitions.default_partition())
+
+        created = create_partitions()
+
+        self.assertIn(partitions.partition_name(later), created)
+        self.assertEqual(self.partition_of(appointment), partitions.partition_name(later))
+        self.assertEqual(create_partitions(), [])
+
+    def test_overlap_across_a_partition_boundary_is_rejected(self):
+        self.book(self.boundary - timedelta(hours=1), self.boundary + timedelta(hours=1))
+
+        with self.assertRaises(IntegrityError) as raised, transaction.atomic():
+            self.book(self.boundary + timedelta(minutes=30), self.boundary + timedelta(hours=2))
+        self.assertTrue(is_overlap_violation(raised.exception))
+        self.book(self.boundary + timedelta(hours=1), self.boundary + timedelta(hours=2))
+
+    def test_moving_a_booking_into_another_partition_checks_overlap(self):
+        self.book(self.boundary, self.boundary + timedelta(hours=2))
+        moved = self.book(self.boundary - timedelta(hours=5), self.boundary - timedelta(hours=4))
+
+        moved.start_time, moved.end_time = self.boundary + timedelta(hours=1), self.boundary + timedelta(hours=3)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            moved.save()
+
+    def test_bookings_longer_than_the_maximum_are_refused(self):
+        start = self.boundary + timedelta(hours=10)
+
+        response = self.client.post("/appointments/", {
+            "user": self.user.id, "field": self.field.id, "start_time": start.isoformat(),
+            "end_time": (start + timedelta(days=7, minutes=30)).isoformat(),
+        }, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["non_field_errors"], ["Bookings can last at most 7 days."])
+
+    def test_availability_and_listing_queries_prune_partitions(self):
+        day = self.month + timedelta(days=14)
+        only_this_month = {partitions.partition_name(self.month)}
+
+        for path, params, method in [
+            ("/appointments/available-slots/", {"field_id": self.field.id, "date": day.isoformat()}, "get"),
+            ("/appointments/check-availability/", {"field_id": self.field.id, "date": day.isoformat()}, "post"),
+            ("/appointments/", {"date": day.strftime("%d-%m-%Y")}, "get"),
+            ("/appointments/calendar/", {"field_ids": str(self.field.id), "start_date": day.isoformat()}, "get"),
+        ]:
+            with self.subTest(path=path):
+                for sql in self.appointment_queries(path, params, method):
+                    self.assertEqual(self.scanned(sql), only_this_month)
+
+    def test_archive_detaches_old_partitions_and_keeps_their_rollups(self):
+        old_month = partitions.add_months(partitions.month_start(timezone.localdate()), -30)
+        partitions.create_partition(old_month)
+        start = partitions.boundary(old_month) + timedelta(days=2, hours=10)
+        self.book(start, start + timedelta(hours=1))
+        self.book(self.boundary + timedelta(hours=10), self.boundary + timedelta(hours=11))
+        name = partitions.partition_name(old_month)
+
+        FieldDayRollup.objects.create(field=self.field, day=date(2000, 1, 1), bookings=1)
+        # Django's foreign keys are deferred, and ALTER TABLE refuses to run with their checks pending.
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        with tempfile.TemporaryDirectory() as export_dir:
+            call_command("archive_appointments", "--keep-months=24", f"--export-dir={export_dir}", stdout=StringIO())
+            with gzip.open(f"{export_dir}/{name}.csv.gz", "rt") as export:
+                rows = export.read().splitlines()
+
+        self.assertNotIn(name, partitions.attached())
+        self.assertEqual(rows[0].split(",")[:3], ["id", "start_time", "end_time"])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(Appointment.objects.count(), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM "{partitions.ARCHIVE_SCHEMA}"."{name}"')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+        self.assertEqual(partitions.archived_until(), partitions.add_months(old_month, 1))
+        rollups.rebuild()
+        self.assertTrue(FieldDayRollup.objects.filter(day=timezone.localdate(start)).exists())
+        self.assertTrue(FieldDayRollup.objects.filter(day=date(2000, 1, 1)).exists())
+        self.user.delete()
+
+
+class SlotHoldTests(TestCase):
+    def setUp(self):
+        self.holder = User.objects.create_user(email="holder@example.com", password="pass", first_name="Holder")
+        self.other = User.objects.create_user(email="other@example.com", password="pass", first_name="Other")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.holder, address=address, price=100,
+                                                  opening_time=time(9), closing_time=time(12))
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.holder_client, self.other_client = self.client_for(self.holder), self.client_for(self.other)
+        # Every test starts without holds.
+        store = override_settings(SLOT_HOLDS_URL=f"memory://{self.id()}")
+        store.enable()
+        self.addCleanup(store.disable)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def hold(self, client, start_hour, end_hour):
+        return client.post("/appointments/holds/", {
+            "field": self.field.id, "start_time": at(self.day, start_hour).isoformat(),
+            "end_time": at(self.day, end_hour).isoformat(),
+        }, format="json")
+
+    def book(self, client, user, start_hour, end_hour):
+        return client.post("/appointments/", {
+            "user": user.id, "field": self.field.id, "start_time": at(self.day, start_hour).isoformat(),
+            "end_time": at(self.day, end_hour).isoformat(),
+        }, format="json")
+
+    def free_starts(self, client):
+        response = client.get("/appointments/available-slots/", {"field_id": self.field.id,
+                                                                 "date": self.day.isoformat()})
+        return [slot["start_time"].hour for slot in response.data["available_slots"]]
+
+    def test_holds_are_busy_for_everyone_but_the_holder(self):
+        response = self.hold(self.holder_client, 10, 11)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["field_id"], self.field.id)
+
+        self.assertEqual(self.free_starts(self.holder_client), [9, 10, 11])
+        self.assertEqual(self.free_starts(self.other_client), [9, 11])
+        window = {"field_id": self.field.id, "date": self.day.isoformat(), "start_time": "10:30", "end_time": "11:30"}
+        checked = self.other_client.post("/appointments/check-availability/", window, format="json")
+        self.assertEqual(checked.data, {"available": False, "conflicts": 1})
+        day = self.other_client.post("/appointments/check-availability/", {
+            "field_id": self.field.id, "date": self.day.isoformat(),
+        }, format="json")
+        self.assertEqual(day.data["held_slots"], [{"start_time": at(self.day, 10), "end_time": at(self.day, 11)}])
+        calendar = self.other_client.get("/appointments/calendar/", {"field_ids": str(self.field.id),
+                                                                    "start_date": self.day.isoformat()})
+        self.assertEqual(calendar.data["fields"][0]["days"][0]["busy"], [(at(self.day, 10), at(self.day, 11))])
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.other).access_token}"}
+        async_slots = self.client.get("/appointments/async/available-slots/", {
+            "field_id": self.field.id, "date": self.day.isoformat(),
+        }, **auth).json()
+        self.assertEqual(len(async_slots["available_slots"]), 2)
+
+    def test_held_slots_cannot_be_booked_or_held_by_others(self):
+        self.hold(self.holder_client, 10, 11)
+
+        for response in (self.book(self.other_client, self.other, 10, 12), self.hold(self.other_client, 9, 11)):
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data["non_field_errors"], [HELD_MESSAGE])
+        bulk = self.other_client.post("/appointments/bulk/", {
+            "field": self.field.id, "start_time": at(self.day, 10).isoformat(),
+            "end_time": at(self.day, 11).isoformat(), "recurrence": "FREQ=DAILY;COUNT=2", "all_or_nothing": False,
+        }, format="json")
+        self.assertEqual([occurrence["status"] for occurrence in bulk.data["occurrences"]], ["conflict", "created"])
+        self.assertEqual(self.hold(self.other_client, 11, 12).status_code, 201)
+        self.assertEqual(self.book(self.holder_client, self.holder, 10, 11).status_code, 201)
+
+    def test_confirm_turns_the_hold_into_a_booking(self):
+        hold_id = self.hold(self.holder_client, 10, 11).data["id"]
+
+        response = self.holder_client.post(f"/appointments/holds/{hold_id}/confirm/")
+
+        self.assertEqual(response.status_code, 201)
+        appointment = Appointment.objects.get(id=response.data["id"])
+        self.assertEqual((appointment.user, appointment.start_time), (self.holder, at(self.day, 10)))
+        self.assertEqual(self.holder_client.get(f"/appointments/holds/{hold_id}/").status_code, 404)
+        self.assertEqual(self.holder_client.post(f"/appointments/holds/{hold_id}/confirm/").status_code, 404)
+        self.assertEqual(self.free_starts(self.other_client), [9, 11])
+
+    def test_holds_can_be_released_only_by_their_user(self):
+        hold_id = self.hold(self.holder_client, 10, 11).data["id"]
+
+        self.assertEqual(self.other_client.delete(f"/appointments/holds/{hold_id}/").status_code, 404)
+        self.assertEqual(self.other_client.post(f"/appointments/holds/{hold_id}/confirm/").status_code, 404)
+        self.assertEqual(self.holder_client.delete(f"/appointments/holds/{hold_id}/").status_code, 204)
+        self.assertEqual(self.free_starts(self.other_client), [9, 10, 11])
+
+    def test_booked_slots_cannot_be_held(self):
+        self.book(self.other_client, self.other, 10, 11)
+
+        response = self.hold(self.holder_client, 10, 12)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["non_field_errors"], ["This time slot conflicts with an existing appointment."])
+
+    @override_settings(SLOT_HOLD_SECONDS=0.2)
+    def test_holds_lapse_on_their_own(self):
+        hold_id = self.hold(self.holder_client, 10, 11).data["id"]
+        clock.sleep(0.3)
+
+        self.assertEqual(self.free_starts(self.other_client), [9, 10, 11])
+        self.assertEqual(self.holder_client.post(f"/appointments/holds/{hold_id}/confirm/").status_code, 404)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_admin_group_id()
+        self.admin = User.objects.create_user(email="admin@example.com", password="pass", first_name="Admin")
+        self.admin.groups.add(Group.objects.get_or_create(name=ADMIN_GROUP_NAME)[0])
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        self.rival = User.objects.create_user(email="rival@example.com", password="pass", first_name="Rival")
+        self.player = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.owner, address=address, price=100)
+        self.other_field = FootballField.objects.create(name="Rival Arena", owner=self.rival, address=address,
+                                                        price=100)
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.book(self.field, 0, 10)
+        self.book(self.field, 1, 9)
+        self.book(self.other_field, 0, 10)
+
+    def book(self, field, days, hour):
+        day = self.day + timedelta(days=days)
+        return Appointment.objects.create(user=self.player, field=field, start_time=at(day, hour),
+                                          end_time=at(day, hour + 1))
+
+    def export(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get("/appointments/export/", params)
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_owners_export_their_fields_appointments_as_csv(self):
+        response = self.export(self.owner)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="appointments.csv"')
+        lines = list(csv.reader(StringIO(self.read(response))))
+        self.assertEqual(lines[0], list(export.HEADER))
+        self.assertEqual([(line[1], line[-2], line[-1]) for line in lines[1:]],
+                         [(str(self.field.id), "Arena", "player@example.com")] * 2)
+        self.assertEqual(datetime.fromisoformat(lines[1][3]), at(self.day, 10))
+
+    def test_admins_export_everything_as_ndjson(self):
+        response = self.export(self.admin, output="ndjson")
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row["field_name"] for row in rows], ["Arena", "Rival Arena", "Arena"])
+        self.assertEqual(set(rows[0]), set(export.HEADER))
+
+    def test_filters_match_the_list(self):
+        rows = self.read(self.export(self.admin, output="ndjson", field_id=self.field.id,
+                                     date=self.day.strftime("%d-%m-%Y"))).splitlines()
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(datetime.fromisoformat(json.loads(rows[0])["start_time"]), at(self.day, 10))
+        self.assertEqual(len(self.read(self.export(self.admin, upcoming="true")).splitlines()), 4)
+
+    def test_players_and_unknown_formats_are_refused(self):
+        self.assertEqual(self.export(self.player).status_code, 403)
+        self.assertEqual(self.export(self.owner, output="xlsx").status_code, 400)
+
+    def test_memory_stays_flat_regardless_of_row_count(self):
+        def peak_while_streaming(rows):
+            Appointment.objects.bulk_create([
+                Appointment(user=self.player, field=self.field, start_time=start, end_time=start + timedelta(minutes=5))
+                for start in (at(self.day + timedelta(days=5), 0) + timedelta(minutes=5 * index)
+                              for index in range(Appointment.objects.count(), rows))
+            ])
+            response = self.export(self.admin, output="ndjson")
+            tracemalloc.start()
+            try:
+                streamed = sum(chunk.count(b"\n") for chunk in response.streaming_content)
+                return streamed, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        with mock.patch.object(export, "CHUNK_SIZE", 100):
+            small_rows, small_peak = peak_while_streaming(500)
+            large_rows, large_peak = peak_while_streaming(5000)
+
+        self.assertEqual((small_rows, large_rows), (500, 5000))
+        # Ten times the rows, but the same one chunk in flight at a time.
+        self.assertLess(large_peak, small_peak * 1.5)
+
+
+class RedisHoldStoreTests(SimpleTestCase):
+    url = f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/15"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            redis.Redis.from_url(cls.url, socket_connect_timeout=0.5).ping()
+        except redis.ConnectionError:
+            raise SkipTest(f"No Redis server at {cls.url}")
+
+    def setUp(self):
+        self.store = holds.RedisHolds(self.url)
+        self.field_id = uuid.uuid4().int % 10 ** 9
+        self.addCleanup(self.store.client.delete, *holds.keys(self.field_id))
+        self.start = at(timezone.localdate() + timedelta(days=3), 10)
+
+    def place(self, hold_id, user_id, start_offset, end_offset, seconds=60):
+        return self.store.place(f"{self.field_id}-{hold_id}", self.field_id, user_id,
+                                self.start + timedelta(hours=start_offset), self.start + timedelta(hours=end_offset),
+                                seconds)
+
+    def test_overlapping_holds_of_other_users_are_refused(self):
+        placed, hold = self.place("a", 1, 0, 2)
+        self.assertTrue(placed)
+        self.assertEqual(hold.interval, (self.start, self.start + timedelta(hours=2)))
+
+        self.assertEqual(self.place("b", 2, 1, 3), (False, hold))
+        self.assertTrue(self.place("c", 1, 1, 3)[0])
+        self.assertTrue(self.place("d", 2, 3, 4)[0])
+        found = self.store.find(self.field_id, self.start + timedelta(minutes=150), self.start + timedelta(hours=5))
+        self.assertEqual(sorted(hold.id for hold in found), [f"{self.field_id}-c", f"{self.field_id}-d"])
+        self.assertEqual(self.store.find_many([self.field_id, self.field_id + 1], self.start,
+                                              self.start + timedelta(hours=1)),
+                         {self.field_id: [hold], self.field_id + 1: []})
+
+    def test_taking_and_expiry(self):
+        _, hold = self.place("a", 1, 0, 1)
+        self.assertEqual(self.store.take(self.field_id, hold.id), hold)
+        self.assertEqual(self.store.take(self.field_id, hold.id, remove=True), hold)
+        self.assertIsNone(self.store.take(self.field_id, hold.id))
+
+        self.place("b", 1, 0, 1, seconds=0.1)
+        clock.sleep(0.15)
+        self.assertTrue(self.place("c", 2, 0, 1)[0])
+        self.assertEqual(self.store.client.zcard(holds.keys(self.field_id)[0]), 1)
+        self.assertGreater(self.store.client.pttl(holds.keys(self.field_id)[1]), 0)
@@ -1,14 +1,21 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from appointments.views import AppointmentViewSet
+from appointments.views import (
+    AppointmentViewSet, SlotHoldViewSet, available_slots_async, check_availability_async, slot_stream
+)
 
 router = DefaultRouter()
+# Ahead of the appointments, whose detail route would otherwise take "holds" for an id.
+router.register("holds", SlotHoldViewSet, basename='hold')
 router.register("", AppointmentViewSet, basename='appointment')
 
 app_name = "appointments"
 
 urlpatterns = [
-
+    # Served on the event loop when the project runs under ASGI (config.asgi).
+    path("async/check-availability/", check_availability_async, name="async-check-availability"),
+    path("async/available-slots/", available_slots_async, name="async-available-slots"),
+    path("stream/", slot_stream, name="slot-stream"),
 ] + router.urls
 
 
@@ -1,34 +1,68 @@
-from datetime import datetime, time, timedelta
-from django.contrib.auth.models import Group
+import json
+from datetime import datetime
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
 from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound, ParseError, ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
-from appointments.serializers import AppointmentSerializer, FieldAvailabilitySerializer
+from rest_framework.settings import api_settings
+from rest_framework.viewsets import ModelViewSet, ViewSet
+from accounts.authentication import aauthenticate
+from accounts.permissions import IsAdminOrOwner
+from accounts.roles import is_admin
+from appointments import availability, export, holds, live
+from appointments.serializers import (
+    CONFLICT_MESSAGE, HELD_MESSAGE, AppointmentSerializer, BulkBookingSerializer, CalendarQuerySerializer,
+    FieldAvailabilitySerializer, SlotHoldSerializer, SlotStreamQuerySerializer
+)
 from appointments.models import Appointment
+from appointments.pagination import AppointmentPagination
 from football.models import FootballField
 from appointments.permissions import IsAppointmentOwner
+from appointments.slots import SlotGrid
+from config import throttling
+from config.idempotency import idempotent
+from config.routers import ReplicaReadsMixin, achoose_replica, replica_reads
 
 
-class AppointmentViewSet(ModelViewSet):
+class AppointmentViewSet(ReplicaReadsMixin, ModelViewSet):
     serializer_class = AppointmentSerializer
     queryset = Appointment.objects.all()
+    pagination_class = AppointmentPagination
+    # Booking and its overlap validation stay on the primary.
+    replica_actions = (
+        "list", "retrieve", "my_appointments", "check_availability", "available_slots", "calendar", "export",
+    )
+    throttle_scopes = {
+        "create": "booking", "bulk": "booking",
+        "check_availability": "availability", "available_slots": "availability",
+    }
 
     def get_permissions(self):
         if self.action in ['destroy']:
             return [IsAppointmentOwner()]
+        if self.action in ['export']:
+            return [IsAdminOrOwner()]
         return [IsAuthenticated()]
 
     def get_queryset(self):
         user = self.request.user
         queryset = Appointment.objects.select_related("field", "user")
 
-        admin_group, _ = Group.objects.get_or_create(name='Admins')
-        if user.groups.all().first() != admin_group:
-            queryset = queryset.filter(user=user)
+        if not is_admin(self.request):
+            queryset = queryset.filter(user_id=user.id)
 
+        return self.filter_by_params(queryset)
+
+    def filter_by_params(self, queryset):
         field_id = self.request.query_params.get("field_id")
         date = self.request.query_params.get("date")
         upcoming = self.request.query_params.get("upcoming")
@@ -38,9 +72,11 @@ class AppointmentViewSet(ModelViewSet):
 
         if date:
             try:
-                filter_date = datetime.strptime(date, '%d-%m-%Y').date()
+                day_start, day_end = live.day_bounds(datetime.strptime(date, '%d-%m-%Y').date())
+                # A range on start_time itself, unlike __date, lets the planner prune partitions.
                 queryset = queryset.filter(
-                    start_time__date=filter_date
+                    start_time__gte=day_start,
+                    start_time__lt=day_end
                 )
             except ValueError:
                 pass
@@ -49,150 +85,253 @@ class AppointmentViewSet(ModelViewSet):
 
         return queryset
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
     @action(methods=['get'], detail=False, url_path="my-appointments")
     def my_appointments(self, request):
         upcoming = request.query_params.get("upcoming")
-        appointments = Appointment.objects.filter(user=request.user)
+        appointments = Appointment.objects.select_related("field", "user").filter(user_id=request.user.id)
 
         if upcoming and upcoming.lower() == 'true':
             appointments = appointments.filter(start_time__gte=timezone.now())
 
-        appointments.order_by('created_at')
-        serializer = self.get_serializer(appointments, many=True)
-
-        return Response(serializer.data)
+        page = self.paginate_queryset(appointments)
+        serializer = self.get_serializer(page, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        # "format" is taken by DRF's renderer negotiation.
+        output = request.query_params.get("output", "csv")
+        if output not in export.FORMATS:
+            raise ValidationError({"output": [f"Must be one of: {', '.join(export.FORMATS)}."]})
+
+        queryset = Appointment.objects.all()
+        if not is_admin(request):
+            queryset = queryset.filter(field__owner_id=request.user.id)
+        queryset = self.filter_by_params(queryset)
+        # The rows are read while the response streams, after the view has returned, so the alias chosen for
+        # this request is fixed now.
+        queryset = queryset.using(queryset.db)
+
+        response = StreamingHttpResponse(
+            export.WRITERS[output](export.rows(queryset)), content_type=export.FORMATS[output]
+        )
+        response["Content-Disposition"] = f'attachment; filename="appointments.{output}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='bulk', serializer_class=BulkBookingSerializer)
+    @idempotent
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = serializer.save(user=request.user)
+
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_409_CONFLICT)
 
     @action(detail=False, methods=['post'], url_path='check-availability')
     def check_availability(self, request):
         serializer = FieldAvailabilitySerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
 
-        field_id = serializer.validated_data['field_id']
-        date = serializer.validated_data['date']
-        start_time = serializer.validated_data.get('start_time')
-        end_time = serializer.validated_data.get('end_time')
+        field = availability.get_field(params['field_id'], availability.field_not_found())
+        if params.get('start_time') and params.get('end_time'):
+            window = availability.requested_window(params['date'], params['start_time'], params['end_time'])
+            conflicts = availability.conflicting(field, *window).count()
+            conflicts += len(availability.held(field, *window, request.user))
+            return Response(availability.conflicts_result(conflicts))
 
-        try:
-            field = FootballField.objects.get(id=field_id)
-        except FootballField.DoesNotExist:
-            return Response({'error': 'Field not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        if start_time and end_time:
-            start_datetime = timezone.make_aware(
-                datetime.combine(date, start_time)
-            )
-            end_datetime = timezone.make_aware(
-                datetime.combine(date, end_time)
-            )
-
-            conflicts = Appointment.objects.filter(
-                field=field,
-                start_time__lt=end_datetime,
-                end_time__gt=start_datetime
-            )
-
-            return Response({
-                'available': not conflicts.exists(),
-                'conflicts': conflicts.count()
-            })
-
-        day_start = timezone.make_aware(datetime.combine(date, time.min))
-        day_end = timezone.make_aware(datetime.combine(date, time.max))
-
-        appointments = Appointment.objects.filter(
-            field=field,
-            start_time__gte=day_start,
-            start_time__lte=day_end
-        ).order_by('start_time')
-
-        busy_slots = []
-        for appointment in appointments:
-            busy_slots.append({
-                'start_time': appointment.start_time,
-                'end_time': appointment.end_time,
-                'user': appointment.user.get_full_name() if appointment.user.get_full_name() else appointment.user.email
-            })
-
-        return Response({
-            'field_name': field.name,
-            'date': date,
-            'busy_slots': busy_slots
-        })
+        appointments = availability.day_appointments(field, params['date'])
+        held = availability.held(field, *availability.day_window(params['date']), request.user)
+        return Response(availability.busy_day(field, params['date'], appointments, held))
 
     @action(detail=False, methods=['get'], url_path='available-slots')
     def available_slots(self, request):
-        field_id = request.query_params.get('field_id')
-        date_str = request.query_params.get('date')
-        duration = request.query_params.get('duration', '1')
-
-        if not field_id or not date_str:
-            return Response(
-                {'error': 'field_id and date are required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        query = availability.parse_slots_query(request.query_params)
+        field = availability.get_field(query['field_id'], availability.invalid_slots_query())
+        grid = availability.slot_grid(field, query)
+        busy = [*availability.busy_intervals(field, grid),
+                *availability.held(field, grid.start, grid.end, request.user)]
+        return Response(availability.available_slots(field, query, grid, busy))
+
+    @action(detail=False, methods=['get'], url_path='calendar')
+    def calendar(self, request):
+        serializer = CalendarQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            field = FootballField.objects.get(id=field_id)
-            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            duration_hours = float(duration)
-        except (FootballField.DoesNotExist, ValueError):
-            return Response(
-                {'error': 'Invalid field_id, date format, or duration'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        day_start = timezone.make_aware(datetime.combine(date, time(6, 0)))
-        day_end = timezone.make_aware(datetime.combine(date, time(22, 0)))
-
-        appointments = Appointment.objects.filter(
-            field=field,
-            start_time__date=date
-        ).order_by('start_time')
-
-        available_slots = []
-        current_time = day_start
-
-        for appointment in appointments:
-            if current_time + timedelta(hours=duration_hours) <= appointment.start_time:
-                slot_end = min(appointment.start_time, day_end)
-                if current_time + timedelta(hours=duration_hours) <= slot_end:
-                    available_slots.append({
-                        'start_time': current_time,
-                        'end_time': appointment.start_time,
-                        'duration_hours': (appointment.start_time - current_time).total_seconds() / 3600
-                    })
-
-            current_time = max(current_time, appointment.end_time)
-
-        if current_time + timedelta(hours=duration_hours) <= day_end:
-            available_slots.append({
-                'start_time': current_time,
-                'end_time': day_end,
-                'duration_hours': (day_end - current_time).total_seconds() / 3600
+        field_ids = serializer.validated_data['field_ids']
+        start_date = serializer.validated_data['start_date']
+        end_date = serializer.validated_data['end_date']
+
+        fields = FootballField.objects.filter(id__in=field_ids).values('id', 'name', 'opening_time', 'closing_time')
+        grids = {
+            field['id']: (field, SlotGrid(start_date, end_date, field['opening_time'], field['closing_time']))
+            for field in fields
+        }
+        missing = [field_id for field_id in field_ids if field_id not in grids]
+        if missing:
+            return Response({'error': 'Field not found', 'field_ids': missing}, status=status.HTTP_404_NOT_FOUND)
+
+        range_start = min(grid.start for _, grid in grids.values())
+        range_end = max(grid.end for _, grid in grids.values())
+        busy = {field_id: [] for field_id in grids}
+        appointments = Appointment.objects.filter(field_id__in=field_ids).overlapping(range_start, range_end)
+        for field_id, start, end in appointments.values_list('field_id', 'start_time', 'end_time'):
+            busy[field_id].append((start, end))
+        for field_id, held in holds.held_intervals(list(grids), range_start, range_end, request.user.id).items():
+            busy[field_id].extend(held)
+
+        calendar = []
+        for field_id in field_ids:
+            field, grid = grids[field_id]
+            calendar.append({
+                'field_id': field_id,
+                'field_name': field['name'],
+                'days': [
+                    {
+                        'date': window[0].date(),
+                        'busy': busy_windows,
+                        'free': free_windows,
+                    }
+                    for window, busy_windows, free_windows in grid.days(busy[field_id])
+                ]
             })
 
-        suitable_slots = []
-        for slot in available_slots:
-            slot_duration = slot['duration_hours']
-            if slot_duration >= duration_hours:
-                slot_start = slot['start_time']
-                slot_end = slot['end_time']
-
-                while slot_start + timedelta(hours=duration_hours) <= slot_end:
-                    suitable_slots.append({
-                        'start_time': slot_start,
-                        'end_time': slot_start + timedelta(hours=duration_hours),
-                        'duration_hours': duration_hours
-                    })
-                    slot_start += timedelta(minutes=60)
-
         return Response({
-            'field_name': field.name,
-            'date': date,
-            'requested_duration': duration_hours,
-            'available_slots': suitable_slots[:20]
+            'start_date': start_date,
+            'end_date': end_date,
+            'fields': calendar
         })
+
+
+class SlotHoldViewSet(ViewSet):
+    # A hold keeps a slot out of everyone else's availability and bookings for SLOT_HOLD_SECONDS while its
+    # user checks out, then lapses by itself unless it is confirmed or released first.
+    throttle_scopes = {"create": "booking", "confirm": "booking"}
+
+    def get_hold(self, pk):
+        hold = holds.get(pk)
+        if hold is None or hold.user_id != self.request.user.id:
+            raise NotFound("Hold not found or expired.")
+        return hold
+
+    def create(self, request):
+        serializer = SlotHoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        field, start_time, end_time = (serializer.validated_data[key] for key in ('field', 'start_time', 'end_time'))
+
+        if availability.conflicting(field, start_time, end_time).exists():
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [CONFLICT_MESSAGE]})
+        placed, hold = holds.place(field.id, request.user.id, start_time, end_time)
+        if not placed:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [HELD_MESSAGE]})
+        return Response(SlotHoldSerializer(hold).data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        return Response(SlotHoldSerializer(self.get_hold(pk)).data)
+
+    def destroy(self, request, pk=None):
+        holds.release(self.get_hold(pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def confirm(self, request, pk=None):
+        hold = self.get_hold(pk)
+        serializer = AppointmentSerializer(data={
+            'user': request.user.id, 'field': hold.field_id, 'start_time': hold.start_time, 'end_time': hold.end_time,
+        }, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        # The exclusion constraint still has the final say; the hold is only dropped once the booking exists.
+        serializer.save(user=request.user)
+        holds.release(hold)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+def async_endpoint(view):
+    # DRF views are synchronous. These run on the event loop under ASGI, awaiting the async ORM, and render
+    # errors the way DRF's exception handler does.
+    @csrf_exempt
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        headers = {}
+        try:
+            request.user = await aauthenticate(request)
+            if not request.user.is_authenticated:
+                raise NotAuthenticated()
+            # Every async view only reads.
+            with replica_reads(await achoose_replica(request.user)):
+                result = await view(request, *args, **kwargs)
+            if isinstance(result, HttpResponseBase):
+                return result
+            data, status_code = result, status.HTTP_200_OK
+        except APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            status_code = exc.status_code
+            if getattr(exc, 'wait', None):
+                headers['Retry-After'] = '%d' % exc.wait
+        return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json',
+                            headers=headers)
+
+    return wrapper
+
+
+@require_POST
+@async_endpoint
+async def check_availability_async(request):
+    await throttling.acheck("availability", request)
+    try:
+        data = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+    except ValueError:
+        raise ParseError()
+    serializer = FieldAvailabilitySerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+
+    field = await availability.aget_field(params['field_id'], availability.field_not_found())
+    if params.get('start_time') and params.get('end_time'):
+        window = availability.requested_window(params['date'], params['start_time'], params['end_time'])
+        conflicts = await availability.conflicting(field, *window).acount()
+        conflicts += len(await sync_to_async(availability.held)(field, *window, request.user))
+        return availability.conflicts_result(conflicts)
+
+    appointments = [appointment async for appointment in availability.day_appointments(field, params['date'])]
+    held = await sync_to_async(availability.held)(field, *availability.day_window(params['date']), request.user)
+    return availability.busy_day(field, params['date'], appointments, held)
+
+
+@require_GET
+@async_endpoint
+async def available_slots_async(request):
+    await throttling.acheck("availability", request)
+    query = availability.parse_slots_query(request.GET)
+    field = await availability.aget_field(query['field_id'], availability.invalid_slots_query())
+    grid = availability.slot_grid(field, query)
+    busy = [interval async for interval in availability.busy_intervals(field, grid)]
+    busy += await sync_to_async(availability.held)(field, grid.start, grid.end, request.user)
+    return availability.available_slots(field, query, grid, busy)
+
+
+@require_GET
+@async_endpoint
+async def slot_stream(request):
+    query = SlotStreamQuerySerializer(data=request.GET)
+    query.is_valid(raise_exception=True)
+    field = await availability.aget_field(query.validated_data['field_id'], availability.field_not_found())
+
+    # Server-sent events: a snapshot of the day's bookings, then deltas as they commit. Needs ASGI; a WSGI
+    # worker would be held for the whole connection.
+    response = StreamingHttpResponse(live.stream(field.id, query.validated_data['date']),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,128 @@
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from appointments.serializers import CONFLICT_MESSAGE
+from benchmarks.seed import EMAIL_DOMAIN, FIRST_NAMES, LAST_NAMES, PASSWORD
+
+PAGE_SIZE = 10
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # "METHOD route-name" -> [(seconds, query count or None, ok)]
+        self.samples = defaultdict(list)
+        self.journeys = 0
+        self.failed_journeys = 0
+
+    def add(self, endpoint, seconds, queries, ok):
+        with self.lock:
+            self.samples[endpoint].append((seconds, queries, ok))
+
+    def finish(self, ok):
+        with self.lock:
+            self.journeys += 1
+            self.failed_journeys += not ok
+
+
+class Session:
+    # One virtual user: an in-process client that goes through the full middleware stack, plus the bearer
+    # token it signed in with. Query counts come from the X-Query-Count header.
+    def __init__(self, recorder):
+        self.client = Client(raise_request_exception=False)
+        self.recorder = recorder
+        self.headers = {}
+        self.ok = True
+
+    def request(self, method, route, args=None, data=None, expected=(200,), conflict_ok=False):
+        kwargs = {"headers": self.headers}
+        if method != "get":
+            kwargs["content_type"] = "application/json"
+        began = time.perf_counter()
+        response = getattr(self.client, method)(reverse(route, args=args), data, **kwargs)
+        elapsed = time.perf_counter() - began
+
+        ok = response.status_code in expected or conflict_ok and is_conflict(response)
+        queries = response.get("X-Query-Count")
+        self.recorder.add(f"{method.upper()} {route}", elapsed, None if queries is None else int(queries), ok)
+        self.ok = self.ok and ok
+        return response if ok else None
+
+
+def is_conflict(response):
+    return response.status_code == 400 and CONFLICT_MESSAGE in response.json().get("non_field_errors", [])
+
+
+def journey(session, rng, field_ids, days_ahead):
+    # Sign up, sign in, browse, check a day, book one of its free slots and look at the booking.
+    session.headers, session.ok = {}, True
+    email = f"journey-{uuid.uuid4().hex}@{EMAIL_DOMAIN}"
+    response = session.request("post", "accounts:register", data={
+        "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES), "email": email,
+        "password": PASSWORD, "re_password": PASSWORD,
+    }, expected=(201,))
+    if response is None:
+        return False
+    user_id = response.json()["user"]["id"]
+    response = session.request("post", "accounts:login", data={"email": email, "password": PASSWORD})
+    if response is None:
+        return False
+    session.headers = {"authorization": f"Bearer {response.json()['access']}"}
+
+    pages = -(-len(field_ids) // PAGE_SIZE)
+    session.request("get", "football:footballs-list", data={"page": rng.randint(1, pages), "page_size": PAGE_SIZE})
+    field_id = rng.choice(field_ids)
+    session.request("get", "football:footballs-detail", args=[field_id])
+
+    day = (timezone.localdate() + timedelta(days=rng.randint(1, days_ahead))).isoformat()
+    session.request("post", "appointments:appointment-check-availability", data={"field_id": field_id, "date": day})
+    response = session.request("get", "appointments:appointment-available-slots",
+                               data={"field_id": field_id, "date": day, "duration": "1"})
+    if response is not None and response.json()["available_slots"]:
+        slot = rng.choice(response.json()["available_slots"])
+        # Another virtual user can take the slot first.
+        session.request("post", "appointments:appointment-list", data={
+            "user": user_id, "field": field_id, "start_time": slot["start_time"], "end_time": slot["end_time"],
+        }, expected=(201,), conflict_ok=True)
+    session.request("get", "appointments:appointment-my-appointments")
+    return session.ok
+
+
+def run(journeys, concurrency, field_ids, days_ahead, random_seed=0):
+    recorder = Recorder()
+    remaining = iter(range(journeys))
+    lock = threading.Lock()
+
+    def worker(index):
+        session, rng = Session(recorder), random.Random(random_seed * 1000 + index)
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            recorder.finish(journey(session, rng, field_ids, days_ahead))
+
+    def threaded(index):
+        try:
+            worker(index)
+        finally:
+            connection.close()
+
+    began = time.perf_counter()
+    if concurrency == 1:
+        worker(0)
+    else:
+        threads = [threading.Thread(target=threaded, args=[index]) for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return recorder, time.perf_counter() - began
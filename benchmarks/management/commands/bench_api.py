@@ -0,0 +1,129 @@
+import json
+import logging
+import subprocess
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from appointments.models import Appointment
+from benchmarks import journeys, micro, report
+from benchmarks.seed import EMAIL_DOMAIN, seed
+from football.models import FootballField, PricingRule
+
+DATABASE_PREFIX = "bench_"
+CACHE_PREFIX = "bench"
+
+
+def current_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = (
+        "Create a separate benchmark database, seed it with users, fields, pricing rules and bookings, and "
+        "drive scripted user journeys through the full middleware stack. Reports throughput, latency "
+        "percentiles and queries per request for every endpoint, plus serializer and slot microbenchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--journeys", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--warmup", type=int, default=10, help="Journeys run before measuring.")
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--fields", type=int, default=50)
+        parser.add_argument("--days-back", type=int, default=60, help="Days of booking history.")
+        parser.add_argument("--days-ahead", type=int, default=14, help="Days ahead that can be booked.")
+        parser.add_argument("--bookings-per-day", type=int, default=6)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--fast-passwords", action="store_true",
+                            help="Hash passwords with MD5 so that register and login stop dominating the run.")
+        parser.add_argument("--keepdb", action="store_true",
+                            help="Keep the seeded benchmark database and reuse it on the next run.")
+        parser.add_argument("--micro-number", type=int, default=200, help="Calls per microbenchmark round.")
+        parser.add_argument("--skip-micro", action="store_true")
+        parser.add_argument("--output", help="Write the results as JSON to this path.")
+        parser.add_argument("--compare", help="Results JSON from an earlier run to compare against.")
+
+    def handle(self, *args, **options):
+        # Same settings as the test database, under its own name, so unit test runs are not clobbered.
+        old_name = connection.settings_dict["NAME"]
+        connection.settings_dict["TEST"]["NAME"] = DATABASE_PREFIX + old_name
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"], serialize=False)
+        try:
+            results = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+
+        for line in report.table(results):
+            self.stdout.write(line)
+        if options["compare"]:
+            with open(options["compare"]) as baseline:
+                for line in report.compare(results, json.load(baseline)):
+                    self.stdout.write(line)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+    def benchmark(self, options):
+        if User.objects.filter(email__endswith=EMAIL_DOMAIN).exists():
+            self.stdout.write("Reusing the seeded benchmark database.")
+        else:
+            self.stdout.write("Seeding the benchmark database...")
+            seed(users=options["users"], fields=options["fields"], days_back=options["days_back"],
+                 days_ahead=options["days_ahead"], bookings_per_day=options["bookings_per_day"],
+                 random_seed=options["seed"])
+        dataset = {"users": User.objects.count(), "fields": FootballField.objects.count(),
+                   "pricing_rules": PricingRule.objects.count(), "appointments": Appointment.objects.count()}
+        field_ids = list(FootballField.objects.order_by("id").values_list("id", flat=True))
+
+        with ExitStack() as stack:
+            if options["fast_passwords"]:
+                stack.enter_context(override_settings(
+                    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+                ))
+            # Cached pages and pricing tables are kept apart from the development cache and start cold. Every
+            # virtual user comes from the test client's one address, which the rate limits would soon refuse.
+            stack.enter_context(override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], QUERY_COUNT_HEADERS=True,
+                CACHES={alias: {**config, "KEY_PREFIX": CACHE_PREFIX} for alias, config in settings.CACHES.items()},
+                THROTTLE_ENABLED=False,
+            ))
+            # Booking conflicts are expected; one warning line per 4xx would bury the report.
+            request_logger = logging.getLogger("django.request")
+            stack.callback(request_logger.setLevel, request_logger.level)
+            request_logger.setLevel(logging.ERROR)
+            if hasattr(cache, "delete_pattern"):
+                cache.delete_pattern("*")
+            else:
+                cache.clear()
+
+            if options["warmup"]:
+                journeys.run(options["warmup"], options["concurrency"], field_ids, options["days_ahead"],
+                             random_seed=options["seed"] + 1)
+            self.stdout.write(f"Running {options['journeys']} journeys with {options['concurrency']} virtual users...")
+            recorder, elapsed = journeys.run(options["journeys"], options["concurrency"], field_ids,
+                                             options["days_ahead"], random_seed=options["seed"])
+
+        results = {
+            "commit": current_commit(),
+            "created_at": timezone.now().isoformat(),
+            "options": {key: options[key] for key in ("journeys", "concurrency", "warmup", "seed", "fast_passwords",
+                                                      "micro_number")},
+            "dataset": dataset,
+            **report.summarize(recorder, elapsed),
+        }
+        if not options["skip_micro"]:
+            results["micro"] = micro.run(number=options["micro_number"])
+        return results
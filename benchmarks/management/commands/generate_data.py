@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import Address, User
+from appointments import heatmap, rollups
+from appointments.models import Appointment
+from benchmarks.synthetic import LOADERS, Plan, generate
+from football.models import FootballField
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a deterministic synthetic dataset of users, addresses, fields and non-overlapping appointments "
+        "into the configured database with COPY (or chunked bulk_create), then rebuild the booking aggregates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--fields", type=int, default=1_000)
+        parser.add_argument("--days-back", type=int, default=90, help="Days of booking history per field.")
+        parser.add_argument("--days-ahead", type=int, default=30, help="Days of upcoming bookings per field.")
+        parser.add_argument("--occupancy", type=float, default=0.5,
+                            help="Booked share of opening hours on past days; upcoming days get half.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--method", choices=sorted(LOADERS), default="copy")
+        parser.add_argument("--skip-aggregates", action="store_true",
+                            help="Leave the rollups and heatmaps for a later rebuild.")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["fields"] < 1:
+            raise CommandError("At least one user and one field are needed.")
+        if not 0 < options["occupancy"] <= 1:
+            raise CommandError("--occupancy must be in (0, 1].")
+
+        plan = Plan(
+            users=options["users"], fields=options["fields"], days_back=options["days_back"],
+            days_ahead=options["days_ahead"], occupancy=options["occupancy"], seed=options["seed"],
+            today=timezone.localdate(),
+        )
+        began = time.perf_counter()
+        timings = generate(plan, method=options["method"], report=self.report)
+        loaded = sum(rows for rows, _ in timings.values())
+        elapsed = time.perf_counter() - began
+        self.stdout.write(f"{loaded} rows in {elapsed:.1f}s, {loaded / elapsed:,.0f} rows/s overall")
+
+        if not options["skip_aggregates"]:
+            began = time.perf_counter()
+            rollups.rebuild()
+            heatmap.reconcile(weeks=plan.days_back // 7 + 1)
+            self.stdout.write(f"Aggregates rebuilt in {time.perf_counter() - began:.1f}s")
+
+        with connection.cursor() as cursor:
+            for model in (User, Address, FootballField, Appointment):
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        self.stdout.write(self.style.SUCCESS("Synthetic data loaded."))
+
+    def report(self, table, rows, seconds):
+        self.stdout.write(f"{table:<16} {rows:>12,} rows in {seconds:7.2f}s, {rows / max(seconds, 1e-9):>12,.0f} rows/s")
@@ -0,0 +1,68 @@
+import timeit
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from accounts.models import Address, User
+from appointments.models import Appointment
+from appointments.serializers import AppointmentSerializer
+from appointments.slots import SlotGrid
+from football import pricing
+from football.models import FootballField, PricingRule
+from football.serializers import FootballFieldSerializer
+
+ROUNDS = 5
+# A Monday, so the weekday and weekend pricing rules both apply within the week.
+WEEK_START = date(2026, 1, 5)
+
+
+def at(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+def fixtures():
+    # Unsaved instances with their relations filled in, so nothing here touches the database.
+    owner = User(id=1, email="owner@example.com", first_name="Aziz", last_name="Karimov")
+    fields = [
+        FootballField(id=index, name=f"Arena {index}", owner=owner, price=Decimal("120.00"), area=Decimal(5400),
+                      address=Address(id=index, address_line_1="1 Stadium Street", city="Tashkent",
+                                      country="Uzbekistan"))
+        for index in range(1, 11)
+    ]
+    days = [WEEK_START + timedelta(days=offset) for offset in range(7)]
+    appointments = [
+        Appointment(id=index, user=owner, field=fields[0], start_time=at(day, hour), end_time=at(day, hour + 1, 30),
+                    total_cost=Decimal("180.000"))
+        for index, (day, hour) in enumerate(((day, hour) for day in days for hour in range(7, 22, 3)), 1)
+    ]
+    rules = [
+        PricingRule(id=1, weekdays=[0, 1, 2, 3, 4], start_time=time(18), end_time=time(22),
+                    hourly_price=Decimal("156.00"), min_duration=timedelta(hours=1), priority=1),
+        PricingRule(id=2, weekdays=[5, 6], start_time=time(0), end_time=time(0), hourly_price=Decimal("144.00")),
+    ]
+    return fields, appointments, rules
+
+
+def cases():
+    fields, appointments, rules = fixtures()
+    busy = [(appointment.start_time, appointment.end_time) for appointment in appointments]
+    table = pricing.compile_rules(rules)
+    evening = at(WEEK_START, 17), at(WEEK_START, 19)
+    return {
+        "slots.free_week": lambda: SlotGrid(WEEK_START, WEEK_START + timedelta(days=6)).slots(busy, 60, 30),
+        "slots.free_day": lambda: SlotGrid(WEEK_START).slots(busy[:5], 90, 30),
+        "pricing.compile_rules": lambda: pricing.compile_rules(rules),
+        "pricing.price": lambda: pricing.price(table, fields[0].price, *evening),
+        "serializers.appointments_35": lambda: AppointmentSerializer(appointments, many=True).data,
+        "serializers.fields_10": lambda: FootballFieldSerializer(fields, many=True).data,
+    }
+
+
+def run(number=200):
+    # Best of ROUNDS, the usual timeit convention: slower rounds measure the machine, not the code.
+    results = {}
+    for name, case in cases().items():
+        best = min(timeit.repeat(case, number=number, repeat=ROUNDS))
+        results[name] = {"calls": number * ROUNDS, "per_call_us": round(best / number * 10 ** 6, 2)}
+    return results
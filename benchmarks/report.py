@@ -0,0 +1,89 @@
+import math
+import statistics
+
+PERCENTILES = (50, 95, 99)
+# Changes smaller than this are reported as noise when comparing runs.
+NOISE = 0.05
+
+
+def percentile(ordered, rank):
+    # Nearest-rank percentile of an already sorted list.
+    return ordered[max(0, math.ceil(len(ordered) * rank / 100) - 1)]
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2)
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = sorted(seconds for seconds, _, _ in samples)
+        queries = [count for _, count, _ in samples if count is not None]
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "failures": sum(not ok for _, _, ok in samples),
+            "throughput": round(len(samples) / elapsed, 2),
+            "mean_ms": milliseconds(statistics.fmean(latencies)),
+            **{f"p{rank}_ms": milliseconds(percentile(latencies, rank)) for rank in PERCENTILES},
+            "max_ms": milliseconds(latencies[-1]),
+            "queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+            "max_queries": max(queries, default=None),
+        }
+    requests = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "journeys": {
+            "count": recorder.journeys, "failures": recorder.failed_journeys, "seconds": round(elapsed, 3),
+            "per_second": round(recorder.journeys / elapsed, 2), "requests_per_second": round(requests / elapsed, 2),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def table(results):
+    lines = [f"{'endpoint':<52} {'reqs':>6} {'fail':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+             f"{'p99 ms':>8} {'queries':>8}"]
+    for endpoint, stats in results["endpoints"].items():
+        queries = stats["queries_per_request"]
+        lines.append(
+            f"{endpoint:<52} {stats['requests']:>6} {stats['failures']:>5} {stats['throughput']:>8.1f} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+            f"{'-' if queries is None else f'{queries:.2f}':>8}"
+        )
+    journeys = results["journeys"]
+    lines.append(f"{journeys['count']} journeys ({journeys['failures']} failed) in {journeys['seconds']:.2f}s: "
+                 f"{journeys['per_second']:.1f} journeys/s, {journeys['requests_per_second']:.1f} req/s")
+    for name, stats in results.get("micro", {}).items():
+        lines.append(f"{name:<52} {stats['per_call_us']:>10.2f} us/call")
+    return lines
+
+
+def change(current, baseline, lower_is_better=True):
+    if current is None or baseline is None:
+        return "n/a"
+    if not baseline:
+        return f"{baseline} -> {current}"
+    ratio = current / baseline - 1
+    if abs(ratio) < NOISE:
+        return f"{ratio:+.1%}"
+    better = ratio < 0 if lower_is_better else ratio > 0
+    return f"{ratio:+.1%} ({'better' if better else 'worse'})"
+
+
+def compare(results, baseline):
+    lines = [f"compared with {baseline.get('commit') or 'baseline'} from {baseline.get('created_at', '?')}"]
+    for endpoint, stats in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if before is None:
+            lines.append(f"{endpoint}: new")
+            continue
+        lines.append(
+            f"{endpoint}: p50 {change(stats['p50_ms'], before['p50_ms'])}, "
+            f"p99 {change(stats['p99_ms'], before['p99_ms'])}, "
+            f"req/s {change(stats['throughput'], before['throughput'], lower_is_better=False)}, "
+            f"queries {change(stats['queries_per_request'], before['queries_per_request'])}"
+        )
+    for name, stats in results.get("micro", {}).items():
+        before = baseline.get("micro", {}).get(name)
+        lines.append(f"{name}: {change(stats['per_call_us'], before['per_call_us']) if before else 'new'}")
+    return lines
@@ -0,0 +1,97 @@
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Address, User
+from appointments import aggregates, partitions
+from appointments.models import Appointment
+from appointments.slots import opening_window
+from football import pricing
+from football.models import FootballField, PricingRule
+
+PASSWORD = "bench-Password-123"
+EMAIL_DOMAIN = "bench.example.com"
+CITIES = [
+    ("Tashkent", "Uzbekistan"), ("Samarkand", "Uzbekistan"), ("Almaty", "Kazakhstan"), ("Istanbul", "Turkey"),
+    ("Madrid", "Spain"), ("Lisbon", "Portugal"), ("Berlin", "Germany"), ("Manchester", "United Kingdom"),
+]
+FIRST_NAMES = ["Aziz", "Bobur", "Dilnoza", "Jasur", "Kamila", "Laylo", "Murod", "Nodira", "Otabek", "Sardor"]
+LAST_NAMES = ["Karimov", "Rashidova", "Tursunov", "Yusupova", "Aliyev", "Saidova", "Ergashev", "Nazarova"]
+OPENING_TIMES = [time(6), time(7), time(8)]
+CLOSING_TIMES = [time(22), time(23), time(0)]
+DURATIONS = [timedelta(hours=1), timedelta(hours=1, minutes=30), timedelta(hours=2)]
+STEP = timedelta(minutes=30)
+
+
+def seed(users=500, fields=50, days_back=60, days_ahead=14, bookings_per_day=6, random_seed=42):
+    # Users share one password hash; hashing per user would dominate seeding time.
+    rng = random.Random(random_seed)
+    password = make_password(PASSWORD)
+    with transaction.atomic():
+        people = User.objects.bulk_create(
+            User(email=f"user{index}@{EMAIL_DOMAIN}", first_name=rng.choice(FIRST_NAMES),
+                 last_name=rng.choice(LAST_NAMES), password=password)
+            for index in range(users)
+        )
+        owners, players = people[:max(1, fields // 5)], people[max(1, fields // 5):] or people
+        places = Address.objects.bulk_create(
+            Address(address_line_1=f"{rng.randint(1, 200)} Stadium Street", city=city, country=country)
+            for city, country in (rng.choice(CITIES) for _ in range(fields))
+        )
+        pitches = FootballField.objects.bulk_create(
+            FootballField(
+                name=f"{place.city} Arena {index}", owner=rng.choice(owners), address=place,
+                price=Decimal(rng.randrange(60, 250, 5)), area=Decimal(rng.choice([4000, 5400, 7140])),
+                viewers_capacity=rng.choice([0, 50, 200, 1000]), opening_time=rng.choice(OPENING_TIMES),
+                closing_time=rng.choice(CLOSING_TIMES),
+            )
+            for index, place in enumerate(places)
+        )
+        rules = PricingRule.objects.bulk_create(rule for pitch in pitches[::2] for rule in peak_rules(pitch))
+
+    tables = {pitch.id: pricing.compile_rules([rule for rule in rules if rule.field_id == pitch.id])
+              for pitch in pitches}
+    today = timezone.localdate()
+    partitions.ensure(since=today - timedelta(days=days_back))
+    bookings = 0
+    for pitch in pitches:
+        appointments = []
+        for offset in range(-days_back, days_ahead + 1):
+            # Upcoming days are still filling up.
+            count = rng.randint(0, bookings_per_day if offset < 0 else max(1, bookings_per_day // 2))
+            for start_time, end_time in day_bookings(rng, pitch, today + timedelta(days=offset), count):
+                cost = pricing.price(tables[pitch.id], pitch.price, start_time, end_time).total_cost
+                appointments.append(Appointment(user=rng.choice(players), field=pitch, start_time=start_time,
+                                                end_time=end_time, total_cost=cost))
+        with transaction.atomic():
+            aggregates.bookings_created(Appointment.objects.bulk_create(appointments))
+        bookings += len(appointments)
+
+    return {"users": len(people), "fields": len(pitches), "pricing_rules": len(rules), "appointments": bookings}
+
+
+def peak_rules(pitch):
+    return [
+        PricingRule(field=pitch, name="Weekday evenings", weekdays=[0, 1, 2, 3, 4], start_time=time(18),
+                    end_time=time(22), hourly_price=pitch.price * Decimal("1.3"), min_duration=timedelta(hours=1),
+                    priority=1),
+        PricingRule(field=pitch, name="Weekends", weekdays=[5, 6], start_time=time(0), end_time=time(0),
+                    hourly_price=pitch.price * Decimal("1.2"), priority=0),
+    ]
+
+
+def day_bookings(rng, pitch, day, count):
+    opens, closes = opening_window(day, pitch.opening_time, pitch.closing_time)
+    steps = int((closes - opens) / STEP)
+    taken = []
+    for _ in range(count):
+        duration = rng.choice(DURATIONS)
+        start_time = opens + rng.randrange(steps) * STEP
+        end_time = start_time + duration
+        if end_time <= closes and all(end_time <= start or start_time >= end for start, end in taken):
+            taken.append((start_time, end_time))
+    return sorted(taken)
@@ -0,0 +1,224 @@
+import csv
+import io
+import json
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, time as day_time, timedelta
+from decimal import Decimal
+from itertools import chain, islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import Address, User
+from appointments import partitions
+from appointments.models import Appointment
+from appointments.slots import opening_window
+from benchmarks.seed import CITIES, CLOSING_TIMES, FIRST_NAMES, LAST_NAMES, OPENING_TIMES, PASSWORD
+from football.models import FootballField
+
+EMAIL_DOMAIN = "synthetic.example.com"
+STEP = timedelta(minutes=30)
+DURATION_STEPS = (2, 3, 4)
+ROWS_PER_READ = 5000
+COST_QUANTUM = Decimal("0.001")
+
+
+@dataclass
+class Plan:
+    users: int
+    fields: int
+    days_back: int
+    days_ahead: int
+    # Share of each field's opening hours that gets booked on a past day; upcoming days get half.
+    occupancy: float
+    seed: int
+    today: date
+
+
+# Row generators. Each yields dicts keyed by model attname, drawn from one seeded Random per table, so the
+# same plan always produces the same rows apart from the reserved ids and the emails and names built on them.
+
+def user_rows(plan, first_id, password):
+    rng = random.Random(f"{plan.seed}:users")
+    joined = timezone.make_aware(datetime.combine(plan.today, day_time.min))
+    for offset in range(plan.users):
+        yield {
+            "id": first_id + offset, "password": password, "last_login": None, "is_superuser": False,
+            "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES), "is_staff": False,
+            "is_active": True, "date_joined": joined - timedelta(minutes=rng.randrange(3 * 365 * 24 * 60)),
+            "email": f"user{first_id + offset}@{EMAIL_DOMAIN}",
+        }
+
+
+def address_rows(plan, first_id):
+    rng = random.Random(f"{plan.seed}:addresses")
+    for offset in range(plan.fields):
+        city, country = rng.choice(CITIES)
+        yield {
+            "id": first_id + offset, "address_line_1": f"{rng.randint(1, 500)} Stadium Street",
+            "address_line_2": None, "city": city, "state_or_province": city, "country": country,
+        }
+
+
+def field_rows(plan, first_id, first_address_id, owner_ids):
+    rng = random.Random(f"{plan.seed}:fields")
+    for offset in range(plan.fields):
+        yield {
+            "id": first_id + offset, "name": f"Arena {first_id + offset}", "owner_id": rng.choice(owner_ids),
+            "address_id": first_address_id + offset, "contact": None,
+            "price": Decimal(rng.randrange(60, 250, 5)), "area": Decimal(rng.choice([4000, 5400, 7140])),
+            "viewers_capacity": rng.choice([0, 50, 200, 1000]), "image": None, "image_variants": {},
+            "opening_time": rng.choice(OPENING_TIMES), "closing_time": rng.choice(CLOSING_TIMES),
+        }
+
+
+def max_gap(occupancy):
+    # Gaps are drawn uniformly from 0..max_gap steps, so the mean gap over the mean booking length is
+    # (1 - occupancy) / occupancy.
+    mean_booking = sum(DURATION_STEPS) / len(DURATION_STEPS)
+    return round(2 * mean_booking * (1 - occupancy) / occupancy)
+
+
+def schedule(rng, opens, closes, gap):
+    # Bookings are laid out left to right, each one starting after the previous one ended, so a field's
+    # schedule never overlaps and never needs the exclusion constraint to reject anything.
+    current = opens
+    while True:
+        start_time = current + rng.randint(0, gap) * STEP
+        end_time = start_time + rng.choice(DURATION_STEPS) * STEP
+        if end_time > closes:
+            return
+        yield start_time, end_time
+        current = end_time
+
+
+def appointment_rows(plan, fields, user_ids):
+    # fields: (id, opening_time, closing_time, price) tuples. Nothing points at appointments, so their ids
+    # come from the sequence as they are loaded.
+    rng = random.Random(f"{plan.seed}:appointments")
+    now = timezone.now()
+    gaps = max_gap(plan.occupancy), max_gap(plan.occupancy / 2)
+    for field_id, opening_time, closing_time, price in fields:
+        for offset in range(-plan.days_back, plan.days_ahead + 1):
+            opens, closes = opening_window(plan.today + timedelta(days=offset), opening_time, closing_time)
+            for start_time, end_time in schedule(rng, opens, closes, gaps[offset >= 0]):
+                hours = Decimal((end_time - start_time) // STEP) / 2
+                yield {
+                    "user_id": rng.choice(user_ids), "field_id": field_id,
+                    "start_time": start_time, "end_time": end_time,
+                    "created_at": min(start_time - timedelta(minutes=rng.randrange(14 * 24 * 60)), now),
+                    "total_cost": (price * hours).quantize(COST_QUANTUM),
+                }
+
+
+# Loading.
+
+def reserve_ids(model, count):
+    # Moves the table's id sequence past `count` ids in one statement, so concurrent inserts cannot take them.
+    if not count:
+        return None
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), nextval(pg_get_serial_sequence(%s, 'id')) + %s - 1)",
+            [table, table, count],
+        )
+        return cursor.fetchone()[0] - count + 1
+
+
+def copy_value(value):
+    if isinstance(value, dict):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class CsvStream:
+    # The file-like object psycopg2's copy_expert reads; rows are encoded on demand, so a table of any size
+    # streams through in constant memory.
+    def __init__(self, rows, attnames):
+        self.rows = rows
+        self.attnames = attnames
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator="\n")
+        self.count = 0
+
+    def read(self, size=-1):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        for row in islice(self.rows, ROWS_PER_READ):
+            self.writer.writerow([copy_value(row[name]) for name in self.attnames])
+            self.count += 1
+        return self.buffer.getvalue()
+
+
+def copy_rows(model, fields, rows):
+    # None becomes an unquoted empty field, which CSV COPY reads as NULL; generators never emit "".
+    stream = CsvStream(rows, [field.attname for field in fields])
+    sql = "COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)".format(
+        table=connection.ops.quote_name(model._meta.db_table),
+        columns=", ".join(connection.ops.quote_name(field.column) for field in fields),
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, stream)
+    return stream.count
+
+
+def bulk_create_rows(model, fields, rows, batch_size=ROWS_PER_READ):
+    count = 0
+    while batch := [model(**row) for row in islice(rows, batch_size)]:
+        model.objects.bulk_create(batch)
+        count += len(batch)
+    return count
+
+
+LOADERS = {"copy": copy_rows, "bulk": bulk_create_rows}
+
+
+def load(model, rows, method):
+    # Only the columns the generator fills in are loaded; the one it leaves out, appointment ids, comes
+    # from the identity sequence.
+    first = next(rows, None)
+    if first is None:
+        return 0, 0.0
+    fields = [field for field in model._meta.concrete_fields if field.attname in first]
+    began = time.perf_counter()
+    with transaction.atomic():
+        count = LOADERS[method](model, fields, chain([first], rows))
+    return count, time.perf_counter() - began
+
+
+def generate(plan, method="copy", report=None):
+    # Loads users, addresses, fields and appointments in that order and returns {table: (rows, seconds)}.
+    # Appointments are written without signals; the caller rebuilds the aggregates afterwards.
+    report = report or (lambda table, rows, seconds: None)
+    timings = {}
+
+    def step(model, rows):
+        timings[model._meta.db_table] = load(model, rows, method)
+        report(model._meta.db_table, *timings[model._meta.db_table])
+
+    # One hash for every user; hashing per row would take longer than the whole load.
+    first_user = reserve_ids(User, plan.users)
+    step(User, user_rows(plan, first_user, make_password(PASSWORD)))
+    user_ids = range(first_user, first_user + plan.users)
+
+    first_address, first_field = reserve_ids(Address, plan.fields), reserve_ids(FootballField, plan.fields)
+    # Roughly one owner per five fields, taken from the front of the new users.
+    owners = user_ids[:max(1, plan.fields // 5)]
+    fields = list(field_rows(plan, first_field, first_address, owners))
+    step(Address, address_rows(plan, first_address))
+    step(FootballField, iter(fields))
+
+    schedules = [(row["id"], row["opening_time"], row["closing_time"], row["price"]) for row in fields]
+    # Every month gets its partition up front, rather than history piling into the default partition.
+    partitions.ensure(since=plan.today - timedelta(days=plan.days_back),
+                      ahead=max(partitions.PARTITIONS_AHEAD, plan.days_ahead // 28 + 1))
+    step(Appointment, appointment_rows(plan, schedules, user_ids))
+    return timings
@@ -0,0 +1,110 @@
+from datetime import date
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+
+from accounts.models import User
+from appointments.models import Appointment, FieldDayRollup
+from benchmarks import journeys, micro, report, synthetic
+from benchmarks.seed import seed
+from football.models import FootballField
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, QUERY_COUNT_HEADERS=True,
+                   PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class BenchmarkSuiteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dataset = seed(users=20, fields=4, days_back=3, days_ahead=3, bookings_per_day=4, random_seed=1)
+
+    def test_seed_keeps_aggregates_in_step_with_bookings(self):
+        self.assertEqual(self.dataset["users"], User.objects.count())
+        self.assertEqual(self.dataset["fields"], FootballField.objects.count())
+        self.assertEqual(self.dataset["appointments"], Appointment.objects.count())
+        self.assertGreater(self.dataset["appointments"], 0)
+        self.assertEqual(FieldDayRollup.objects.aggregate(total=Sum("bookings"))["total"], Appointment.objects.count())
+
+    def test_journeys_cover_every_endpoint_with_query_counts(self):
+        field_ids = list(FootballField.objects.values_list("id", flat=True))
+        recorder, elapsed = journeys.run(3, 1, field_ids, days_ahead=3)
+        results = report.summarize(recorder, elapsed)
+
+        self.assertEqual(results["journeys"]["count"], 3)
+        self.assertEqual(results["journeys"]["failures"], 0)
+        self.assertEqual(len(results["endpoints"]), 8)
+        for stats in results["endpoints"].values():
+            self.assertEqual(stats["requests"], 3)
+            self.assertIsNotNone(stats["queries_per_request"])
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+        self.assertEqual(Appointment.objects.filter(user__email__startswith="journey-").count(), 3)
+
+
+class BenchmarkReportTests(TestCase):
+    def test_percentile_uses_nearest_rank(self):
+        ordered = list(range(1, 101))
+        self.assertEqual(report.percentile(ordered, 50), 50)
+        self.assertEqual(report.percentile(ordered, 99), 99)
+        self.assertEqual(report.percentile([7], 95), 7)
+
+    def test_compare_marks_regressions_and_ignores_noise(self):
+        stats = {"p50_ms": 10.0, "p99_ms": 30.0, "throughput": 100.0, "queries_per_request": 3.0}
+        baseline = {"endpoints": {"GET route": {**stats, "p50_ms": 10.2, "queries_per_request": 2.0}},
+                    "micro": {"case": {"per_call_us": 50.0}}}
+        results = {"endpoints": {"GET route": stats, "GET other": stats}, "micro": {"case": {"per_call_us": 40.0}}}
+
+        lines = report.compare(results, baseline)
+
+        self.assertIn("p50 -2.0%,", lines[1])
+        self.assertIn("queries +50.0% (worse)", lines[1])
+        self.assertEqual(lines[2], "GET other: new")
+        self.assertEqual(lines[3], "case: -20.0% (better)")
+
+    def test_microbenchmarks_run_without_the_database(self):
+        with self.assertNumQueries(0):
+            results = micro.run(number=1)
+        self.assertEqual(set(results), set(micro.cases()))
+        self.assertTrue(all(stats["per_call_us"] > 0 for stats in results.values()))
+
+
+class SyntheticDataTests(TestCase):
+    def plan(self, **overrides):
+        return synthetic.Plan(**{"users": 30, "fields": 3, "days_back": 2, "days_ahead": 2, "occupancy": 0.6,
+                                 "seed": 7, "today": date(2026, 3, 2), **overrides})
+
+    def test_copy_and_bulk_create_load_the_same_rows(self):
+        copied = synthetic.generate(self.plan(), method="copy")
+        first = list(Appointment.objects.order_by("id").values_list("start_time", "end_time", "total_cost"))
+        Appointment.objects.all().delete()
+        created = synthetic.generate(self.plan(), method="bulk")
+        second = list(Appointment.objects.order_by("id").values_list("start_time", "end_time", "total_cost"))
+
+        self.assertEqual(copied["Appointments"][0], created["Appointments"][0])
+        self.assertGreater(len(first), 0)
+        self.assertEqual(first, second)
+        self.assertEqual(User.objects.filter(email__endswith=synthetic.EMAIL_DOMAIN).count(), 60)
+
+    def test_schedules_stay_inside_opening_hours(self):
+        synthetic.generate(self.plan(occupancy=1))
+        for field in FootballField.objects.prefetch_related("appointments"):
+            bookings = sorted(field.appointments.all(), key=lambda appointment: appointment.start_time)
+            for appointment in bookings:
+                self.assertGreaterEqual(appointment.start_time.time(), field.opening_time)
+            for before, after in zip(bookings, bookings[1:]):
+                self.assertLessEqual(before.end_time, after.start_time)
+
+    def test_reserved_ids_are_not_reused(self):
+        first = synthetic.reserve_ids(User, 5)
+        self.assertEqual(synthetic.reserve_ids(User, 5), first + 5)
+        self.assertGreater(User.objects.create_user(email="next@example.com", password="pass").id, first + 9)
+
+    def test_command_rebuilds_aggregates(self):
+        output = StringIO()
+        call_command("generate_data", users=10, fields=2, days_back=3, days_ahead=1, stdout=output)
+
+        self.assertIn("rows/s overall", output.getvalue())
+        self.assertEqual(FieldDayRollup.objects.aggregate(total=Sum("bookings"))["total"], Appointment.objects.count())
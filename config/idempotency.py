@@ -0,0 +1,107 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import QueryDict
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+KEY_PREFIX = "idempotency"
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.05
+RETRY_AFTER_SECONDS = 1
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still in progress."
+    default_code = "idempotency_in_progress"
+    # DRF's exception handler sends this as the Retry-After header.
+    wait = RETRY_AFTER_SECONDS
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request body."
+    default_code = "idempotency_key_reused"
+
+
+def cache_key(request, key):
+    owner = request.user.pk if request.user and request.user.is_authenticated else "anonymous"
+    digest = hashlib.sha256(f"{owner}:{request.method}:{request.path}:{key}".encode()).hexdigest()
+    return f"{KEY_PREFIX}:{digest}"
+
+
+class FingerprintEncoder(DjangoJSONEncoder):
+    # Uploaded files are told apart by name, size and content type; they are not read.
+    def default(self, o):
+        if isinstance(o, UploadedFile):
+            return [o.name, o.size, o.content_type]
+        return super().default(o)
+
+
+def fingerprint(request):
+    # A canonical form of the body: key order does not matter at any depth, and repeated form fields keep
+    # every value.
+    data = request.data
+    if isinstance(data, QueryDict):
+        data = dict(data.lists())
+    return hashlib.sha256(json.dumps(data, sort_keys=True, cls=FingerprintEncoder).encode()).hexdigest()
+
+
+def wait_for(key):
+    # A duplicate that arrives while the first request runs gets its response if it is stored within one
+    # poll interval. Otherwise the caller answers 409 with Retry-After rather than hold a worker while the
+    # first request finishes.
+    time.sleep(POLL_SECONDS)
+    return cache.get(key)
+
+
+def replay(stored, body):
+    if stored["fingerprint"] != body:
+        raise IdempotencyKeyReused()
+    return Response(stored["data"], status=stored["status"], headers={"Idempotent-Replayed": "true"})
+
+
+def idempotent(handler):
+    # For DRF handlers that create something. With an Idempotency-Key header, the first response for the key
+    # is kept for IDEMPOTENCY_TTL and replayed for repeats of the same request, errors included. Server
+    # errors are not kept, so the client can retry them.
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        idempotency_key = request.headers.get(HEADER)
+        if idempotency_key is None:
+            return handler(view, request, *args, **kwargs)
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: [f"Must be 1 to {MAX_KEY_LENGTH} characters."]})
+
+        key, body = cache_key(request, idempotency_key), fingerprint(request)
+        stored = cache.get(key)
+        if stored is not None:
+            return replay(stored, body)
+        if not cache.add(f"{key}:lock", True, timeout=settings.IDEMPOTENCY_LOCK_SECONDS):
+            stored = wait_for(key)
+            if stored is None:
+                raise IdempotencyConflict()
+            return replay(stored, body)
+
+        try:
+            try:
+                response = handler(view, request, *args, **kwargs)
+            except APIException as exc:
+                response = view.handle_exception(exc)
+            if response.status_code < 500:
+                cache.set(key, {"fingerprint": body, "status": response.status_code, "data": response.data},
+                          timeout=settings.IDEMPOTENCY_TTL)
+            return response
+        finally:
+            cache.delete(f"{key}:lock")
+
+    return wrapper
@@ -0,0 +1,86 @@
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context['connection'].alias, sql, time.perf_counter() - start))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    @property
+    def duplicates(self):
+        # The same statement text run more than once per request is the usual N+1 signature.
+        statements = Counter(sql for _, sql, _ in self.queries)
+        return {sql: count for sql, count in statements.items() if count > 1}
+
+    def count_by_alias(self):
+        return dict(Counter(alias for alias, _, _ in self.queries))
+
+
+class QueryCountMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Read per request rather than once, so tests can switch it with override_settings.
+        if not settings.QUERY_COUNT_HEADERS:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.add_headers(response, recorder)
+
+    async def __acall__(self, request):
+        if not settings.QUERY_COUNT_HEADERS:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            # Async ORM calls run on the request's thread-sensitive executor thread, whose connections are
+            # not the event loop's, so the wrappers are installed there.
+            await sync_to_async(stack.enter_context)(recorder.record())
+            response = await self.get_response(request)
+        return self.add_headers(response, recorder)
+
+    def add_headers(self, response, recorder):
+        response['X-Query-Count'] = recorder.count
+        response['X-Query-Time-Ms'] = f"{recorder.time * 1000:.2f}"
+        response['X-Query-Duplicates'] = sum(count - 1 for count in recorder.duplicates.values())
+        response['X-Query-Count-By-Alias'] = ", ".join(
+            f"{alias}={count}" for alias, count in sorted(recorder.count_by_alias().items())
+        )
+        return response
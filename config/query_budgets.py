@@ -0,0 +1,88 @@
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from config.middleware import QueryRecorder
+
+# Maximum SQL queries per request, keyed by URL name and HTTP method. The budget test suite
+# replays every entry at several data sizes, so a count that grows with the result size fails
+# even while it is still under budget.
+QUERY_BUDGETS = {
+    'schema-json': {'GET': 4},
+    'schema-swagger-ui': {'GET': 0},
+
+    'accounts:login': {'POST': 3},
+    'accounts:refresh_token': {'POST': 15},
+    'accounts:register': {'POST': 9},
+    'accounts:logout': {'DELETE': 8},
+    'accounts:user_profile': {'GET': 0},
+    'accounts:delete_account': {'DELETE': 10},
+
+    'football:api-root': {'GET': 1},
+    'football:footballs-list': {'GET': 1, 'POST': 3},
+    'football:footballs-detail': {'GET': 1, 'PUT': 5, 'PATCH': 2, 'DELETE': 7},
+    'football:footballs-cache-stats': {'GET': 1},
+    'football:footballs-analytics': {'GET': 3},
+    'football:footballs-heatmap': {'GET': 3},
+    'football:footballs-pricing-rules': {'GET': 3, 'PUT': 7},
+    'football:footballs-quotes': {'POST': 2},
+    'football:footballs-free': {'GET': 1},
+
+    'appointments:api-root': {'GET': 2},
+    'appointments:appointment-list': {'GET': 2, 'POST': 8},
+    'appointments:appointment-detail': {'GET': 2, 'PUT': 10, 'PATCH': 8, 'DELETE': 5},
+    'appointments:appointment-bulk': {'POST': 8},
+    'appointments:appointment-my-appointments': {'GET': 1},
+    'appointments:appointment-check-availability': {'POST': 2},
+    'appointments:appointment-available-slots': {'GET': 2},
+    'appointments:appointment-calendar': {'GET': 2},
+    'appointments:appointment-export': {'GET': 2},
+    'appointments:async-check-availability': {'POST': 3},
+    'appointments:async-available-slots': {'GET': 3},
+    'appointments:hold-list': {'POST': 2},
+    'appointments:hold-detail': {'GET': 0, 'DELETE': 0},
+    'appointments:hold-confirm': {'POST': 8},
+}
+
+EXEMPT_NAMESPACES = {'admin'}
+# Long-lived event streams never finish a request; their connect-time queries are covered by their own tests.
+EXEMPT_ROUTES = {'appointments:slot-stream'}
+
+
+def route_names(patterns=None, namespace=None):
+    names = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in EXEMPT_NAMESPACES:
+                continue
+            nested = ':'.join(filter(None, [namespace, pattern.namespace])) or None
+            names |= route_names(pattern.url_patterns, nested)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f"{namespace}:{pattern.name}" if namespace else pattern.name)
+    return names - EXEMPT_ROUTES
+
+
+class QueryBudgetMixin:
+    query_budgets = QUERY_BUDGETS
+
+    def record_queries(self, make_request):
+        with QueryRecorder().record() as recorder:
+            make_request()
+        return recorder
+
+    def assertQueryBudget(self, route, method, prepare, grow, sizes=(1, 5)):
+        # prepare() sets up whatever the request needs and returns the request itself, so only
+        # the request's own queries are counted.
+        budget = self.query_budgets[route][method]
+        counts = []
+        for size in sizes:
+            grow(size)
+            recorder = self.record_queries(prepare())
+            counts.append(recorder.count)
+            self.assertLessEqual(
+                recorder.count, budget,
+                f"{method} {route} ran {recorder.count} queries (budget {budget}):\n"
+                + "\n".join(sql for _, sql, _ in recorder.queries)
+            )
+        self.assertEqual(
+            len(set(counts)), 1,
+            f"{method} {route} query count grows with data size {list(zip(sizes, counts))}"
+        )
@@ -0,0 +1,78 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+# The replica chosen for the current request's reads, or None for the primary. A context variable rather
+# than a thread local, so sync_to_async carries it into the async views' ORM calls.
+replica = ContextVar("replica", default=None)
+
+PIN_KEY = "db:primary:{user_id}"
+
+
+class PrimaryReplicaRouter:
+    # Reads go to a replica only inside replica_reads(); everything else, writes included, uses the primary.
+    def db_for_read(self, model, **hints):
+        return replica.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would write an instance back to the replica it was read from.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def pin_to_primary(user):
+    # The user's reads stay on the primary until the replicas have had time to catch up with their write.
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        cache.set(PIN_KEY.format(user_id=user.id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def choose_replica(user):
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if user.is_authenticated and cache.get(PIN_KEY.format(user_id=user.id)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+async def achoose_replica(user):
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if user.is_authenticated and await cache.aget(PIN_KEY.format(user_id=user.id)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def replica_reads(alias):
+    token = replica.set(alias)
+    try:
+        yield
+    finally:
+        replica.reset(token)
+
+
+class ReplicaReadsMixin:
+    # Viewset actions listed in replica_actions only read, so they may be served by a replica. The rest run
+    # against the primary, and a successful write pins its user there for REPLICA_STICKY_SECONDS.
+    replica_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions:
+            self.replica_token = replica.set(choose_replica(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "replica_token", None)
+        if token is not None:
+            replica.reset(token)
+            self.replica_token = None
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
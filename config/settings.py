@@ -9,9 +9,11 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import sys
 from datetime import timedelta
 from pathlib import Path
-from decouple import config
+from celery.schedules import crontab
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +28,7 @@ SECRET_KEY = config("SECRET_KEY")
 DEBUG = config("DEBUG")
 REDIS_HOST=config("REDIS_HOST", default="127.0.0.1")
 REDIS_PORT=config("REDIS_PORT", default=6379)
+TESTING = "test" in sys.argv
 ALLOWED_HOSTS = []
 
 # Application definition
@@ -37,16 +40,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # 3rd party
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
     'drf_yasg',
+    'django_celery_beat',
     # local
     'accounts',
     'appointments',
-    'football'
+    'football',
+    'benchmarks'
 ]
 
 MIDDLEWARE = [
@@ -57,8 +63,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.middleware.QueryCountMiddleware',
 ]
 
+# Expose per-request SQL count, time and duplicate statements as X-Query-* response headers.
+QUERY_COUNT_HEADERS = config("QUERY_COUNT_HEADERS", default=False, cast=bool)
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -93,6 +103,21 @@ DATABASES = {
     }
 }
 
+# Streaming replicas of the primary, as "host" or "host:port" entries, serve the read-only viewset actions.
+# Tests get a separate database under "replica", which only the routing tests read from.
+for index, replica in enumerate(config("DB_REPLICA_HOSTS", default="", cast=Csv()), 1):
+    replica_host, _, replica_port = replica.partition(":")
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"], "HOST": replica_host, "PORT": replica_port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+if TESTING:
+    DATABASES["replica"] = {**DATABASES["default"], "NAME": f"{DATABASES['default']['NAME']}_replica"}
+DATABASE_ROUTERS = ["config.routers.PrimaryReplicaRouter"]
+# How long a user's reads stay on the primary after they write; should exceed the usual replication lag.
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=5, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -136,15 +161,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.RoleJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'config.throttling.TokenBucketThrottle',
+    ],
 }
 
+# Token buckets per throttle scope: `burst` requests at once, refilled at `rate`, kept per user (anonymous
+# requests fall back to the client IP) or per IP. Views without a scope are not throttled.
+THROTTLE_ENABLED = config("THROTTLE_ENABLED", default=not TESTING, cast=bool)
+THROTTLE_POLICIES = {
+    "availability": {"rate": "5/s", "burst": 20, "per": "user"},
+    "booking": {"rate": "30/min", "burst": 10, "per": "user"},
+    "login": {"rate": "10/min", "burst": 5, "per": "ip"},
+}
+THROTTLE_BUCKETS_URL = config(
+    "THROTTLE_BUCKETS_URL", default="memory://" if TESTING else f"redis://{REDIS_HOST}:{REDIS_PORT}/2"
+)
+
+# Responses to POSTs carrying an Idempotency-Key are kept this long for replay; a duplicate that arrives
+# while the first is still running waits up to the lock timeout for its response.
+IDEMPOTENCY_TTL = 60 * 60 * 24
+IDEMPOTENCY_LOCK_SECONDS = 10
+
 AUTH_USER_MODEL = 'accounts.User'
 
+# Authorize safe requests from access token claims without loading the user row.
+JWT_STATELESS_AUTH = config("JWT_STATELESS_AUTH", default=False, cast=bool)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=60),
@@ -171,6 +219,8 @@ SIMPLE_JWT = {
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
 
     'JTI_CLAIM': 'jti',
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.RoleTokenRefreshSerializer',
 
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
@@ -185,4 +235,31 @@ CACHES = {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         }
     }
-}
\ No newline at end of file
+}
+
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/0")
+CELERY_RESULT_BACKEND = None
+CELERY_TASK_IGNORE_RESULT = True
+# Tests and broker-less development run tasks inline.
+CELERY_TASK_ALWAYS_EAGER = config("CELERY_TASK_ALWAYS_EAGER", default=TESTING, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True
+# Redis pub/sub for the live slot stream; memory:// keeps events inside one process.
+LIVE_SLOTS_BROKER_URL = config(
+    "LIVE_SLOTS_BROKER_URL", default="memory://" if TESTING else f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+)
+
+# Slot holds live in Redis sorted sets; memory:// keeps them inside one process.
+SLOT_HOLDS_URL = config("SLOT_HOLDS_URL", default="memory://" if TESTING else f"redis://{REDIS_HOST}:{REDIS_PORT}/3")
+SLOT_HOLD_SECONDS = config("SLOT_HOLD_SECONDS", default=5 * 60, cast=int)
+
+CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-heatmaps": {
+        "task": "appointments.tasks.reconcile_heatmaps",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "create-appointment-partitions": {
+        "task": "appointments.tasks.create_partitions",
+        "schedule": crontab(hour=3, minute=0),
+    },
+}
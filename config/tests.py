@@ -0,0 +1,561 @@
+import multiprocessing
+import time as clock
+import uuid
+from datetime import datetime, time, timedelta
+from itertools import count
+from types import SimpleNamespace
+from unittest import SkipTest, mock
+
+import redis
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Address, User
+from accounts.roles import get_admin_group_id
+from appointments import holds
+from appointments.models import Appointment
+from config import idempotency
+from config.middleware import QueryRecorder
+from config.query_budgets import QUERY_BUDGETS, QueryBudgetMixin, route_names
+from config.routers import PrimaryReplicaRouter, replica_reads
+from config.throttling import MemoryBuckets, RedisBuckets
+from football.models import FootballField
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        # Registration creates the Users group on first use; budgets describe the steady state.
+        Group.objects.create(name="Users")
+        get_admin_group_id()
+        self.sequence = count()
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        self.address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.fields = []
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def at(self, hour, minute=0, day=None):
+        return timezone.make_aware(datetime.combine(day or self.day, time(hour, minute)))
+
+    def grow(self, size):
+        # Every field gets one booking by the test user on the test day.
+        while len(self.fields) < size:
+            field = FootballField.objects.create(name=f"Arena {len(self.fields)}", owner=self.owner,
+                                                 address=self.address, price=100)
+            Appointment.objects.create(user=self.user, field=field, start_time=self.at(10), end_time=self.at(11))
+            self.fields.append(field)
+        cache.clear()
+        get_admin_group_id()
+
+    def new_field(self):
+        address = Address.objects.create(address_line_1="2 Main St", city="Tashkent", country="Uzbekistan")
+        return FootballField.objects.create(name="Spare", owner=self.user, address=address, price=100)
+
+    def new_appointment(self):
+        day = self.day + timedelta(days=1 + next(self.sequence))
+        return Appointment.objects.create(user=self.user, field=self.fields[0], start_time=self.at(10, day=day),
+                                          end_time=self.at(11, day=day))
+
+    def new_hold(self):
+        day = self.day + timedelta(days=100 + next(self.sequence))
+        # Clear of unique_slot(), which weekly bulk bookings repeat on later days.
+        return holds.place(self.fields[0].id, self.user.id, self.at(15, day=day), self.at(16, day=day))[1]
+
+    def unique_slot(self):
+        day = self.day + timedelta(days=100 + next(self.sequence))
+        return {"start_time": self.at(12, day=day).isoformat(), "end_time": self.at(13, day=day).isoformat()}
+
+    def call(self, method, url, status_code, data=None, client=None, **kwargs):
+        client = client or self.client
+
+        def make_request():
+            response = getattr(client, method)(url, data, **kwargs)
+            self.assertEqual(response.status_code, status_code, getattr(response, "data", response))
+            return response
+
+        return make_request
+
+    def streamed(self, make_request):
+        # A streaming response runs its queries as it is read, so read it while they are counted.
+        def read():
+            response = make_request()
+            b"".join(response.streaming_content)
+            return response
+
+        return read
+
+    def scenarios(self):
+        call = self.call
+        return {
+            ("schema-json", "GET"): lambda: call("get", "/swagger.json/", 200),
+            ("schema-swagger-ui", "GET"): lambda: call("get", "/swagger/", 200),
+
+            ("accounts:login", "POST"): lambda: call(
+                "post", "/accounts/login/", 200, {"email": "player@example.com", "password": "pass"},
+                client=APIClient()),
+            ("accounts:refresh_token", "POST"): lambda: call(
+                "post", "/accounts/login/refresh/", 200, {"refresh": str(RefreshToken.for_user(self.user))},
+                client=APIClient()),
+            ("accounts:register", "POST"): lambda: call("post", "/accounts/register/", 201, {
+                "first_name": "New", "last_name": "Player", "email": f"new{next(self.sequence)}@example.com",
+                "password": "secret-pass-123", "re_password": "secret-pass-123",
+            }, client=APIClient()),
+            ("accounts:logout", "DELETE"): lambda: call(
+                "delete", "/accounts/logout/", 200, {"refresh_token": str(RefreshToken.for_user(self.user))},
+                format="json"),
+            ("accounts:user_profile", "GET"): lambda: call("get", "/accounts/profile/", 200),
+            ("accounts:delete_account", "DELETE"): lambda: call(
+                "delete", "/accounts/delete-account/", 200, client=self.client_for(self.new_user())),
+
+            # The router's api-root shares the empty prefix with the list route, which wins.
+            ("football:api-root", "GET"): lambda: call("get", "/football/", 200),
+            ("football:footballs-list", "GET"): lambda: call("get", "/football/", 200),
+            ("football:footballs-list", "POST"): lambda: call("post", "/football/", 201, {
+                "name": "New Arena", "owner": self.user.id, "price": "80.00",
+                "address": {"address_line_1": "3 Main St", "city": "Tashkent", "country": "Uzbekistan"},
+            }, format="json"),
+            ("football:footballs-detail", "GET"): lambda: call("get", f"/football/{self.fields[0].id}/", 200),
+            ("football:footballs-detail", "PUT"): lambda: call("put", f"/football/{self.new_field().id}/", 200, {
+                "name": "Replaced", "owner": self.user.id, "price": "90.00",
+                "address": {"address_line_1": "4 Main St", "city": "Tashkent", "country": "Uzbekistan"},
+            }, format="json"),
+            ("football:footballs-detail", "PATCH"): lambda: call(
+                "patch", f"/football/{self.new_field().id}/", 200, {"name": "Patched"}, format="json"),
+            ("football:footballs-detail", "DELETE"): lambda: call("delete", f"/football/{self.new_field().id}/", 204),
+            ("football:footballs-cache-stats", "GET"): lambda: call("get", "/football/cache-stats/", 403),
+            ("football:footballs-analytics", "GET"): lambda: call("get", "/football/analytics/", 200, {
+                "period": "week", "start_date": self.day.isoformat(),
+                "end_date": (self.day + timedelta(days=30)).isoformat(),
+            }, client=self.client_for(self.owner)),
+            ("football:footballs-heatmap", "GET"): lambda: call(
+                "get", f"/football/{self.fields[0].id}/heatmap/", 200, {"weeks": 4}, client=self.client_for(self.owner)
+            ),
+            ("football:footballs-pricing-rules", "GET"): lambda: call(
+                "get", f"/football/{self.fields[0].id}/pricing-rules/", 200, client=self.client_for(self.owner)),
+            ("football:footballs-pricing-rules", "PUT"): lambda: call(
+                "put", f"/football/{self.new_field().id}/pricing-rules/", 200, [
+                    {"weekdays": [5, 6], "hourly_price": "150.00"},
+                    {"start_time": "18:00", "end_time": "23:00", "hourly_price": "130.00", "min_duration": "01:30:00"},
+                ], format="json"),
+            ("football:footballs-quotes", "POST"): lambda: call("post", "/football/quotes/", 200, {
+                "slots": [{"field": field.id, **self.unique_slot()} for field in self.fields],
+            }, format="json"),
+            ("football:footballs-free", "GET"): lambda: call("get", "/football/free/", 200, {
+                "start_time": self.at(18).isoformat(), "duration": 1, "city": "Tashkent",
+            }),
+
+            ("appointments:api-root", "GET"): lambda: call("get", "/appointments/", 200),
+            ("appointments:appointment-list", "GET"): lambda: call("get", "/appointments/", 200),
+            ("appointments:appointment-list", "POST"): lambda: call("post", "/appointments/", 201, {
+                "user": self.user.id, "field": self.fields[0].id, **self.unique_slot(),
+            }, format="json"),
+            ("appointments:appointment-detail", "GET"): lambda: call(
+                "get", f"/appointments/{self.new_appointment().id}/", 200),
+            ("appointments:appointment-detail", "PUT"): lambda: call(
+                "put", f"/appointments/{self.new_appointment().id}/", 200, {
+                    "user": self.user.id, "field": self.fields[0].id, **self.unique_slot(),
+                }, format="json"),
+            ("appointments:appointment-detail", "PATCH"): lambda: call(
+                "patch", f"/appointments/{self.new_appointment().id}/", 200, self.unique_slot(), format="json"),
+            ("appointments:appointment-detail", "DELETE"): lambda: call(
+                "delete", f"/appointments/{self.new_appointment().id}/", 204),
+            ("appointments:appointment-bulk", "POST"): lambda: call("post", "/appointments/bulk/", 201, {
+                "field": self.fields[0].id, "recurrence": "FREQ=WEEKLY;COUNT=4", **self.unique_slot(),
+            }, format="json"),
+            ("appointments:appointment-my-appointments", "GET"): lambda: call(
+                "get", "/appointments/my-appointments/", 200),
+            ("appointments:appointment-check-availability", "POST"): lambda: call(
+                "post", "/appointments/check-availability/", 200, {
+                    "field_id": self.fields[0].id, "date": self.day.isoformat(),
+                }, format="json"),
+            ("appointments:appointment-available-slots", "GET"): lambda: call(
+                "get", "/appointments/available-slots/", 200, {
+                    "field_id": self.fields[0].id, "date": self.day.isoformat(),
+                }),
+            ("appointments:async-check-availability", "POST"): lambda: call(
+                "post", "/appointments/async/check-availability/", 200, {
+                    "field_id": self.fields[0].id, "date": self.day.isoformat(),
+                }, content_type="application/json", HTTP_AUTHORIZATION=self.bearer()),
+            ("appointments:async-available-slots", "GET"): lambda: call(
+                "get", "/appointments/async/available-slots/", 200, {
+                    "field_id": self.fields[0].id, "date": self.day.isoformat(),
+                }, HTTP_AUTHORIZATION=self.bearer()),
+            ("appointments:appointment-calendar", "GET"): lambda: call("get", "/appointments/calendar/", 200, {
+                "field_ids": ",".join(str(field.id) for field in self.fields), "start_date": self.day.isoformat(),
+            }),
+            ("appointments:appointment-export", "GET"): lambda: self.streamed(call(
+                "get", "/appointments/export/", 200, {"output": "ndjson"}, client=self.client_for(self.owner))),
+            ("appointments:hold-list", "POST"): lambda: call("post", "/appointments/holds/", 201, {
+                "field": self.fields[0].id, **self.unique_slot(),
+            }, format="json"),
+            ("appointments:hold-detail", "GET"): lambda: call("get", f"/appointments/holds/{self.new_hold().id}/", 200),
+            ("appointments:hold-detail", "DELETE"): lambda: call(
+                "delete", f"/appointments/holds/{self.new_hold().id}/", 204),
+            ("appointments:hold-confirm", "POST"): lambda: call(
+                "post", f"/appointments/holds/{self.new_hold().id}/confirm/", 201),
+        }
+
+    def new_user(self):
+        return User.objects.create_user(email=f"leaving{next(self.sequence)}@example.com", password="pass",
+                                        first_name="Leaving")
+
+    def bearer(self):
+        return f"Bearer {RefreshToken.for_user(self.user).access_token}"
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_every_route_has_a_query_budget(self):
+        self.assertEqual(route_names() - QUERY_BUDGETS.keys(), set())
+
+    def test_every_budget_has_a_scenario(self):
+        budgeted = {(route, method) for route, methods in QUERY_BUDGETS.items() for method in methods}
+        self.assertEqual(budgeted, set(self.scenarios()))
+
+    def test_endpoints_stay_within_budget_regardless_of_result_size(self):
+        for (route, method), prepare in self.scenarios().items():
+            with self.subTest(route=route, method=method):
+                self.assertQueryBudget(route, method, prepare, self.grow)
+
+    @override_settings(QUERY_COUNT_HEADERS=True)
+    def test_query_count_headers(self):
+        self.grow(1)
+
+        response = self.client.get("/appointments/my-appointments/")
+
+        self.assertEqual(response["X-Query-Count"], "1")
+        self.assertEqual(response["X-Query-Duplicates"], "0")
+        self.assertIn("X-Query-Time-Ms", response)
+
+    def test_query_count_headers_are_off_by_default(self):
+        with mock.patch.object(QueryRecorder, "record") as record:
+            self.assertNotIn("X-Query-Count", self.client.get("/appointments/my-appointments/"))
+
+        # Nothing is recorded either.
+        record.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHE, DATABASE_REPLICAS=["replica"], QUERY_COUNT_HEADERS=True)
+class ReplicaRoutingTests(TestCase):
+    # "replica" is a second database that never receives writes, so it stands in for a lagging replica.
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.player = self.mirror(User.objects.create_user(email="player@example.com", password="pass"))
+        self.reader = self.mirror(User.objects.create_user(email="reader@example.com", password="pass"))
+        address = self.mirror(Address.objects.create(address_line_1="1 Main St", city="Tashkent",
+                                                     country="Uzbekistan"))
+        self.field = self.mirror(FootballField.objects.create(name="Arena", owner=self.player, address=address,
+                                                              price=100))
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.player)
+
+    def mirror(self, instance):
+        instance.save(using="replica", force_insert=True)
+        instance._state.db = "default"
+        return instance
+
+    def at(self, hour):
+        return timezone.make_aware(datetime.combine(self.day, time(hour)))
+
+    def book(self, start, end, status_code):
+        response = self.client.post("/appointments/", {
+            "user": self.player.id, "field": self.field.id, "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+        }, format="json")
+        self.assertEqual(response.status_code, status_code, response.data)
+        return response
+
+    def my_appointments(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get("/appointments/my-appointments/")
+
+    def test_read_actions_use_a_replica(self):
+        Appointment.objects.create(user=self.reader, field=self.field, start_time=self.at(10), end_time=self.at(11))
+
+        response = self.my_appointments(self.reader)
+
+        self.assertEqual(response.data["results"], [])
+        self.assertEqual(response["X-Query-Count-By-Alias"], "replica=1")
+
+    def test_writes_and_booking_validation_use_the_primary(self):
+        Appointment.objects.create(user=self.reader, field=self.field, start_time=self.at(10), end_time=self.at(11))
+
+        self.book(self.at(10), self.at(12), 400)
+        response = self.book(self.at(12), self.at(13), 201)
+
+        self.assertNotIn("replica", response["X-Query-Count-By-Alias"])
+        self.assertTrue(Appointment.objects.filter(id=response.data["id"]).exists())
+        self.assertFalse(Appointment.objects.using("replica").exists())
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.book(self.at(10), self.at(11), 201)
+
+        response = self.my_appointments(self.player)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response["X-Query-Count-By-Alias"], "default=1")
+        self.assertEqual(self.my_appointments(self.reader)["X-Query-Count-By-Alias"], "replica=1")
+
+        cache.clear()
+        self.assertEqual(self.my_appointments(self.player).data["results"], [])
+
+    def test_async_views_read_from_a_replica(self):
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.reader).access_token}"}
+        response = self.client.get("/appointments/async/available-slots/", {
+            "field_id": self.field.id, "date": self.day.isoformat(),
+        }, **auth)
+
+        self.assertEqual(response.status_code, 200)
+        # The field and its bookings.
+        self.assertIn("replica=2", response["X-Query-Count-By-Alias"])
+
+    def test_router_uses_the_primary_outside_read_actions(self):
+        router = PrimaryReplicaRouter()
+
+        self.assertEqual(router.db_for_read(Appointment), "default")
+        with replica_reads("replica"):
+            self.assertEqual(router.db_for_read(Appointment), "replica")
+            self.assertEqual(router.db_for_write(Appointment), "default")
+            self.assertEqual(FootballField.objects.get(id=self.field.id)._state.db, "replica")
+
+
+TEST_POLICIES = {
+    "availability": {"rate": "1/min", "burst": 3, "per": "user"},
+    "booking": {"rate": "1/min", "burst": 1, "per": "user"},
+    "login": {"rate": "1/min", "burst": 2, "per": "ip"},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, THROTTLE_ENABLED=True, THROTTLE_POLICIES=TEST_POLICIES)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.user, address=address, price=100)
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Every test starts with full buckets.
+        buckets = override_settings(THROTTLE_BUCKETS_URL=f"memory://{self.id()}")
+        buckets.enable()
+        self.addCleanup(buckets.disable)
+
+    def slots(self, client=None, path="/appointments/available-slots/", **extra):
+        return (client or self.client).get(path, {"field_id": self.field.id, "date": self.day.isoformat()}, **extra)
+
+    def test_login_is_limited_per_ip_with_retry_after(self):
+        credentials = {"email": "player@example.com", "password": "pass"}
+        statuses = [APIClient().post("/accounts/login/", credentials).status_code for _ in range(2)]
+        response = APIClient().post("/accounts/login/", credentials)
+        elsewhere = APIClient(REMOTE_ADDR="10.0.0.2").post("/accounts/login/", credentials)
+
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response["Retry-After"]) <= 60)
+        self.assertEqual(elsewhere.status_code, 200)
+
+    def test_availability_is_limited_per_user_across_sync_and_async_views(self):
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+        self.assertEqual(self.slots().status_code, 200)
+        self.assertEqual(self.slots(path="/appointments/async/available-slots/", **auth).status_code, 200)
+        self.assertEqual(self.client.post("/appointments/check-availability/", {
+            "field_id": self.field.id, "date": self.day.isoformat(),
+        }, format="json").status_code, 200)
+
+        response = self.slots(path="/appointments/async/available-slots/", **auth)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(self.slots().status_code, 429)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(email="other@example.com", password="pass"))
+        self.assertEqual(self.slots(other).status_code, 200)
+        # Endpoints without a throttle scope are never limited.
+        self.assertEqual(self.client.get("/appointments/my-appointments/").status_code, 200)
+
+    def test_booking_is_limited_per_user(self):
+        start = timezone.make_aware(datetime.combine(self.day, time(10)))
+        for offset, status_code in ((0, 201), (2, 429)):
+            response = self.client.post("/appointments/", {
+                "user": self.user.id, "field": self.field.id,
+                "start_time": (start + timedelta(hours=offset)).isoformat(),
+                "end_time": (start + timedelta(hours=offset + 1)).isoformat(),
+            }, format="json")
+            self.assertEqual(response.status_code, status_code)
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_disabled_throttling_takes_no_tokens(self):
+        for _ in range(5):
+            self.assertEqual(self.slots().status_code, 200)
+
+
+def drain(url, key, attempts, results):
+    buckets = RedisBuckets(url)
+    results.put(sum(buckets.take(key, 25, 1 / 3600)[0] for _ in range(attempts)))
+
+
+class RedisTokenBucketTests(SimpleTestCase):
+    url = f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/15"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            redis.Redis.from_url(cls.url, socket_connect_timeout=0.5).ping()
+        except redis.ConnectionError:
+            raise SkipTest(f"No Redis server at {cls.url}")
+
+    def setUp(self):
+        self.buckets = RedisBuckets(self.url)
+        self.key = f"throttle-test:{uuid.uuid4()}"
+        self.addCleanup(self.buckets.client.delete, self.key)
+
+    def test_limits_hold_across_worker_processes(self):
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [context.Process(target=drain, args=(self.url, self.key, 20, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sum(results.get() for _ in workers), 25)
+
+    def test_tokens_refill_at_the_configured_rate(self):
+        self.assertEqual(self.buckets.take(self.key, 1, 20), (True, 0))
+        allowed, wait = self.buckets.take(self.key, 1, 20)
+
+        self.assertFalse(allowed)
+        self.assertTrue(0 < wait <= 0.05)
+        clock.sleep(wait + 0.01)
+        self.assertTrue(self.buckets.take(self.key, 1, 20)[0])
+
+    def test_a_check_costs_microseconds(self):
+        for buckets in (self.buckets, MemoryBuckets()):
+            buckets.take(self.key, 10 ** 6, 1)
+            began = clock.perf_counter()
+            for _ in range(500):
+                buckets.take(self.key, 10 ** 6, 1)
+            per_call = (clock.perf_counter() - began) / 500
+            with self.subTest(buckets=type(buckets).__name__):
+                # One local round trip for Redis, well under a millisecond.
+                self.assertLess(per_call, 0.001)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Group.objects.create(name="Users")
+        self.user = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.user, address=address, price=100)
+        self.start = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=2), time(10)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def body(self, hours=1):
+        return {"user": self.user.id, "field": self.field.id, "start_time": self.start.isoformat(),
+                "end_time": (self.start + timedelta(hours=hours)).isoformat()}
+
+    def book(self, key, hours=1, client=None):
+        return (client or self.client).post("/appointments/", self.body(hours), format="json",
+                                            headers={"Idempotency-Key": key})
+
+    def test_retried_booking_replays_the_first_response(self):
+        first = self.book("booking-1")
+        with self.assertNumQueries(0):
+            retry = self.book("booking-1")
+
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertNotIn("Idempotent-Replayed", first)
+        self.assertEqual(Appointment.objects.count(), 1)
+        # A new key is a new request, which now conflicts.
+        self.assertEqual(self.book("booking-2").status_code, 400)
+
+    def test_retried_registration_skips_hashing_and_the_database(self):
+        body = {"email": "new@example.com", "password": "Str0ng-Passw0rd", "re_password": "Str0ng-Passw0rd",
+                "first_name": "New"}
+        first = APIClient().post("/accounts/register/", body, format="json", headers={"Idempotency-Key": "signup"})
+        with self.assertNumQueries(0):
+            retry = APIClient().post("/accounts/register/", body, format="json", headers={"Idempotency-Key": "signup"})
+
+        self.assertEqual(first.status_code, 201, first.data)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(User.objects.filter(email="new@example.com").count(), 1)
+
+    def test_errors_are_replayed_and_keys_are_per_user_and_body(self):
+        invalid = self.book("invalid", hours=-1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.book("invalid", hours=-1).data, invalid.data)
+        self.assertEqual(invalid.status_code, 400)
+
+        self.assertEqual(self.book("invalid", hours=2).status_code, 422)
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(email="other@example.com", password="pass"))
+        self.assertEqual(self.book("invalid", client=other).status_code, 201)
+        self.assertEqual(self.book("", hours=1).status_code, 400)
+
+    def test_fingerprints_are_canonical_for_any_body(self):
+        def fingerprint(data):
+            return idempotency.fingerprint(SimpleNamespace(data=data))
+
+        self.assertEqual(fingerprint({"a": {"x": 1, "y": [1, 2]}}), fingerprint({"a": {"y": [1, 2], "x": 1}}))
+        self.assertNotEqual(fingerprint([self.body()]), fingerprint(self.body()))
+        self.assertNotEqual(fingerprint(QueryDict("tag=a&tag=b")), fingerprint(QueryDict("tag=a&tag=c")))
+        self.assertNotEqual(fingerprint({"image": SimpleUploadedFile("a.png", b"a")}),
+                            fingerprint({"image": SimpleUploadedFile("a.png", b"ab")}))
+
+    def test_list_and_multipart_bodies_are_replayed(self):
+        listed = self.client.post("/appointments/", [self.body()], format="json", headers={"Idempotency-Key": "list"})
+        self.assertEqual(listed.status_code, 400)
+        retry = self.client.post("/appointments/", [self.body()], format="json", headers={"Idempotency-Key": "list"})
+        self.assertEqual((retry.data, retry["Idempotent-Replayed"]), (listed.data, "true"))
+
+        form = self.client.post("/appointments/", self.body(), format="multipart", headers={"Idempotency-Key": "form"})
+        self.assertEqual(form.status_code, 201, form.data)
+        with self.assertNumQueries(0):
+            retry = self.client.post("/appointments/", self.body(), format="multipart",
+                                     headers={"Idempotency-Key": "form"})
+        self.assertEqual((retry.data, retry["Idempotent-Replayed"]), (form.data, "true"))
+
+    def test_concurrent_duplicates_get_the_first_response_or_a_quick_conflict(self):
+        request = SimpleNamespace(user=self.user, method="POST", path="/appointments/")
+        key = idempotency.cache_key(request, "in-flight")
+        cache.add(f"{key}:lock", True)
+
+        started = clock.monotonic()
+        conflict = self.book("in-flight")
+        self.assertLess(clock.monotonic() - started, 1)
+        self.assertEqual((conflict.status_code, conflict["Retry-After"]), (409, "1"))
+
+        stored = {"fingerprint": idempotency.fingerprint(SimpleNamespace(data=self.body())), "status": 201,
+                  "data": {"id": 1}}
+        # The first request finishes while the duplicate polls.
+        with mock.patch("config.idempotency.time.sleep", side_effect=lambda seconds: cache.set(key, stored)):
+            with self.assertNumQueries(0):
+                response = self.book("in-flight")
+
+        self.assertEqual((response.status_code, response.data), (201, {"id": 1}))
+        self.assertEqual(Appointment.objects.count(), 0)
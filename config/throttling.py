@@ -0,0 +1,115 @@
+import math
+import threading
+import time
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+KEY_PREFIX = "throttle"
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Refills the bucket for the time since its last request, then takes one token if there is one. Redis' own
+# clock is used, so every worker process sees the same time. Returns {allowed, milliseconds to wait}.
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local per_ms = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + clock[2] / 1000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(bucket[1]) or capacity
+if bucket[2] then
+    tokens = math.min(capacity, tokens + (now - tonumber(bucket[2])) * per_ms)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / per_ms)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / per_ms) + 1000)
+return {wait == 0 and 1 or 0, wait}
+"""
+
+
+def parse_rate(rate):
+    # "30/min" -> tokens per second.
+    count, period = rate.split("/")
+    return int(count) / PERIODS[period[0]]
+
+
+class MemoryBuckets:
+    # In-process stand-in for the Redis buckets, for tests and single-process development.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def take(self, key, capacity, per_second):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * per_second)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return True, 0
+            self.buckets[key] = (tokens, now)
+        return False, (1 - tokens) / per_second
+
+
+class RedisBuckets:
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, capacity, per_second):
+        # One round trip; EVALSHA falls back to EVAL the first time a server sees the script.
+        allowed, wait_ms = self.script(keys=[key], args=[capacity, per_second / 1000])
+        return bool(allowed), wait_ms / 1000
+
+
+_buckets = {}
+
+
+def get_buckets():
+    url = settings.THROTTLE_BUCKETS_URL
+    if url not in _buckets:
+        _buckets[url] = MemoryBuckets() if url.startswith("memory://") else RedisBuckets(url)
+    return _buckets[url]
+
+
+def bucket_key(scope, policy, request, ident):
+    if policy.get("per", "user") == "user" and request.user and request.user.is_authenticated:
+        return f"{KEY_PREFIX}:{scope}:user:{request.user.pk}"
+    return f"{KEY_PREFIX}:{scope}:ip:{ident}"
+
+
+def take(scope, request, ident):
+    # (allowed, seconds until a token is available) under the scope's policy in THROTTLE_POLICIES.
+    policy = settings.THROTTLE_POLICIES.get(scope) if settings.THROTTLE_ENABLED else None
+    if policy is None:
+        return True, 0
+    key = bucket_key(scope, policy, request, ident)
+    return get_buckets().take(key, policy["burst"], parse_rate(policy["rate"]))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    # Plain views name their policy with throttle_scope, viewsets per action with throttle_scopes.
+    def allow_request(self, request, view):
+        scopes = getattr(view, "throttle_scopes", {})
+        scope = scopes.get(getattr(view, "action", None), getattr(view, "throttle_scope", None))
+        allowed, self.retry_after = take(scope, request, self.get_ident(request))
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+async def acheck(scope, request):
+    # For the plain async views, which DRF does not throttle. Raises Throttled like a DRF view would.
+    ident = BaseThrottle().get_ident(request)
+    allowed, wait = await sync_to_async(take)(scope, request, ident)
+    if not allowed:
+        raise Throttled(wait=math.ceil(wait))
@@ -0,0 +1,68 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from football.images import accepts_webp
+
+CACHE_PREFIX = "football_fields"
+CACHE_TIMEOUT = 60 * 5
+VERSION_KEY = f"{CACHE_PREFIX}:version"
+HITS_KEY = f"{CACHE_PREFIX}:hits"
+MISSES_KEY = f"{CACHE_PREFIX}:misses"
+
+
+def _increment(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # A fresh, time based version never collides with pages cached before the key was evicted.
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def build_key(request, action, pk=None):
+    params = sorted(request.query_params.lists())
+    # Pagination links and image URLs are absolute, and image URLs depend on whether the client accepts WebP.
+    raw_key = f"{request.scheme}://{request.get_host()}:{action}:{pk}:{params}:{accepts_webp(request)}"
+    digest = hashlib.md5(raw_key.encode()).hexdigest()
+    return f"{CACHE_PREFIX}:{get_version()}:{digest}"
+
+
+def get_page(key):
+    data = cache.get(key)
+    _increment(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+def set_page(key, data):
+    cache.set(key, data, timeout=CACHE_TIMEOUT)
+
+
+def get_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = stats.get(HITS_KEY, 0)
+    misses = stats.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0,
+        "version": cache.get(VERSION_KEY),
+    }
@@ -0,0 +1,46 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+VARIANT_DIR = 'fields_images/variants'
+# Longest edge in pixels; images are only ever scaled down.
+VARIANT_SIZES = {
+    'thumbnail': 160,
+    'card': 640,
+    'full': 1600,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+WEBP_MIME_TYPE = 'image/webp'
+
+
+def accepts_webp(request):
+    return request is not None and WEBP_MIME_TYPE in request.headers.get('Accept', '')
+
+
+def render_variants(image_file, storage):
+    stem = os.path.splitext(os.path.basename(image_file.name))[0]
+    with Image.open(image_file) as original:
+        # Phone photos carry their rotation in EXIF, which re-encoding drops.
+        original = ImageOps.exif_transpose(original).convert('RGB')
+        variants = {}
+        for name, size in VARIANT_SIZES.items():
+            resized = original.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            variants[name] = {}
+            for extension, (image_format, options) in FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, image_format, **options)
+                path = storage.save(f"{VARIANT_DIR}/{stem}_{name}.{extension}", ContentFile(buffer.getvalue()))
+                variants[name][extension] = path
+    return variants
+
+
+def delete_variants(variants, storage):
+    for name in VARIANT_SIZES:
+        for path in variants.get(name, {}).values():
+            storage.delete(path)
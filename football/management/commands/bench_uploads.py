@@ -0,0 +1,114 @@
+import io
+import threading
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.request import Request
+
+from football.uploadhandlers import ImageUploadHandler
+
+BOUNDARY = "benchboundary"
+
+
+class OversizedUpload(io.RawIOBase):
+    # A multipart body whose image part is a real JPEG header followed by padding, generated on demand
+    # so the client side of the benchmark holds no more than one read() worth of it.
+    def __init__(self, size):
+        super().__init__()
+        buffer = BytesIO()
+        Image.new("RGB", (64, 64), "green").save(buffer, "JPEG")
+        self.head = (
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="image"; filename="photo.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode() + buffer.getvalue()
+        self.tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+        self.length = size + len(self.head) + len(self.tail)
+        self.position = 0
+        self.read_bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        padding_end = self.length - len(self.tail)
+        if self.position < len(self.head):
+            piece = self.head[self.position:self.position + len(buffer)]
+        elif self.position < padding_end:
+            piece = bytes(min(len(buffer), padding_end - self.position))
+        else:
+            offset = self.position - padding_end
+            piece = self.tail[offset:offset + len(buffer)]
+        buffer[:len(piece)] = piece
+        self.position += len(piece)
+        self.read_bytes += len(piece)
+        return len(piece)
+
+
+def upload(size, streaming):
+    body = OversizedUpload(size)
+    request = WSGIRequest({
+        "REQUEST_METHOD": "PATCH",
+        "PATH_INFO": "/football/1/",
+        "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+        "CONTENT_LENGTH": str(body.length),
+        "wsgi.input": body,
+    })
+    if streaming:
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+
+    spooled = 0
+    try:
+        files = Request(request, parsers=[MultiPartParser()]).FILES
+        for uploaded in files.values():
+            spooled += uploaded.size
+            uploaded.close()
+    except ParseError:
+        pass
+    return body.read_bytes, spooled
+
+
+class Command(BaseCommand):
+    help = "Measure memory, disk and time spent on concurrent oversized image uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=20, help="Upload size in MB.")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+
+    def run(self, size, concurrency, streaming):
+        results = []
+
+        def worker():
+            results.append(upload(size, streaming))
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        read = sum(read for read, _ in results)
+        spooled = sum(spooled for _, spooled in results)
+        return peak, read, spooled, elapsed
+
+    def handle(self, *args, **options):
+        size = options["size"] * 1024 * 1024
+        mb = 1024 * 1024
+        for concurrency in options["concurrency"]:
+            for label, streaming in [("default", False), ("streaming", True)]:
+                peak, read, spooled, elapsed = self.run(size, concurrency, streaming)
+                self.stdout.write(
+                    f"{concurrency:>3} x {options['size']} MB {label:>9}: peak memory {peak / mb:8.2f} MB, "
+                    f"read {read / mb:8.1f} MB, spooled {spooled / mb:8.1f} MB, {elapsed * 1000:8.1f} ms"
+                )
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:58
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('football', '0007_delete_appointment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='footballfield',
+            name='closing_time',
+            field=models.TimeField(default=datetime.time(22, 0)),
+        ),
+        migrations.AddField(
+            model_name='footballfield',
+            name='opening_time',
+            field=models.TimeField(default=datetime.time(6, 0)),
+        ),
+    ]
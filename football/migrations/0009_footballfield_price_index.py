@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_address_city_index'),
+        ('football', '0008_footballfield_opening_hours'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='footballfield',
+            index=models.Index(fields=['price'], name='football_field_price_idx'),
+        ),
+    ]
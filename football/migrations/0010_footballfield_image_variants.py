@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('football', '0009_footballfield_price_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='footballfield',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
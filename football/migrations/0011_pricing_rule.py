@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:31
+
+import datetime
+import django.contrib.postgres.fields
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('football', '0010_footballfield_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('weekdays', django.contrib.postgres.fields.ArrayField(base_field=models.PositiveSmallIntegerField(validators=[django.core.validators.MaxValueValidator(6)]), blank=True, default=list, size=None)),
+                ('start_time', models.TimeField(default=datetime.time(0, 0))),
+                ('end_time', models.TimeField(default=datetime.time(0, 0))),
+                ('hourly_price', models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True)),
+                ('min_duration', models.DurationField(blank=True, null=True)),
+                ('priority', models.IntegerField(default=0)),
+                ('field', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pricing_rules', to='football.footballfield')),
+            ],
+            options={
+                'verbose_name': 'Pricing Rule',
+                'verbose_name_plural': 'Pricing Rules',
+                'db_table': 'Pricing Rules',
+                'ordering': ['priority', 'id'],
+            },
+        ),
+    ]
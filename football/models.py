@@ -1,8 +1,12 @@
 import os
 import time
 import uuid
-from django.core.validators import FileExtensionValidator
+from datetime import time as day_time
+from django.contrib.postgres.fields import ArrayField
+from django.core.validators import FileExtensionValidator, MaxValueValidator
 from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
 from accounts.models import User, Address
 from django.core.exceptions import ValidationError
 
@@ -13,10 +17,13 @@ def positive_number_of_viewers_capacity(value):
     return value
 
 
+MAX_IMAGE_SIZE = 4 * 1024 * 1024
+IMAGE_SIZE_MESSAGE = 'Image size can\'t exceed 4 MB.'
+
+
 def validate_image_size(image):
-    max_size = 4 * 1024 * 1024
-    if image.size > max_size:
-        raise ValidationError('Image size can\'t exceed 4 MB.')
+    if image.size > MAX_IMAGE_SIZE:
+        raise ValidationError(IMAGE_SIZE_MESSAGE)
 
 
 def unique_image_path(instance, filename):
@@ -25,6 +32,19 @@ def unique_image_path(instance, filename):
     return str(os.path.join('fields_images/', unique_filename))
 
 
+class FootballFieldQuerySet(models.QuerySet):
+    def open_during(self, start_time, end_time):
+        start_time, end_time = timezone.localtime(start_time), timezone.localtime(end_time)
+        # Fields whose closing time is at or before the opening time stay open past midnight.
+        overnight = Q(closing_time__lte=F("opening_time"))
+        if start_time.date() == end_time.date():
+            return self.filter(
+                Q(opening_time__lte=start_time.time()) & (Q(closing_time__gte=end_time.time()) | overnight)
+                | overnight & Q(closing_time__gte=end_time.time())
+            )
+        return self.filter(overnight, opening_time__lte=start_time.time(), closing_time__gte=end_time.time())
+
+
 class FootballField(models.Model):
     name = models.CharField(max_length=255)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='Football_fields')
@@ -39,12 +59,61 @@ class FootballField(models.Model):
         null=True,
         blank=True,
     )
+    # Resized WebP/JPEG copies of the image, written by football.tasks.generate_image_variants.
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    opening_time = models.TimeField(default=day_time(6, 0))
+    closing_time = models.TimeField(default=day_time(22, 0))
+
+    objects = FootballFieldQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        field = super().from_db(db, field_names, values)
+        # Kept to tell when a save hands the field to another owner.
+        field._loaded_owner_id = field.__dict__.get('owner_id')
+        return field
 
     class Meta:
         db_table = "Football Fields"
         verbose_name = "Football Field"
         verbose_name_plural = "Football Fields"
+        indexes = [
+            models.Index(fields=["price"], name="football_field_price_idx"),
+        ]
+
+    @property
+    def image_variants_stale(self):
+        return self.image_variants.get('source', '') != (self.image.name or '')
+
+    def image_variant(self, size, extension):
+        if self.image_variants_stale:
+            return None
+        return self.image_variants.get(size, {}).get(extension)
 
     def __str__(self):
         return f"{self.name} - {self.address.city} - {self.address.address_line_1} belonging to {self.owner.first_name} - {self.owner.email}"
 
+
+
+class PricingRule(models.Model):
+    field = models.ForeignKey(FootballField, on_delete=models.CASCADE, related_name='pricing_rules')
+    name = models.CharField(max_length=100, blank=True)
+    # Monday is 0. An empty list applies the rule on every day.
+    weekdays = ArrayField(models.PositiveSmallIntegerField(validators=[MaxValueValidator(6)]), default=list, blank=True)
+    # Local wall time. An end at or before the start runs past midnight; equal times cover the whole day.
+    start_time = models.TimeField(default=day_time(0, 0))
+    end_time = models.TimeField(default=day_time(0, 0))
+    # Empty keeps the field's own price, for rules that only set a minimum duration.
+    hourly_price = models.DecimalField(max_digits=9, decimal_places=2, null=True, blank=True)
+    min_duration = models.DurationField(null=True, blank=True)
+    # Where rules overlap the highest priority wins, then the newest rule.
+    priority = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "Pricing Rules"
+        verbose_name = "Pricing Rule"
+        verbose_name_plural = "Pricing Rules"
+        ordering = ["priority", "id"]
+
+    def __str__(self):
+        return f"{self.name or 'Rule'} for {self.field_id}: {self.start_time}-{self.end_time} at {self.hourly_price}"
@@ -1,7 +1,152 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import b64decode, b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, Cursor, CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+def after(ordering, position):
+    # Rows strictly after position in ordering, i.e. (a, b) > (x, y) spelled as
+    # a >= x AND (a > x OR (a = x AND b > y)); the leading bound lets an index on (a, b) range-scan.
+    condition = None
+    for field, value in reversed(list(zip(ordering, position))):
+        name = field.lstrip('-')
+        step = Q(**{f"{name}__{'lt' if field.startswith('-') else 'gt'}": value})
+        if condition is not None:
+            step |= Q(**{name: value}) & condition
+        condition = step
+    first = ordering[0]
+    return Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]}) & condition
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
 
 class FootballPageNumberPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
-    page_query_param = 'page'
\ No newline at end of file
+    page_query_param = 'page'
+
+
+# Keyset pagination over the whole ordering: the cursor carries every ordering value of the last row
+# (or, going back, the first), so ties on the leading column, such as many bookings at 18:00, cost
+# nothing, where DRF's CursorPagination keys on the first column only and skips ties with OFFSET.
+class FootballCursorPagination(CursorPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('id',)
+
+    def get_ordering(self, request, queryset, view):
+        # An explicit order_by on the view's queryset (e.g. a search ranked by price) wins over the default.
+        ordering = tuple(queryset.query.order_by) or super().get_ordering(request, queryset, view)
+        # The position has to identify one row.
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, position = (self.cursor.reverse, self.cursor.position) if self.cursor else (False, None)
+
+        ordering = reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(after(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        # A page past the end has no rows to take a position from.
+        self.has_previous = self.has_previous and bool(self.page)
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self.position_of(self.page[-1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.position_of(self.page[0])))
+
+    def position_of(self, instance):
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(instance, dict):
+            return [instance[name] for name in names]
+        return [getattr(instance, name) for name in names]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = json.loads(b64decode(encoded.encode('ascii'), validate=True))
+            position = tokens['p']
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            return Cursor(offset=0, reverse=bool(tokens.get('r')), position=position)
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        # str() rather than DjangoJSONEncoder, which would cut datetimes to milliseconds and so repeat rows.
+        tokens = {'p': cursor.position}
+        if cursor.reverse:
+            tokens['r'] = 1
+        encoded = b64encode(json.dumps(tokens, default=str).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class CursorOrPageNumberPagination(BasePagination):
+    cursor_pagination_class = FootballCursorPagination
+    page_number_pagination_class = FootballPageNumberPagination
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.paginator = self.cursor_pagination_class()
+
+    def uses_page_numbers(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'page'
+            or self.page_number_pagination_class.page_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.uses_page_numbers(request):
+            self.paginator = self.page_number_pagination_class()
+        page = self.paginator.paginate_queryset(queryset, request, view)
+        self.display_page_controls = self.paginator.display_page_controls
+        return page
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.paginator.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return self.paginator.get_schema_operation_parameters(view)
+
+    def to_html(self):
+        return self.paginator.to_html()
@@ -0,0 +1,118 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from football.models import PricingRule
+
+CACHE_PREFIX = "pricing"
+CACHE_TIMEOUT = 60 * 60 * 24
+DAY_SECONDS = 24 * 3600
+MICROSECONDS_PER_HOUR = 3600 * 10 ** 6
+COST_QUANTUM = Decimal("0.001")
+
+
+class Quote(NamedTuple):
+    total_cost: Decimal
+    # The longest minimum duration of any rule window the booking touches.
+    min_duration: timedelta
+
+    def too_short(self, start_time, end_time):
+        return end_time - start_time < self.min_duration
+
+
+def seconds_of_day(moment):
+    return moment.hour * 3600 + moment.minute * 60 + moment.second
+
+
+def rule_spans(rule):
+    start, end = seconds_of_day(rule.start_time), seconds_of_day(rule.end_time)
+    for weekday in rule.weekdays or range(7):
+        if start < end:
+            yield weekday, start, end
+        else:
+            yield weekday, start, DAY_SECONDS
+            if end:
+                yield (weekday + 1) % 7, 0, end
+
+
+def compile_rules(rules):
+    # rules must be ordered by (priority, id), so later spans win. Each weekday becomes a sorted tuple of
+    # segment starts plus a parallel tuple of (end, hourly_price, min_seconds); hourly_price None means the
+    # field's own price. The result is plain tuples, cheap to pickle into the cache and to bisect.
+    spans = defaultdict(list)
+    for rule in rules:
+        min_seconds = int(rule.min_duration.total_seconds()) if rule.min_duration else 0
+        for weekday, start, end in rule_spans(rule):
+            spans[weekday].append((start, end, rule.hourly_price, min_seconds))
+
+    table = []
+    for weekday in range(7):
+        day_spans = spans[weekday]
+        bounds = sorted({0, DAY_SECONDS, *(point for start, end, _, _ in day_spans for point in (start, end))})
+        starts, segments = [], []
+        for start, end in zip(bounds, bounds[1:]):
+            covering = [span for span in day_spans if span[0] <= start and end <= span[1]]
+            prices = [span[2] for span in covering if span[2] is not None]
+            segment = (prices[-1] if prices else None, max((span[3] for span in covering), default=0))
+            if segments and segments[-1][1:] == segment:
+                segments[-1] = (end, *segment)
+            else:
+                starts.append(start)
+                segments.append((end, *segment))
+        table.append((tuple(starts), tuple(segments)))
+    return tuple(table)
+
+
+def price(table, base_price, start_time, end_time):
+    # Walks the booking segment by segment in local time. Costs are summed as price x microseconds, which
+    # is exact in Decimal, and divided down to hours once at the end.
+    total, min_seconds = Decimal(0), 0
+    current, end_time = timezone.localtime(start_time), timezone.localtime(end_time)
+    while current < end_time:
+        day = current.date()
+        starts, segments = table[day.weekday()]
+        segment_end, hourly_price, segment_min = segments[bisect_right(starts, seconds_of_day(current)) - 1]
+        midnight = timezone.make_aware(datetime.combine(day, time.min))
+        boundary = min(midnight + timedelta(seconds=segment_end), end_time)
+
+        elapsed = (boundary - current) // timedelta(microseconds=1)
+        total += (base_price if hourly_price is None else hourly_price) * elapsed
+        min_seconds = max(min_seconds, segment_min)
+        current = boundary
+
+    total_cost = (total / MICROSECONDS_PER_HOUR).quantize(COST_QUANTUM, rounding=ROUND_HALF_UP)
+    return Quote(total_cost, timedelta(seconds=min_seconds))
+
+
+def cache_key(field_id):
+    return f"{CACHE_PREFIX}:{field_id}"
+
+
+def get_tables(field_ids):
+    # One cache round trip for all fields; misses are compiled from a single rules query.
+    keys = {cache_key(field_id): field_id for field_id in set(field_ids)}
+    tables = {keys[key]: table for key, table in cache.get_many(keys).items()}
+    missing = [field_id for field_id in keys.values() if field_id not in tables]
+    if missing:
+        rules = defaultdict(list)
+        for rule in PricingRule.objects.filter(field_id__in=missing).order_by("priority", "id"):
+            rules[rule.field_id].append(rule)
+        compiled = {field_id: compile_rules(rules[field_id]) for field_id in missing}
+        cache.set_many({cache_key(field_id): table for field_id, table in compiled.items()}, CACHE_TIMEOUT)
+        tables.update(compiled)
+    return tables
+
+
+def quote(field, start_time, end_time):
+    return price(get_tables([field.id])[field.id], field.price, start_time, end_time)
+
+
+def invalidate(field_id):
+    # Dropped after commit, so a concurrent request cannot re-cache the rules that are being replaced.
+    transaction.on_commit(lambda: cache.delete(cache_key(field_id)))
@@ -1,19 +1,59 @@
+from datetime import timedelta
 from rest_framework import serializers
-from football.models import FootballField
+from football.images import VARIANT_SIZES, accepts_webp
+from football.models import FootballField, PricingRule
 from accounts.serializers import AddressSerializer
 from accounts.models import Address
 
+MAX_ANALYTICS_DAYS = 366
+MAX_HEATMAP_WEEKS = 52
+MAX_PRICING_RULES = 50
+MAX_QUOTE_SLOTS = 500
+MAX_QUOTE_DURATION = timedelta(days=7)
+
 
 class FootballFieldSerializer(serializers.ModelSerializer):
     address = AddressSerializer()
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = FootballField
-        fields = ['id', "name", "owner", "address", "contact", "price", "image", "area", "viewers_capacity"]
+        fields = ['id', "name", "owner", "address", "contact", "price", "image", "image_variants", "area",
+                  "viewers_capacity", "opening_time", "closing_time"]
         extra_kwargs = {
             "id": {"read_only": True},
             "address": {"required": False}
         }
 
+    def image_extension(self):
+        return "webp" if accepts_webp(self.context.get("request")) else "jpeg"
+
+    def image_size(self):
+        # Listings show cards; a single field page shows the full-size photo.
+        view = self.context.get("view")
+        return "full" if getattr(view, "action", None) == "retrieve" else "card"
+
+    def variant_url(self, instance, size):
+        path = instance.image_variant(size, self.image_extension())
+        if path is None:
+            return None
+        url = instance.image.storage.url(path)
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def get_image_variants(self, instance):
+        # Until the background job has run, clients fall back to the original upload in "image".
+        if instance.image_variants_stale or not instance.image:
+            return None
+        return {size: self.variant_url(instance, size) for size in VARIANT_SIZES}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        variant = self.variant_url(instance, self.image_size())
+        if variant:
+            data["image"] = variant
+        return data
+
     def create(self, validated_data):
         address = validated_data.pop("address")
         address = Address.objects.create(
@@ -39,4 +79,70 @@ class FootballFieldSerializer(serializers.ModelSerializer):
         return instance
 
 
+class FieldSearchSerializer(serializers.Serializer):
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField(required=False)
+    duration = serializers.FloatField(required=False, min_value=0.25, max_value=24)
+    city = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(max_digits=9, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=9, decimal_places=2, required=False)
+    min_capacity = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if 'end_time' not in data:
+            if 'duration' not in data:
+                raise serializers.ValidationError("Either end_time or duration is required.")
+            data['end_time'] = data['start_time'] + timedelta(hours=data['duration'])
+
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError("End time must be after start time.")
+        if data['end_time'] - data['start_time'] > timedelta(hours=24):
+            raise serializers.ValidationError("Searches are limited to 24 hours.")
+        return data
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=["day", "week", "month"], default="day")
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    field_id = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if not 0 <= (data["end_date"] - data["start_date"]).days < MAX_ANALYTICS_DAYS:
+            raise serializers.ValidationError(f"end_date must be within {MAX_ANALYTICS_DAYS} days after start_date.")
+        return data
+
+
+class HeatmapQuerySerializer(serializers.Serializer):
+    weeks = serializers.IntegerField(default=8, min_value=1, max_value=MAX_HEATMAP_WEEKS)
+
+
+class PricingRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PricingRule
+        fields = ['id', 'name', 'weekdays', 'start_time', 'end_time', 'hourly_price', 'min_duration', 'priority']
+        extra_kwargs = {
+            "id": {"read_only": True}
+        }
+
+    def validate(self, data):
+        if data.get('hourly_price') is None and not data.get('min_duration'):
+            raise serializers.ValidationError("A rule needs an hourly_price, a min_duration or both.")
+        return data
+
+
+class QuoteSlotSerializer(serializers.Serializer):
+    field = serializers.IntegerField()
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+
+    def validate(self, data):
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError("End time must be after start time.")
+        if data['end_time'] - data['start_time'] > MAX_QUOTE_DURATION:
+            raise serializers.ValidationError(f"Quotes are limited to {MAX_QUOTE_DURATION.days} days per slot.")
+        return data
+
 
+class QuoteRequestSerializer(serializers.Serializer):
+    slots = QuoteSlotSerializer(many=True, min_length=1, max_length=MAX_QUOTE_SLOTS)
@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import Address
+from accounts.tokens import revoke_on_commit
+from football.cache import bump_version
+from football import pricing
+from football.models import FootballField, PricingRule
+from football.tasks import generate_image_variants
+
+
+@receiver([post_save, post_delete], sender=FootballField)
+@receiver([post_save, post_delete], sender=Address)
+def invalidate_football_field_cache(sender, **kwargs):
+    bump_version()
+
+
+@receiver(post_save, sender=FootballField)
+def queue_image_variants(sender, instance, **kwargs):
+    if instance.image_variants_stale:
+        image_name = instance.image.name or ''
+        transaction.on_commit(lambda: generate_image_variants.delay(instance.id, image_name))
+
+
+@receiver([post_save, post_delete], sender=PricingRule)
+def invalidate_pricing(sender, instance, **kwargs):
+    pricing.invalidate(instance.field_id)
+
+
+
+# A user's owner role comes with their first field and goes with their last. Rather than count fields on
+# every save, any change of who owns a field revokes the tokens of those involved.
+@receiver(post_save, sender=FootballField)
+def revoke_on_ownership_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_loaded_owner_id', None)
+    if created or (previous is not None and previous != instance.owner_id):
+        revoke_on_commit({previous, instance.owner_id} - {None})
+    instance._loaded_owner_id = instance.owner_id
+
+
+@receiver(post_delete, sender=FootballField)
+def revoke_on_field_deleted(sender, instance, **kwargs):
+    revoke_on_commit([instance.owner_id])
@@ -0,0 +1,24 @@
+from celery import shared_task
+
+from football.images import delete_variants, render_variants
+from football.models import FootballField
+
+
+@shared_task
+def generate_image_variants(field_id, image_name):
+    field = FootballField.objects.filter(id=field_id).first()
+    # A newer upload queued its own job; this one is stale.
+    if field is None or field.image.name != image_name:
+        return
+
+    storage = field.image.storage
+    previous = field.image_variants
+    if image_name:
+        with field.image.open('rb') as image_file:
+            variants = {'source': image_name, **render_variants(image_file, storage)}
+    else:
+        variants = {}
+
+    field.image_variants = variants
+    field.save(update_fields=['image_variants'])
+    delete_variants(previous, storage)
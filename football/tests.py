@@ -1,3 +1,410 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from accounts.models import Address, User
+from appointments.models import Appointment
+from football import pricing
+from football.cache import get_stats
+from football.models import FootballField, MAX_IMAGE_SIZE, PricingRule
+from football.uploadhandlers import ImageUploadError, ImageUploadHandler
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class FootballFieldCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        self.address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.owner, address=self.address, price=100)
+
+    def test_second_list_request_is_served_from_cache(self):
+        first = self.client.get("/football/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/football/")
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_stats()["hits"], 1)
+        self.assertEqual(get_stats()["misses"], 1)
+
+    def test_query_params_and_pages_are_cached_separately(self):
+        self.client.get("/football/?page=1")
+
+        self.assertEqual(self.client.get("/football/?page_size=5")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get("/football/?page=1")["X-Cache"], "HIT")
+
+    def test_absolute_urls_are_cached_per_scheme_and_host(self):
+        FootballField.objects.create(name="Second", owner=self.owner, address=self.address, price=100)
+        self.client.get("/football/?page_size=1")
+
+        secure = self.client.get("/football/?page_size=1", secure=True)
+
+        self.assertEqual(secure["X-Cache"], "MISS")
+        self.assertTrue(secure.data["next"].startswith("https://testserver/"))
+
+    def test_field_write_invalidates_list_and_retrieve(self):
+        self.client.get("/football/")
+        self.client.get(f"/football/{self.field.id}/")
+
+        self.field.name = "Renamed Arena"
+        self.field.save()
+
+        listing = self.client.get("/football/")
+        detail = self.client.get(f"/football/{self.field.id}/")
+        self.assertEqual(listing["X-Cache"], "MISS")
+        self.assertEqual(detail["X-Cache"], "MISS")
+        self.assertEqual(listing.data["results"][0]["name"], "Renamed Arena")
+        self.assertEqual(detail.data["name"], "Renamed Arena")
+
+    def test_address_write_invalidates_cache(self):
+        self.client.get("/football/")
+
+        self.address.city = "Samarkand"
+        self.address.save()
+
+        response = self.client.get("/football/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["address"]["city"], "Samarkand")
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class FreeFieldSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        tashkent = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        samarkand = Address.objects.create(address_line_1="2 Main St", city="Samarkand", country="Uzbekistan")
+        self.booked = FootballField.objects.create(name="Booked", owner=self.owner, address=tashkent, price=100)
+        self.cheap = FootballField.objects.create(name="Cheap", owner=self.owner, address=tashkent, price=50)
+        self.pricey = FootballField.objects.create(name="Pricey", owner=self.owner, address=tashkent, price=500)
+        self.closed = FootballField.objects.create(name="Closed", owner=self.owner, address=tashkent, price=60,
+                                                   closing_time=time(18))
+        self.elsewhere = FootballField.objects.create(name="Elsewhere", owner=self.owner, address=samarkand, price=50)
+
+        day = timezone.localdate() + timedelta(days=2)
+        self.start = timezone.make_aware(datetime.combine(day, time(19)))
+        Appointment.objects.create(user=self.owner, field=self.booked, start_time=self.start - timedelta(minutes=30),
+                                   end_time=self.start + timedelta(minutes=30))
+
+    def search(self, **params):
+        return self.client.get("/football/free/", {"start_time": self.start.isoformat(), "duration": 1.5, **params})
+
+    def test_returns_open_unbooked_fields_in_city_within_price_range(self):
+        response = self.search(city="tashkent", max_price=200)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([field["name"] for field in response.data["results"]], ["Cheap"])
+
+    def test_search_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.search(city="Tashkent")
+
+        self.assertEqual([field["name"] for field in response.data["results"]], ["Cheap", "Pricey"])
+
+    def test_requires_end_time_or_duration(self):
+        response = self.client.get("/football/free/", {"start_time": self.start.isoformat()})
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PricingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        self.address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.owner, address=self.address, price=100,
+                                                  opening_time=time(0), closing_time=time(0))
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def at(self, weekday, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.monday + timedelta(days=weekday), time(hour, minute)))
+
+    def add_rules(self, *rules):
+        with self.captureOnCommitCallbacks(execute=True):
+            for rule in rules:
+                PricingRule.objects.create(field=self.field, **rule)
+
+    def quote(self, start, end):
+        return pricing.quote(self.field, start, end)
+
+    def test_peak_weekend_and_overnight_rules_are_priced_exactly(self):
+        self.add_rules(
+            {"weekdays": [5, 6], "hourly_price": 150},
+            {"start_time": time(18), "end_time": time(23), "hourly_price": 130},
+            {"weekdays": [5, 6], "start_time": time(18), "end_time": time(23), "hourly_price": 200, "priority": 1},
+            {"weekdays": [4], "start_time": time(22), "end_time": time(1), "hourly_price": 90, "priority": 2},
+        )
+
+        # 30 minutes at the base price, then 70 at the peak rate.
+        self.assertEqual(self.quote(self.at(0, 17, 30), self.at(0, 19, 10)).total_cost, Decimal("201.667"))
+        self.assertEqual(self.quote(self.at(5, 17), self.at(5, 19)).total_cost, Decimal("350.000"))
+        # The Friday night window runs on into Saturday morning.
+        self.assertEqual(self.quote(self.at(4, 23, 30), self.at(5, 0, 30)).total_cost, Decimal("90.000"))
+
+    def test_fractional_hours_are_not_rounded_through_float(self):
+        self.assertEqual(self.quote(self.at(0, 10), self.at(0, 10, 20)).total_cost, Decimal("33.333"))
+        self.assertEqual(self.quote(self.at(0, 10), self.at(0, 11, 10)).total_cost, Decimal("116.667"))
+
+    def test_compiled_rules_are_cached_until_the_rules_change(self):
+        self.quote(self.at(0, 10), self.at(0, 11))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.quote(self.at(0, 10), self.at(0, 11)).total_cost, Decimal("100.000"))
+
+        self.add_rules({"start_time": time(9), "end_time": time(12), "hourly_price": 80})
+
+        self.assertEqual(self.quote(self.at(0, 10), self.at(0, 11)).total_cost, Decimal("80.000"))
+
+    def test_bookings_use_the_rules_and_their_minimum_duration(self):
+        self.add_rules({"start_time": time(18), "end_time": time(23), "hourly_price": 130,
+                        "min_duration": timedelta(minutes=90)})
+
+        def book(start, end):
+            return self.client.post("/appointments/", {"user": self.owner.id, "field": self.field.id,
+                                                       "start_time": start.isoformat(), "end_time": end.isoformat()})
+
+        # Starting before the window does not get around its minimum.
+        self.assertEqual(book(self.at(0, 17, 30), self.at(0, 18, 30)).status_code, 400)
+        response = book(self.at(0, 18), self.at(0, 19, 30))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appointment.objects.get(id=response.data["id"]).total_cost, Decimal("195.000"))
+
+    def test_owner_replaces_the_rule_set(self):
+        self.add_rules({"hourly_price": 70})
+        url = f"/football/{self.field.id}/pricing-rules/"
+
+        response = self.client.put(url, [
+            {"weekdays": [5, 6], "hourly_price": "150.00"},
+            {"start_time": "18:00", "end_time": "23:00", "min_duration": "01:00:00"},
+        ], format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([rule["hourly_price"] for rule in self.client.get(url).data], ["150.00", None])
+        self.assertEqual(self.quote(self.at(0, 10), self.at(0, 11)).total_cost, Decimal("100.000"))
+        self.assertEqual(self.client.put(url, [{"name": "Empty"}], format="json").status_code, 400)
+        player = User.objects.create_user(email="player@example.com", password="pass", first_name="Player")
+        self.client.force_authenticate(player)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_batch_quotes_price_hundreds_of_slots_in_constant_queries(self):
+        other = FootballField.objects.create(name="Other", owner=self.owner, address=self.address, price=60)
+        self.add_rules({"weekdays": [5, 6], "hourly_price": 150})
+        slots = [
+            {"field": field.id, "start_time": self.at(day, hour).isoformat(), "end_time": self.at(day, hour + 1).isoformat()}
+            for field in (self.field, other) for day in range(7) for hour in range(6, 22)
+        ]
+
+        with self.assertNumQueries(2):
+            response = APIClient().post("/football/quotes/", {"slots": slots}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        costs = [quote["total_cost"] for quote in response.data["quotes"]]
+        self.assertEqual(len(costs), 224)
+        self.assertEqual(costs[0], "100.000")
+        self.assertEqual(costs[5 * 16], "150.000")
+        self.assertEqual(costs[-1], "60.000")
+        unknown = APIClient().post("/football/quotes/", {"slots": [{**slots[0], "field": 0}]}, format="json")
+        self.assertEqual(unknown.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class FootballFieldPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.fields = [
+            FootballField.objects.create(name=f"Arena {i}", owner=owner, address=address, price=100)
+            for i in range(25)
+        ]
+
+    def test_cursor_pages_walk_every_field_once_without_counting(self):
+        seen = []
+        url = "/football/?page_size=10"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertNotIn("count", response.data)
+            self.assertFalse(any("COUNT(" in query["sql"] or "OFFSET" in query["sql"] for query in queries))
+            seen += [field["id"] for field in response.data["results"]]
+            url = response.data["next"]
+
+        self.assertEqual(seen, sorted(field.id for field in self.fields))
+
+    def test_page_number_mode_is_kept_behind_a_flag(self):
+        response = self.client.get("/football/", {"pagination": "page"})
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 10)
+
+        response = self.client.get("/football/", {"page": 3})
+        self.assertEqual([field["name"] for field in response.data["results"]],
+                         [f"Arena {i}" for i in range(20, 25)])
+
+
+def image_bytes(width, height, image_format="JPEG"):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "green").save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def jpeg_upload(width, height, name="photo.jpg", padding=0):
+    return SimpleUploadedFile(name, image_bytes(width, height) + b"\0" * padding, content_type="image/jpeg")
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        self.address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+
+    def create_field(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            field = FootballField.objects.create(name="Arena", owner=self.owner, address=self.address, price=100,
+                                                 **kwargs)
+        field.refresh_from_db()
+        return field
+
+    def test_upload_produces_resized_webp_and_jpeg_variants(self):
+        field = self.create_field(image=jpeg_upload(2400, 1200))
+
+        self.assertEqual(field.image_variants["source"], field.image.name)
+        for size, edge in [("thumbnail", 160), ("card", 640), ("full", 1600)]:
+            for extension, image_format in [("webp", "WEBP"), ("jpeg", "JPEG")]:
+                with field.image.storage.open(field.image_variant(size, extension)) as variant:
+                    image = Image.open(variant)
+                    self.assertEqual(image.format, image_format)
+                    self.assertEqual(image.size, (edge, edge // 2))
+
+    def test_serializer_picks_size_and_format(self):
+        field = self.create_field(image=jpeg_upload(800, 600))
+
+        listing = self.client.get("/football/", HTTP_ACCEPT="image/webp,*/*")
+        detail = self.client.get(f"/football/{field.id}/")
+
+        self.assertTrue(listing.data["results"][0]["image"].endswith(field.image_variant("card", "webp")))
+        self.assertTrue(detail.data["image"].endswith(field.image_variant("full", "jpeg")))
+        self.assertEqual(set(detail.data["image_variants"]), {"thumbnail", "card", "full"})
+        self.assertIn("Accept", detail["Vary"])
+
+    def test_original_is_served_until_variants_exist(self):
+        field = FootballField.objects.create(name="Arena", owner=self.owner, address=self.address, price=100,
+                                             image=jpeg_upload(800, 600))
+
+        response = self.client.get(f"/football/{field.id}/")
+
+        self.assertTrue(response.data["image"].endswith(field.image.name))
+        self.assertIsNone(response.data["image_variants"])
+
+    def test_replacing_the_image_regenerates_and_removes_old_variants(self):
+        field = self.create_field(image=jpeg_upload(800, 600))
+        old_path = field.image_variant("card", "jpeg")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            field.image = jpeg_upload(300, 300, name="new.png")
+            field.save()
+        field.refresh_from_db()
+
+        self.assertFalse(field.image.storage.exists(old_path))
+        self.assertEqual(field.image_variants["source"], field.image.name)
+
+    def test_fields_without_images_queue_nothing(self):
+        with mock.patch("football.signals.generate_image_variants.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                FootballField.objects.create(name="Arena", owner=self.owner, address=self.address, price=100)
+
+        delay.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ImageUploadHandlerTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.owner = User.objects.create_user(email="owner@example.com", password="pass", first_name="Owner")
+        address = Address.objects.create(address_line_1="1 Main St", city="Tashkent", country="Uzbekistan")
+        self.field = FootballField.objects.create(name="Arena", owner=self.owner, address=address, price=100)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def upload(self, image):
+        return self.client.patch(f"/football/{self.field.id}/", {"image": image}, format="multipart")
+
+    def feed(self, chunks):
+        handler = ImageUploadHandler()
+        handler.new_file("image", "photo.jpg", "image/jpeg", None)
+        received = 0
+        for chunk in chunks:
+            handler.receive_data_chunk(chunk, received)
+            received += len(chunk)
+        handler.file_complete(received)
+        return received
+
+    def test_valid_image_is_accepted(self):
+        response = self.upload(jpeg_upload(800, 600))
+
+        self.assertEqual(response.status_code, 200)
+        self.field.refresh_from_db()
+        self.assertTrue(self.field.image.name.endswith(".jpg"))
+
+    def test_oversized_body_is_rejected_before_it_is_read(self):
+        response = self.upload(jpeg_upload(100, 100, padding=MAX_IMAGE_SIZE))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("4 MB", response.data["detail"])
+
+    def test_non_image_is_rejected(self):
+        response = self.upload(SimpleUploadedFile("photo.jpg", b"<?php echo 'hi'; ?>" * 10, "image/jpeg"))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("valid JPEG or PNG", response.data["detail"])
+
+    def test_stream_stops_at_the_chunk_that_crosses_the_limit(self):
+        chunk = 64 * 1024
+        sent = []
+
+        def body():
+            yield image_bytes(100, 100)
+            while True:
+                sent.append(chunk)
+                yield b"\0" * chunk
+
+        with self.assertRaisesMessage(ImageUploadError, "4 MB"):
+            self.feed(body())
+        self.assertLessEqual(sum(sent), MAX_IMAGE_SIZE)
+
+    def test_huge_dimensions_are_rejected_from_the_header(self):
+        header = image_bytes(10000, 5000, "PNG")[:64]
+
+        with self.assertRaisesMessage(ImageUploadError, "dimensions"):
+            self.feed([header])
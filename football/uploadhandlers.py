@@ -0,0 +1,74 @@
+from io import BytesIO
+
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image
+
+from football.models import IMAGE_SIZE_MESSAGE, MAX_IMAGE_SIZE
+
+IMAGE_FIELD = 'image'
+MAGIC_NUMBERS = {
+    'JPEG': b'\xff\xd8\xff',
+    'PNG': b'\x89PNG\r\n\x1a\n',
+}
+INVALID_IMAGE_MESSAGE = "Upload a valid JPEG or PNG image."
+# Room for the non-file form fields and multipart framing around the image.
+MAX_FORM_OVERHEAD = 256 * 1024
+# JPEG headers may sit behind a large EXIF block; give up looking after this many bytes.
+MAX_HEADER_SIZE = 256 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+
+
+class ImageUploadError(MultiPartParserError):
+    pass
+
+
+# Runs ahead of Django's default handlers and rejects an oversized or non-image upload as soon as the
+# offending bytes arrive, instead of after the whole body has been spooled to disk and opened.
+class ImageUploadHandler(FileUploadHandler):
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > MAX_IMAGE_SIZE + MAX_FORM_OVERHEAD:
+            raise ImageUploadError(IMAGE_SIZE_MESSAGE)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.header = b'' if field_name == IMAGE_FIELD else None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.field_name != IMAGE_FIELD:
+            return raw_data
+        if start + len(raw_data) > MAX_IMAGE_SIZE:
+            raise ImageUploadError(IMAGE_SIZE_MESSAGE)
+        if self.header is not None:
+            self.header += raw_data
+            self.inspect_header()
+        return raw_data
+
+    def inspect_header(self):
+        if len(self.header) < 8:
+            return
+        image_format = next(
+            (name for name, magic in MAGIC_NUMBERS.items() if self.header.startswith(magic)), None
+        )
+        if image_format is None:
+            raise ImageUploadError(INVALID_IMAGE_MESSAGE)
+
+        # Image.open only parses the header, so this never allocates the decoded pixels.
+        try:
+            with Image.open(BytesIO(self.header), formats=[image_format]) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            raise ImageUploadError("Image dimensions are too large.")
+        except (OSError, SyntaxError):
+            if len(self.header) < MAX_HEADER_SIZE:
+                return
+            raise ImageUploadError(INVALID_IMAGE_MESSAGE)
+
+        if width * height > MAX_IMAGE_PIXELS:
+            raise ImageUploadError("Image dimensions are too large.")
+        self.header = None
+
+    def file_complete(self, file_size):
+        if self.field_name == IMAGE_FIELD and self.header is not None:
+            raise ImageUploadError(INVALID_IMAGE_MESSAGE)
+        return None
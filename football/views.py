@@ -1,40 +1,174 @@
-import hashlib
-
+from datetime import timedelta
+from django.db.models import Exists, OuterRef
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from django.db import transaction
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from accounts.permissions import IsFieldOwner, IsAdminUser
-from football.serializers import FootballFieldSerializer
-from football.models import FootballField
-from football.pagination import FootballPageNumberPagination
-from django.core.cache import cache
-from django.utils import timezone
+from accounts.roles import is_admin
+from football import cache, pricing
+from football.serializers import (
+    MAX_PRICING_RULES, AnalyticsQuerySerializer, FieldSearchSerializer, FootballFieldSerializer,
+    HeatmapQuerySerializer, PricingRuleSerializer, QuoteRequestSerializer
+)
+from football.models import FootballField, PricingRule
+from football.pagination import CursorOrPageNumberPagination
+from football.uploadhandlers import ImageUploadHandler
+from appointments import heatmap, rollups
+from appointments.models import Appointment
+from config.routers import ReplicaReadsMixin
 
 
-class FootballFieldModelViewSet(ModelViewSet):
+class FootballFieldModelViewSet(ReplicaReadsMixin, ModelViewSet):
     serializer_class = FootballFieldSerializer
-    queryset = FootballField.objects.all()
-    pagination_class = FootballPageNumberPagination
-
-    def get_queryset(self):
-        queryset = self.queryset
-        if self.action in ['list']:
-            raw_key = f"football_fields:{timezone.now()}"
-            key = hashlib.md5(raw_key.encode()).hexdigest()
-            cached_page = cache.get(key)
-
-            if cached_page:
-                return cached_page
+    queryset = FootballField.objects.select_related('address')
+    pagination_class = CursorOrPageNumberPagination
+    # list, retrieve and quotes fill caches that outlive replication lag, so their misses read the primary.
+    replica_actions = ("free", "analytics", "heatmap")
 
-            cache.set(key, queryset, timeout=60 * 1)
-
-        return queryset
+    def initialize_request(self, request, *args, **kwargs):
+        # Must be in place before the body is parsed; only multipart requests consult it.
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+        return super().initialize_request(request, *args, **kwargs)
 
     def get_permissions(self):
-        if self.action in ['list', "retrieve"]:
+        if self.action in ['list', "retrieve", "free", "quotes"]:
             return [AllowAny()]
-        if self.action in ["update", "destroy"]:
+        if self.action in ["update", "destroy", "heatmap", "pricing_rules"]:
             return [IsFieldOwner()]
+        if self.action in ["cache_stats"]:
+            return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = cache.build_key(request, self.action, kwargs.get(self.lookup_field))
+        data = cache.get_page(key)
+        if data is not None:
+            response = Response(data, headers={"X-Cache": "HIT"})
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set_page(key, response.data)
+            response["X-Cache"] = "MISS"
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
+
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response(cache.get_stats())
+
+    @action(detail=False, methods=['get'], url_path='analytics')
+    def analytics(self, request):
+        query = AnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        fields = FootballField.objects.order_by('id')
+        if not is_admin(request):
+            fields = fields.filter(owner_id=request.user.id)
+        if 'field_id' in params:
+            fields = fields.filter(id=params['field_id'])
+        fields = list(fields.values('id', 'name', 'opening_time', 'closing_time'))
+
+        return Response({
+            'period': params['period'],
+            'start_date': params['start_date'],
+            'end_date': params['end_date'],
+            'fields': rollups.report(fields, params['period'], params['start_date'], params['end_date']),
+        })
+
+    @action(detail=True, methods=['get'], url_path='heatmap')
+    def heatmap(self, request, pk=None):
+        field = self.get_object()
+        query = HeatmapQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        weeks = query.validated_data['weeks']
+        since, until = heatmap.window(weeks)
+
+        return Response({
+            'field_id': field.id,
+            'weeks': weeks,
+            'start_date': since,
+            'end_date': until - timedelta(days=1),
+            # Rows are Monday to Sunday, columns local hours; each cell is the booked share of that hour.
+            'occupancy': heatmap.occupancy(field.id, weeks),
+        })
+
+    @action(detail=True, methods=['get', 'put'], url_path='pricing-rules')
+    def pricing_rules(self, request, pk=None):
+        field = self.get_object()
+        if request.method == 'GET':
+            return Response(PricingRuleSerializer(field.pricing_rules.all(), many=True).data)
+
+        serializer = PricingRuleSerializer(data=request.data, many=True, max_length=MAX_PRICING_RULES)
+        serializer.is_valid(raise_exception=True)
+        # The rule set is replaced as a whole, so priorities are always read against the same snapshot.
+        with transaction.atomic():
+            PricingRule.objects.filter(field=field).delete()
+            rules = PricingRule.objects.bulk_create(
+                PricingRule(field=field, **rule) for rule in serializer.validated_data
+            )
+            pricing.invalidate(field.id)
+        return Response(PricingRuleSerializer(rules, many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='quotes')
+    def quotes(self, request):
+        query = QuoteRequestSerializer(data=request.data)
+        query.is_valid(raise_exception=True)
+        slots = query.validated_data['slots']
+
+        field_ids = {slot['field'] for slot in slots}
+        prices = dict(FootballField.objects.filter(id__in=field_ids).values_list('id', 'price'))
+        if missing := sorted(field_ids - prices.keys()):
+            raise ValidationError({'slots': [f"Unknown field ids: {', '.join(map(str, missing))}."]})
+        tables = pricing.get_tables(prices)
+
+        quotes = []
+        for slot in slots:
+            quote = pricing.price(tables[slot['field']], prices[slot['field']], slot['start_time'], slot['end_time'])
+            quotes.append({
+                **slot,
+                # Strings keep the exact decimal value through JSON.
+                'total_cost': str(quote.total_cost),
+                'min_duration_minutes': quote.min_duration // timedelta(minutes=1),
+                'bookable': not quote.too_short(slot['start_time'], slot['end_time']),
+            })
+        return Response({'quotes': quotes})
+
+    @action(detail=False, methods=['get'], url_path='free')
+    def free(self, request):
+        search = FieldSearchSerializer(data=request.query_params)
+        search.is_valid(raise_exception=True)
+        params = search.validated_data
+        start_time, end_time = params['start_time'], params['end_time']
+
+        queryset = FootballField.objects.select_related('address').open_during(start_time, end_time)
+        if 'city' in params:
+            queryset = queryset.filter(address__city__iexact=params['city'])
+        if 'min_price' in params:
+            queryset = queryset.filter(price__gte=params['min_price'])
+        if 'max_price' in params:
+            queryset = queryset.filter(price__lte=params['max_price'])
+        if 'min_capacity' in params:
+            queryset = queryset.filter(viewers_capacity__gte=params['min_capacity'])
+
+        # Anti-join: each candidate costs one probe of the appointments_no_overlap GiST index.
+        booked = Appointment.objects.filter(field=OuterRef('pk')).overlapping(start_time, end_time)
+        queryset = queryset.filter(~Exists(booked)).order_by('price', 'id')
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)